@@ -0,0 +1,131 @@
+"""Benchmark of the conversion profiles of `GrabMySQL.extract`.
+
+Extracts a result with integer, decimal, datetime and date columns from a
+raw `FakeConnection`, which decodes the text protocol values with the
+connection decoders like `pymysql`, with each `conversion` profile: the
+`python` converters, the `fast` bulk parsing, and `fast_exact` (decimals kept
+as `decimal.Decimal`). The results can be saved as a baseline and compared
+with it, like `bench_sql.py`.
+
+Usage
+-----
+python benchmarks/bench_conversion.py --sizes 1000000
+python benchmarks/bench_conversion.py --save benchmarks/baselines/conversion.json
+python benchmarks/bench_conversion.py --compare benchmarks/baselines/conversion.json
+
+"""
+import argparse
+import datetime
+import decimal
+import json
+import logging
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+
+from bench_sql import compare
+from fake_pymysql import FakeConnection
+from tools.sql import CONVERSIONS, GrabMySQL
+
+
+def _created(i, start=datetime.datetime(2020, 1, 1)):
+    return start + datetime.timedelta(seconds=i)
+
+
+"""Columns of a typical disputes extract: (name, field type, nullable, value
+of the row `i`)"""
+COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, lambda i: i),
+    ('country_id', FIELD_TYPE.LONG, True,
+     lambda i: None if i % 10 == 0 else i % 8),
+    ('amount', FIELD_TYPE.NEWDECIMAL, False,
+     lambda i: decimal.Decimal(i % 100000) / 100),
+    ('fee', FIELD_TYPE.NEWDECIMAL, True,
+     lambda i: None if i % 7 == 0 else decimal.Decimal(i % 1000) / 100),
+    ('created', FIELD_TYPE.DATETIME, False, _created),
+    ('updated', FIELD_TYPE.DATETIME, True,
+     lambda i: None if i % 5 == 0 else _created(2 * i)),
+    ('booking_date', FIELD_TYPE.DATE, True, lambda i: _created(i).date()),
+    ('status', FIELD_TYPE.VAR_STRING, True,
+     lambda i: ('pending', 'approved', 'rejected', 'resolved')[i % 4]),
+)
+
+
+def run(sizes, conversions):
+    """Extracts `sizes` rows with each conversion profile.
+
+    Returns
+    -------
+    dict with the environment (`meta`) and the `results` as
+    {conversion: {n_rows: seconds}}.
+
+    """
+    logging.basicConfig(handlers=[logging.NullHandler()], level=logging.INFO)
+    results = {conversion: {} for conversion in conversions}
+    for n_rows in sizes:
+        start = time.perf_counter()
+        con = FakeConnection(n_rows, COLUMNS, raw=True)
+        print(
+            f'{n_rows} rows generated in '
+            f'{time.perf_counter() - start:.1f}s', file=sys.stderr
+        )
+        with con.patch():
+            sql = GrabMySQL({'host': 'fake'})
+        repeat = 5 if n_rows <= 100000 else 1
+        for conversion in conversions:
+            sql.conversion = conversion
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                df = sql.extract('SELECT * FROM disputes')
+                best = min(best, time.perf_counter() - start)
+            results[conversion][str(n_rows)] = best
+            dtypes = ', '.join(str(dtype) for dtype in df.dtypes[1:7])
+            print(
+                f'{conversion:<12}{n_rows:>10}{best:>10.3f}s'
+                f'{n_rows / best:>12.0f} rows/s  {dtypes}', file=sys.stderr
+            )
+        del con, sql, df
+    meta = {
+        'python': platform.python_version(), 'pandas': pd.__version__,
+        'numpy': np.__version__, 'machine': platform.machine(),
+        'platform': platform.platform(), 'date': time.strftime('%Y-%m-%d'),
+    }
+    return {'meta': meta, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000000],
+        help='numbers of rows (default 1000000)')
+    parser.add_argument(
+        '--conversions', nargs='+', choices=CONVERSIONS,
+        default=list(CONVERSIONS), help='profiles to run (default all)')
+    parser.add_argument('--save', help='path to save the results to')
+    parser.add_argument('--compare', help='path to a baseline to compare to')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='slowdown ratio above which a case is a regression (0.2)')
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.conversions)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regressions')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Benchmark of the logging cost on the `GrabMySQL.extract` hot path.
+
+Runs `extract` against a `FakeConnection` counting the round trips to the
+server (pings and executed statements), with logging disabled, enabled
+at `DEBUG` level, and enabled with `trace`. The previous implementation
+called `GrabMySQL.query` to log the full query, which pings the server: its
+cost is reported as the `legacy` line (`query` + `extract`).
+
+Usage: python benchmarks/bench_logging.py [n_extracts]
+
+"""
+import logging
+import sys
+import time
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL
+
+
+QUERY = 'SELECT id, status FROM disputes WHERE country_id = %s AND id IN %s'
+PARAMS = (2, tuple(range(1000)))
+
+
+def run(label, sql, n, legacy=False):
+    con = sql._con
+    con.round_trips = 0
+    start = time.perf_counter()
+    for _ in range(n):
+        if legacy:
+            sql.query(QUERY, PARAMS)
+        sql.extract(QUERY, PARAMS)
+    elapsed = time.perf_counter() - start
+    print(
+        f'{label:<24}{con.round_trips / n:>14.1f}'
+        f'{elapsed / n * 1e6:>16.1f}'
+    )
+    return con.round_trips
+
+
+def main(n=2000):
+    # Logging enabled, but records discarded: only the formatting is measured
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    con = FakeConnection(n_rows=100)
+    with con.patch():
+        sql = GrabMySQL({'host': 'bench'})
+    print(f'{n} extracts of {len(con.rows)} rows')
+    print(f'{"":<24}{"round trips":>14}{"us / extract":>16}')
+    logging.root.setLevel(logging.WARNING)
+    run('WARNING', sql, n)
+    logging.root.setLevel(logging.DEBUG)
+    legacy = run('DEBUG legacy', sql, n, legacy=True)
+    current = run('DEBUG', sql, n)
+    sql.trace = True
+    run('DEBUG trace', sql, n)
+    print(f'Round trips saved per extract: {(legacy - current) / n:.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""Benchmark of `dbapi.build_frame` against the plain `pd.DataFrame` path.
+
+Builds a DataFrame from a synthetic cursor result (row tuples and a MySQL
+`cursor.description`), and reports the time, the peak memory allocated during
+the conversion, and the memory of the resulting DataFrame.
+
+Usage: python benchmarks/bench_result_builder.py [--rows N_ROWS]
+
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+
+from tools import dbapi
+from tools.sql import mysql_kind
+
+
+DESCRIPTION = (
+    ('id', FIELD_TYPE.LONGLONG, None, 20, 20, 0, False),
+    ('country_id', FIELD_TYPE.LONG, None, 11, 11, 0, True),
+    ('amount', FIELD_TYPE.DOUBLE, None, 22, 22, 31, True),
+    ('created', FIELD_TYPE.DATETIME, None, 19, 19, 0, True),
+    ('status', FIELD_TYPE.VAR_STRING, None, 40, 40, 0, True),
+    ('booking_code', FIELD_TYPE.VAR_STRING, None, 80, 80, 0, True),
+)
+
+
+def synthetic_rows(n):
+    """Returns `n` rows as a tuple of tuples, like `cursor.fetchall`."""
+    start = datetime.datetime(2020, 1, 1)
+    statuses = ('pending', 'approved', 'rejected', 'resolved')
+    return tuple(
+        (
+            i, None if i % 10 == 0 else i % 8, i * 0.5,
+            start + datetime.timedelta(seconds=i), statuses[i % 4],
+            f'ADR-{i:09d}'
+        )
+        for i in range(n)
+    )
+
+
+def current_path(data, description):
+    clmns = [d[0] for d in description]
+    return pd.DataFrame(list(data), columns=clmns)
+
+
+def typed_path(data, description):
+    return dbapi.build_frame(data, description, mysql_kind, 0.1)
+
+
+def measure(fn, data, description):
+    """Time is measured without `tracemalloc`, which slows allocations."""
+    t0 = time.perf_counter()
+    fn(data, description)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    df = fn(data, description)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, df.memory_usage(deep=True).sum()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--rows', type=int, default=1_000_000, dest='n_rows',
+        help='number of rows (default 1000000)')
+    n_rows = parser.parse_args(argv).n_rows
+    data = synthetic_rows(n_rows)
+    print(f'{n_rows} rows')
+    print(f"{'path':<10}{'time (s)':>10}{'peak (MB)':>12}{'frame (MB)':>12}")
+    for name, fn in (('current', current_path), ('typed', typed_path)):
+        elapsed, peak, size = measure(fn, data, DESCRIPTION)
+        print(f'{name:<10}{elapsed:>10.2f}{peak / 2**20:>12.1f}'
+              f'{size / 2**20:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
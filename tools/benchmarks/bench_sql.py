@@ -0,0 +1,197 @@
+"""Benchmark suite of the Python-side overhead of the `sql` module.
+
+Times the row conversion and DataFrame construction, `GrabMySQL.extract`
+(with logging disabled and with `DEBUG` tracing), the parameters preparation
+(`prepare_df`, `iter_prepared`), `insert_df` and `modify`, against the
+in-process `FakeConnection` (no network, no server). The results can be
+saved as a baseline, and compared with a previous baseline: cases slower
+than the baseline by more than the tolerance are reported as regressions,
+and the exit code is 1.
+The committed baseline (`baselines/sql.json`) stops at 1M rows: a 10M rows
+run needs more than 5 GB of memory for the synthetic rows and the frames,
+and is left to machines which have it.
+
+Usage
+-----
+python benchmarks/bench_sql.py --sizes 10000 1000000
+python benchmarks/bench_sql.py --sizes 10000 1000000 10000000 --latency 0.001
+python benchmarks/bench_sql.py --save benchmarks/baselines/sql.json
+python benchmarks/bench_sql.py --compare benchmarks/baselines/sql.json
+
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fake_pymysql import FakeConnection
+from tools import dbapi
+from tools.sql import GrabMySQL, iter_prepared, mysql_kind, prepare_df
+
+
+def case_build_frame(sql, con, df):
+    dbapi.build_frame(con.rows, con.description, mysql_kind)
+
+
+def case_extract(sql, con, df):
+    sql.extract('SELECT * FROM disputes WHERE country_id = %s', (2, ))
+
+
+def case_extract_trace(sql, con, df):
+    level = logging.root.level
+    logging.root.setLevel(logging.DEBUG)
+    sql.trace = True
+    try:
+        sql.extract('SELECT * FROM disputes WHERE country_id = %s', (2, ))
+    finally:
+        sql.trace = False
+        logging.root.setLevel(level)
+
+
+def case_prepare_df(sql, con, df):
+    prepare_df(df)
+
+
+def case_iter_prepared(sql, con, df):
+    for _ in iter_prepared(df):
+        pass
+
+
+def case_insert_df(sql, con, df):
+    sql.insert_df(df, 'disputes', on_dupl_update_clmns=['status'])
+
+
+def case_modify(sql, con, df):
+    clmns = ', '.join(df.columns)
+    values = ', '.join(['%s'] * len(df.columns))
+    sql.modify(
+        f'INSERT INTO disputes ({clmns}) VALUES ({values})', prepare_df(df))
+
+
+CASES = {
+    'build_frame': case_build_frame,
+    'extract': case_extract,
+    'extract_trace': case_extract_trace,
+    'prepare_df': case_prepare_df,
+    'iter_prepared': case_iter_prepared,
+    'insert_df': case_insert_df,
+    'modify': case_modify,
+}
+
+
+def measure(fn, sql, con, df, repeat):
+    """Returns the best time of `repeat` runs, and the round trips per run.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        con.round_trips = 0
+        start = time.perf_counter()
+        fn(sql, con, df)
+        best = min(best, time.perf_counter() - start)
+    return best, con.round_trips
+
+
+def run(sizes, cases, latency=0):
+    """Runs the `cases` for each number of rows of `sizes`.
+
+    Returns
+    -------
+    dict with the environment (`meta`) and the `results` as
+    {case: {n_rows: seconds}}.
+
+    """
+    # Logged records are formatted, but discarded
+    logging.basicConfig(handlers=[logging.NullHandler()], level=logging.INFO)
+    results = {name: {} for name in cases}
+    for n_rows in sizes:
+        start = time.perf_counter()
+        con = FakeConnection(n_rows, latency=latency)
+        print(
+            f'{n_rows} rows generated in '
+            f'{time.perf_counter() - start:.1f}s', file=sys.stderr
+        )
+        with con.patch():
+            sql = GrabMySQL({'host': 'fake'})
+        df = dbapi.build_frame(con.rows, con.description, mysql_kind)
+        repeat = 5 if n_rows <= 100000 else 1
+        for name in cases:
+            elapsed, round_trips = measure(CASES[name], sql, con, df, repeat)
+            results[name][str(n_rows)] = elapsed
+            print(
+                f'{name:<16}{n_rows:>10}{elapsed:>12.4f}s'
+                f'{n_rows / elapsed:>14.0f} rows/s{round_trips:>6} trips',
+                file=sys.stderr
+            )
+        del con, sql, df
+    meta = {
+        'python': platform.python_version(), 'pandas': pd.__version__,
+        'numpy': np.__version__, 'machine': platform.machine(),
+        'platform': platform.platform(), 'latency': latency,
+        'date': time.strftime('%Y-%m-%d'),
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(current, baseline, tolerance):
+    """Prints the ratio current / baseline time of each case, and returns
+    the cases slower than the baseline by more than `tolerance`.
+
+    """
+    regressions = []
+    print(f"{'case':<16}{'rows':>10}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, times in current['results'].items():
+        for n_rows, elapsed in times.items():
+            base = baseline['results'].get(name, {}).get(n_rows)
+            if base is None:
+                continue
+            ratio = elapsed / base
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions.append((name, n_rows, ratio))
+                flag = '  REGRESSION'
+            print(
+                f'{name:<16}{n_rows:>10}{base:>12.4f}{elapsed:>12.4f}'
+                f'{ratio:>8.2f}{flag}'
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 1000000],
+        help='numbers of rows (default 10000 1000000)')
+    parser.add_argument(
+        '--cases', nargs='+', choices=list(CASES), default=list(CASES),
+        help='cases to run (default all)')
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='simulated latency of each round trip in seconds')
+    parser.add_argument('--save', help='path to save the results to')
+    parser.add_argument('--compare', help='path to a baseline to compare to')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='slowdown ratio above which a case is a regression (0.2)')
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.cases, args.latency)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(current, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regressions')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""In-process fake of a `pymysql` connection, for benchmarks.
+
+The fake connection answers every `SELECT` with the same pre-built rows, with
+configurable columns and number of rows, and optionally sleeps to simulate
+the network latency of each round trip. It escapes the parameters like
+`pymysql`, so that the Python-side cost of `GrabMySQL` (row conversion,
+DataFrame construction, parameter escaping, logging) can be measured
+without a MySQL server. With `raw=True`, the rows are kept in their text
+protocol form, and decoded at each `SELECT` with the connection `decoders`,
+like `pymysql` does, so that the cost of the value conversions is measured
+as well.
+
+Examples
+--------
+>>> con = FakeConnection(n_rows=10000, latency=0.001)
+>>> with con.patch():
+...     sql = GrabMySQL({'host': 'fake'})
+>>> df = sql.extract('SELECT * FROM disputes')
+>>> con.round_trips
+2
+
+"""
+import datetime
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from pymysql import converters
+from pymysql.constants import FIELD_TYPE
+
+
+def _created(i, start=datetime.datetime(2020, 1, 1)):
+    return start + datetime.timedelta(seconds=i)
+
+
+"""Default columns: (name, field type, nullable, value of the row `i`)"""
+DEFAULT_COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, lambda i: i),
+    ('country_id', FIELD_TYPE.LONG, True,
+     lambda i: None if i % 10 == 0 else i % 8),
+    ('amount', FIELD_TYPE.DOUBLE, True, lambda i: i * 0.5),
+    ('created', FIELD_TYPE.DATETIME, True, _created),
+    ('status', FIELD_TYPE.VAR_STRING, True,
+     lambda i: ('pending', 'approved', 'rejected', 'resolved')[i % 4]),
+    ('booking_code', FIELD_TYPE.VAR_STRING, True, lambda i: f'ADR-{i:09d}'),
+)
+
+
+def description(columns=DEFAULT_COLUMNS):
+    """Returns the `cursor.description` of `columns`."""
+    return tuple(
+        (name, type_code, None, None, None, None, nullable)
+        for name, type_code, nullable, _ in columns
+    )
+
+
+def synthetic_rows(n_rows, columns=DEFAULT_COLUMNS):
+    """Returns `n_rows` rows as a tuple of tuples, like `cursor.fetchall`."""
+    values = [value for *_, value in columns]
+    return tuple(tuple([value(i) for value in values]) for i in range(n_rows))
+
+
+def _text(value):
+    """Returns a value as sent by the MySQL text protocol (None for NULL)"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+def raw_rows(rows):
+    """Returns the rows with their values as text protocol bytes."""
+    return tuple(tuple([_text(v) for v in row]) for row in rows)
+
+
+def decode_rows(rows, description, decoders, encoding):
+    """Decodes text protocol rows like `pymysql`: each value is decoded, and
+    converted by the decoder of its field type, if any.
+
+    """
+    text_types = (
+        FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING,
+        FIELD_TYPE.ENUM, FIELD_TYPE.BLOB, FIELD_TYPE.JSON
+    )
+    converters_ = []
+    for d in description:
+        converter = decoders.get(d[1])
+        if converter is converters.through:
+            converter = None
+        converters_.append(
+            (encoding if d[1] in text_types else 'ascii', converter))
+    decoded = []
+    for row in rows:
+        values = []
+        for (encoding_, converter), data in zip(converters_, row):
+            if data is not None:
+                data = data.decode(encoding_)
+                if converter is not None:
+                    data = converter(data)
+            values.append(data)
+        decoded.append(tuple(values))
+    return tuple(decoded)
+
+
+class FakeCursor:
+    """Cursor of a `FakeConnection`"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = 0
+        self._rows = ()
+        self._position = 0
+
+
+    def _round_trip(self):
+        self.connection.round_trips += 1
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+
+
+    def _escape_args(self, args):
+        literal = self.connection.literal
+        if isinstance(args, (tuple, list)):
+            return tuple(literal(arg) for arg in args)
+        if isinstance(args, dict):
+            return {key: literal(value) for key, value in args.items()}
+        return literal(args)
+
+
+    def mogrify(self, query, args=None):
+        if args is not None:
+            query = query % self._escape_args(args)
+        return query
+
+
+    def execute(self, query, args=None):
+        query = self.mogrify(query, args)
+        if isinstance(query, bytes):
+            query = query.decode(self.connection.encoding)
+        self._round_trip()
+        self._position = 0
+        self.connection.queries.append(query)
+        answer = self.connection._answer(query)
+        if answer is not None:
+            self.description, self._rows = answer
+        elif query.startswith('SELECT @@max_allowed_packet'):
+            self.description = description(
+                (('max_allowed_packet', FIELD_TYPE.LONGLONG, False, None), ))
+            self._rows = ((self.connection.max_allowed_packet, ), )
+        elif query.lstrip()[:6].upper() in ('SELECT', 'EXPLAI'):
+            connection = self.connection
+            self.description = connection.description
+            self._rows = connection.rows
+            if connection.raw:
+                self._rows = decode_rows(
+                    connection.rows, connection.description, 
+                    connection.decoders, connection.encoding
+                )
+        else:
+            self.description = None
+            self._rows = ()
+            self.rowcount = 1
+            return 1
+        self.rowcount = len(self._rows)
+        return self.rowcount
+
+
+    def executemany(self, query, args):
+        # `pymysql` escapes every row, and sends them in bulk statements
+        for arg in args:
+            self.mogrify(query, arg)
+        self._round_trip()
+        self.rowcount = len(args)
+        return self.rowcount
+
+
+    def fetchall(self):
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+
+    def fetchmany(self, size=1):
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Fake `pymysql` connection returning pre-built rows.
+
+    Attributes
+    ----------
+    rows : tuple of tuple
+        Rows returned by every `SELECT`.
+    description : tuple
+        The `cursor.description` of `rows`.
+    latency : float
+        Seconds slept at each round trip (ping, execute, commit).
+    round_trips : int
+        Number of round trips to the fake server.
+    raw : bool
+        Whether `rows` are in text protocol form, decoded at each `SELECT`.
+    decoders : dict
+        Converters of each field type, as `pymysql.Connection.decoders`.
+    queries : list of str
+        Queries executed, escaped.
+    answers : list
+        Results of the queries starting with a prefix, as (prefix,
+        description, rows), added with `answer`.
+
+    """
+    encoding = 'utf8'
+    charset = 'utf8mb4'
+    open = True
+
+    def __init__(self, n_rows=10000, columns=DEFAULT_COLUMNS, latency=0,
+                 max_allowed_packet=16 * 2**20, raw=False):
+        """Instantiates a FakeConnection object.
+
+        Parameters
+        ----------
+        n_rows : int
+            Number of rows returned by the `SELECT` queries. Default 10000.
+        columns : tuple
+            Columns as (name, field type, nullable, function returning the
+            value of the row `i`). Default `DEFAULT_COLUMNS`.
+        latency : float
+            Seconds slept at each round trip. Default 0.
+        max_allowed_packet : int
+            Returned by `SELECT @@max_allowed_packet`. Default 16MB.
+        raw : bool
+            If True, the rows are decoded at each `SELECT`, with `decoders`.
+            Default False: the rows are pre-built Python values.
+
+        Returns
+        -------
+        <FakeConnection> object.
+
+        """
+        self.rows = synthetic_rows(n_rows, columns)
+        if raw:
+            self.rows = raw_rows(self.rows)
+        self.raw = raw
+        self.decoders = {
+            k: v for k, v in converters.decoders.items() if type(k) is int}
+        self.description = description(columns)
+        self.latency = latency
+        self.max_allowed_packet = max_allowed_packet
+        self.round_trips = 0
+        self.queries = []
+        self.answers = []
+
+
+    @contextmanager
+    def patch(self):
+        """Context manager making `pymysql.connect` return this connection.
+        """
+        with mock.patch('pymysql.connect', return_value=self):
+            yield self
+
+
+    def answer(self, prefix, columns, n_rows=1):
+        """Makes the queries starting with `prefix` return `n_rows` rows of
+        `columns` (same format as in `__init__`) instead of `rows`.
+
+        """
+        self.answers.append(
+            (prefix, description(columns), synthetic_rows(n_rows, columns)))
+
+
+    def _answer(self, query):
+        for prefix, description_, rows in self.answers:
+            if query.startswith(prefix):
+                return description_, rows
+        return None
+
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+
+    def literal(self, obj):
+        """Escapes a value like `pymysql.Connection.literal`."""
+        if isinstance(obj, str):
+            return "'" + converters.escape_string(obj) + "'"
+        if isinstance(obj, (bytes, bytearray)):
+            return converters.escape_bytes(obj)
+        return converters.escape_item(obj, self.charset)
+
+
+    def ping(self, reconnect=True):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+    def commit(self):
+        self.ping()
+
+
+    def rollback(self):
+        self.ping()
+
+
+    def close(self):
+        self.open = False
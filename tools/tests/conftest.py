@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests run against the fake `pymysql` connection of the benchmarks
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks'))
@@ -0,0 +1,213 @@
+import asyncio
+
+import pandas as pd
+import pymysql
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection, description
+
+pytest.importorskip('aiomysql')
+from tools.async_sql import AsyncGrabMySQL  # noqa: E402
+
+COLUMNS = (('id', FIELD_TYPE.LONGLONG, False, lambda i: i), )
+
+
+class StubCursor:
+    def __init__(self, con):
+        self.con = con
+        self.description = description(COLUMNS)
+        self.lastrowid = 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode(self.con.encoding)
+        self.con.log.append(self.con.fake.cursor().mogrify(query, params))
+        if self.con.failures:
+            self.con.failures -= 1
+            raise pymysql.err.OperationalError(2013, 'Lost connection')
+        if query.startswith('SELECT @@max_allowed_packet'):
+            self._rows = ((2**20, ), )
+        else:
+            self._rows = ((1, ), (2, ))
+        return 1
+
+    async def executemany(self, query, params):
+        for p in params:
+            await self.execute(query, p)
+        return len(params)
+
+    async def fetchall(self):
+        return self._rows
+
+
+class StubConnection:
+    """Connection of a `StubPool`, logging the queries and the transaction
+    statements
+
+    """
+    encoding = 'utf8'
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+        self.failures = 0
+        self.fake = FakeConnection(0)
+        self.literal = self.fake.literal
+
+    def cursor(self):
+        return StubCursor(self)
+
+    async def begin(self):
+        self.log.append(f'BEGIN {self.name}')
+
+    async def commit(self):
+        self.log.append(f'COMMIT {self.name}')
+
+    async def rollback(self):
+        self.log.append(f'ROLLBACK {self.name}')
+
+
+class _Acquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __await__(self):
+        return self.pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self.con = await self.pool._acquire()
+        return self.con
+
+    async def __aexit__(self, *exc):
+        self.pool.release(self.con)
+        return False
+
+
+class StubPool:
+    """Pool of `aiomysql`, with connections acquired in turn"""
+    def __init__(self, size=2):
+        self.log = []
+        self.free = [StubConnection(i, self.log) for i in range(size)]
+
+    def acquire(self):
+        return _Acquire(self)
+
+    async def _acquire(self):
+        return self.free.pop(0)
+
+    def release(self, con):
+        self.free.append(con)
+
+
+@pytest.fixture
+def sql(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr('backoff._async.asyncio.sleep', no_sleep)
+    return AsyncGrabMySQL(StubPool(), {'host': 'fake'})
+
+
+def test_transaction_commits_on_one_connection(sql):
+    async def run():
+        async with sql:
+            await sql.modify('UPDATE t SET a = %s', 1)
+            df = await sql.extract('SELECT id FROM t')
+        return df
+
+    df = asyncio.run(run())
+    assert df['id'].tolist() == [1, 2]
+    assert sql._pool.log == [
+        'BEGIN 0', 'UPDATE t SET a = 1', 'SELECT id FROM t', 'COMMIT 0']
+    assert len(sql._pool.free) == 2
+
+
+def test_transaction_rolls_back_on_error(sql):
+    async def run():
+        async with sql:
+            await sql.modify('UPDATE t SET a = %s', 1)
+            raise KeyError('failure')
+
+    with pytest.raises(KeyError):
+        asyncio.run(run())
+    assert sql._pool.log == ['BEGIN 0', 'UPDATE t SET a = 1', 'ROLLBACK 0']
+    assert len(sql._pool.free) == 2
+
+
+def test_nested_transaction_is_rejected(sql):
+    async def run():
+        async with sql:
+            async with sql:
+                pass
+
+    with pytest.raises(RuntimeError, match='already running'):
+        asyncio.run(run())
+
+
+def test_concurrent_tasks_have_their_own_transaction(sql):
+    async def task(value):
+        async with sql:
+            await sql.modify('UPDATE t SET a = %s', value)
+            await asyncio.sleep(0)
+
+    async def run():
+        await asyncio.gather(task(1), task(2))
+
+    asyncio.run(run())
+    log = sql._pool.log
+    assert log.index('UPDATE t SET a = 1') < log.index('COMMIT 0')
+    assert log.index('UPDATE t SET a = 2') < log.index('COMMIT 1')
+
+
+def test_auto_commit_is_retried(sql):
+    sql._pool.free[0].failures = 1
+    nrows = asyncio.run(sql.modify('UPDATE t SET a = %s', 1))
+    assert nrows == (1, 1)
+    assert sql._pool.log == [
+        'UPDATE t SET a = 1', 'ROLLBACK 0', 'UPDATE t SET a = 1', 'COMMIT 1']
+
+
+def test_transaction_is_not_retried(sql):
+    sql._pool.free[0].failures = 1
+
+    async def run():
+        async with sql:
+            await sql.extract('SELECT id FROM t')
+
+    with pytest.raises(pymysql.err.OperationalError):
+        asyncio.run(run())
+    assert sql._pool.log == ['BEGIN 0', 'SELECT id FROM t', 'ROLLBACK 0']
+
+
+def test_insert_df_in_transaction(sql):
+    df = pd.DataFrame({'id': [1, 2], 'name': ['a', None]})
+
+    async def run():
+        async with sql:
+            return await sql.insert_df(df, 't', batch_size=1)
+
+    assert asyncio.run(run()) == (2, 1)
+    assert sql._pool.log == [
+        'BEGIN 0', 'SELECT @@max_allowed_packet',
+        "INSERT INTO t (id,name) VALUES (1,'a')",
+        'INSERT INTO t (id,name) VALUES (2,NULL)', 'COMMIT 0'
+    ]
+
+
+def test_named_lock_holds_its_connection(sql):
+    async def run():
+        async with sql.named_lock('job', 10):
+            return len(sql._pool.free)
+
+    assert asyncio.run(run()) == 1
+    assert sql._pool.log == [
+        "SELECT GET_LOCK('job', 10)", 'COMMIT 0',
+        "SELECT RELEASE_LOCK('job')", 'COMMIT 0'
+    ]
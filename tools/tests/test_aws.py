@@ -0,0 +1,54 @@
+import gc
+
+import pytest
+
+pytest.importorskip('boto3')
+from tools.aws import S3UploadStream  # noqa: E402
+
+
+class StubS3:
+    """Records the multipart upload calls of a S3 client"""
+    def __init__(self):
+        self.calls = []
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.calls.append('create')
+        return {'UploadId': 'u'}
+
+    def upload_part(self, PartNumber, **kwargs):
+        self.calls.append(f'part {PartNumber}')
+        return {'ETag': str(PartNumber)}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.calls.append('complete')
+
+    def abort_multipart_upload(self, **kwargs):
+        self.calls.append('abort')
+
+
+def test_close_completes_upload():
+    s3 = StubS3()
+    stream = S3UploadStream(s3, 'bucket', 'key')
+    stream.write(b'data')
+    stream.close()
+    del stream
+    gc.collect()
+    assert s3.calls == ['create', 'part 1', 'complete']
+
+
+def test_with_aborts_on_error():
+    s3 = StubS3()
+    with pytest.raises(ZeroDivisionError):
+        with S3UploadStream(s3, 'bucket', 'key') as stream:
+            stream.write(b'data')
+            1 / 0
+    assert s3.calls == ['create', 'abort']
+
+
+def test_dropped_stream_is_aborted():
+    s3 = StubS3()
+    stream = S3UploadStream(s3, 'bucket', 'key')
+    stream.write(b'data')
+    del stream
+    gc.collect()
+    assert s3.calls == ['create', 'abort']
@@ -0,0 +1,124 @@
+import os
+
+import pandas as pd
+import pytest
+
+from fake_pymysql import FakeConnection
+from tools.dbapi import QueryCache
+from tools.sql import GrabMySQL
+
+
+@pytest.fixture
+def now(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('tools.dbapi.time.time', lambda: now[0])
+    return now
+
+
+def _df(n):
+    return pd.DataFrame({'id': range(n)})
+
+
+def test_lru_eviction():
+    size = int(_df(100).memory_usage(deep=True, index=True).sum())
+    cache = QueryCache(max_bytes=2 * size)
+    cache.put('a', _df(100))
+    cache.put('b', _df(100))
+    assert cache.get('a') is not None  # 'b' becomes the least recently used
+    cache.put('c', _df(100))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 2 * size
+
+
+def test_ttl(now):
+    cache = QueryCache(ttl=60)
+    cache.put('a', _df(3))
+    now[0] += 60
+    assert cache.get('a') is not None
+    assert cache.get('a', ttl=10) is None  # Expired entries are dropped
+    assert len(cache) == 0
+    cache.put('a', _df(3))
+    now[0] += 61
+    assert cache.get('a') is None
+    assert cache.stats()['misses'] == 2
+
+
+def test_returns_copies():
+    cache = QueryCache()
+    df = _df(3)
+    cache.put('a', df)
+    df.loc[0, 'id'] = 10
+    cached = cache.get('a')
+    cached.loc[1, 'id'] = 10
+    assert cache.get('a')['id'].tolist() == [0, 1, 2]
+
+
+def test_disk_tier(tmp_path, now):
+    cache = QueryCache(path=tmp_path, max_bytes=0, ttl=60)
+    cache.put('a', _df(3))
+    cache.put('b', _df(3))
+    assert len(cache) == 1  # 'a' evicted from memory, kept on disk
+    for file in tmp_path.iterdir():
+        os.utime(file, (now[0], now[0]))
+    pd.testing.assert_frame_equal(cache.get('a'), _df(3))
+    assert cache.stats()['disk_hits'] == 1
+    # Read from disk by another cache, until it expires
+    other = QueryCache(path=tmp_path)
+    assert other.get('b', ttl=60) is not None
+    now[0] += 61
+    assert other.get('b', ttl=60) is None
+
+
+def test_disk_size_limit(tmp_path):
+    cache = QueryCache(path=tmp_path, max_disk_bytes=0)
+    cache.put('a', _df(3))
+    assert not list(tmp_path.iterdir())
+    assert cache.get('a') is not None  # Still in memory
+
+
+def test_extract_caches_on_request():
+    con = FakeConnection(10)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.cache = QueryCache()
+        for _ in range(2):
+            sql.extract('SELECT * FROM t')
+        assert len(con.queries) == 2  # Not cached without ttl
+        for _ in range(2):
+            assert len(sql.extract('SELECT * FROM t', ttl=60)) == 10
+        assert len(con.queries) == 3
+        sql.extract('SELECT * FROM t', ttl=0)
+        assert len(con.queries) == 4
+        # Keyed by the parameters
+        sql.extract('SELECT * FROM t WHERE id = %s', 1, ttl=60)
+        sql.extract('SELECT * FROM t WHERE id = %s', 2, ttl=60)
+        assert len(con.queries) == 6
+
+
+def test_never_inside_transaction():
+    con = FakeConnection(10)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.cache = QueryCache()
+        sql.extract('SELECT * FROM t', ttl=60)
+        n_queries = len(con.queries)
+        with sql:
+            sql.extract('SELECT * FROM t', ttl=60)
+            sql.extract('SELECT * FROM u', ttl=60)
+        assert len(con.queries) == n_queries + 2
+        assert sql.cache.stats()['entries'] == 1
+
+
+def test_named_lock_not_cached():
+    con = FakeConnection(1)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.cache = QueryCache()
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                with sql.named_lock('job', 10):
+                    pass
+    assert sum(q.startswith('SELECT GET_LOCK') for q in con.queries) == 2
+    assert len(sql.cache) == 0
@@ -0,0 +1,129 @@
+import datetime
+import decimal
+import warnings
+
+import pandas as pd
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.sql import CONVERSIONS, GrabMySQL
+
+
+def _values(*values):
+    return lambda i: values[i % len(values)]
+
+
+COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, lambda i: i),
+    ('big', FIELD_TYPE.LONGLONG, True, _values(1, None, 2**64 - 1, 2**63)),
+    ('amount', FIELD_TYPE.NEWDECIMAL, True,
+     _values(decimal.Decimal('1.10'), None, decimal.Decimal('-0.01'))),
+    ('created', FIELD_TYPE.DATETIME, True,
+     _values(datetime.datetime(2024, 1, 1, 12), None,
+             '0000-00-00 00:00:00')),
+    ('day', FIELD_TYPE.DATE, True,
+     _values(datetime.date(2024, 2, 29), '0000-00-00', None)),
+    ('ratio', FIELD_TYPE.DOUBLE, True, _values(0.5, None, -1e300)),
+    ('status', FIELD_TYPE.VAR_STRING, True, _values('a', None, 'é')),
+)
+
+
+def _extract(conversion, columns=COLUMNS, n_rows=12):
+    con = FakeConnection(n_rows, columns, raw=True)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.conversion = conversion
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            return sql.extract('SELECT * FROM t')
+
+
+def _python_values(df):
+    return [[None if pd.isna(v) else v for v in row]
+            for row in df.astype(object).itertuples(index=False)]
+
+
+@pytest.mark.parametrize('conversion', ['fast', 'fast_exact'])
+def test_fast_values_equal_python(conversion):
+    python = _extract('python')
+    fast = _extract(conversion)
+    if conversion == 'fast':
+        # Decimals are floats
+        python['amount'] = python['amount'].astype(float)
+    assert list(fast.dtypes) == list(python.dtypes)
+    assert _python_values(fast) == _python_values(python)
+    assert isinstance(fast.loc[2, 'big'], int)
+    assert fast.loc[2, 'created'] == '0000-00-00 00:00:00'
+    assert fast.loc[0, 'created'] == datetime.datetime(2024, 1, 1, 12)
+
+
+@pytest.mark.parametrize('conversion', CONVERSIONS)
+def test_valid_values_are_typed(conversion):
+    columns = tuple(
+        (name, type_code, nullable, _values(value(0), None))
+        for name, type_code, nullable, value in COLUMNS
+    )
+    df = _extract(conversion, columns)
+    assert str(df['big'].dtype) == 'Int64'
+    assert str(df['created'].dtype).startswith('datetime64')
+    assert str(df['day'].dtype).startswith('datetime64')
+    assert df['ratio'].dtype == float
+
+
+@pytest.mark.parametrize('conversion', CONVERSIONS)
+def test_extract_iter_chunks_concat_to_extract(conversion):
+    con = FakeConnection(12, COLUMNS, raw=True)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.conversion = conversion
+        df = sql.extract('SELECT * FROM t')
+        chunks = list(sql.extract_iter('SELECT * FROM t', chunksize=2))
+    # The chunks of valid values only are typed
+    assert str(chunks[0]['big'].dtype) == 'Int64'
+    assert chunks[1]['big'].dtype == object
+    concat = pd.concat(chunks, ignore_index=True)
+    assert list(concat.dtypes) == list(df.dtypes)
+
+
+@pytest.mark.parametrize('conversion', CONVERSIONS)
+def test_extract_iter_coerce_gives_stable_dtypes(conversion):
+    con = FakeConnection(12, COLUMNS, raw=True)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.conversion = conversion
+        chunks = list(sql.extract_iter(
+            'SELECT * FROM t', chunksize=2, errors='coerce'))
+    assert all(list(c.dtypes) == list(chunks[0].dtypes) for c in chunks)
+    assert str(chunks[0]['big'].dtype) == 'Int64'
+    assert str(chunks[0]['created'].dtype).startswith('datetime64')
+    assert str(chunks[0]['day'].dtype).startswith('datetime64')
+    df = pd.concat(chunks, ignore_index=True)
+    # Out of range integers and zero dates are nulls
+    assert df['big'].isna().tolist() == [False, True, True, True] * 3
+    assert df['created'].isna().tolist() == [False, True, True] * 4
+    assert df['day'].isna().tolist() == [False, True, True] * 4
+
+
+def test_coerce_not_null_integers_raises():
+    columns = (('id', FIELD_TYPE.LONGLONG, False, _values(1, 2**64 - 1)),)
+    con = FakeConnection(2, columns, raw=True)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        with pytest.raises(ValueError, match='NOT NULL'):
+            list(sql.extract_iter('SELECT * FROM t', errors='coerce'))
+        with pytest.raises(ValueError, match='errors'):
+            list(sql.extract_iter('SELECT * FROM t', errors='raise'))
+
+
+@pytest.mark.parametrize('conversion', CONVERSIONS)
+def test_sentinel_dates_are_kept(conversion):
+    columns = (('until', FIELD_TYPE.DATETIME, True, _values(
+        datetime.datetime(9999, 12, 31, 23, 59, 59), None)),)
+    con = FakeConnection(2, columns, raw=True)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.conversion = conversion
+        df = sql.extract('SELECT * FROM t')
+    assert str(df['until'].dtype).startswith('datetime64')
+    assert df['until'][0] == pd.Timestamp('9999-12-31 23:59:59')
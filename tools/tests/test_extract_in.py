@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL
+
+
+@pytest.fixture
+def con():
+    # The helper pools of the chunks share this connection
+    con = FakeConnection(2)
+    with con.patch():
+        yield con
+
+
+def test_chunks_below_threshold(con):
+    sql = GrabMySQL({'host': 'fake'})
+    n_queries = len(con.queries)
+    df = sql.extract_in(
+        'SELECT * FROM d WHERE status = %s AND {in} AND country_id = %s',
+        'id', [3, 1, 3, None, 2, 5, 1, np.nan, 4], ('open', 7),
+        chunk_size=2, temp_table_threshold=6)
+    # 5 distinct keys in 3 chunks, extracted on the helper pool
+    assert len(df) == 3 * 2
+    queries = sorted(
+        q for q in con.queries[n_queries:] if q.startswith('SELECT * FROM d'))
+    assert queries == [
+        f"SELECT * FROM d WHERE status = 'open' AND id IN {keys} "
+        'AND country_id = 7' for keys in ('(2,5)', '(3,1)', '(4)')
+    ]
+
+
+def test_chunks_named_params(con):
+    sql = GrabMySQL({'host': 'fake'})
+    with sql:
+        sql.extract_in(
+            'SELECT * FROM d WHERE {in} AND status = %(status)s', 'code',
+            pd.Series(['b', 'a', 'b']), {'status': 'open'}, chunk_size=1)
+    # In transaction mode, the chunks run in order on this connection
+    assert con.queries[-2:] == [
+        "SELECT * FROM d WHERE code IN ('b') AND status = 'open'",
+        "SELECT * FROM d WHERE code IN ('a') AND status = 'open'",
+    ]
+
+
+def test_temp_table_above_threshold(con):
+    sql = GrabMySQL({'host': 'fake'})
+    n_queries = len(con.queries)
+    df = sql.extract_in(
+        'SELECT * FROM d WHERE {in} AND country_id = %s', 'id',
+        [3, 1, 3, None, 2, 1], (7, ), temp_table_threshold=3)
+    assert len(df) == 2
+    # Each key is inserted once, and the nulls do not make them floats
+    assert con.queries[n_queries:] == [
+        'DROP TEMPORARY TABLE IF EXISTS _extract_in',
+        'CREATE TEMPORARY TABLE _extract_in (v BIGINT NOT NULL PRIMARY KEY)',
+        'SELECT @@max_allowed_packet',
+        'INSERT INTO _extract_in (v) VALUES (3),(1),(2)',
+        'SELECT * FROM d WHERE id IN (SELECT v FROM _extract_in) '
+        'AND country_id = 7',
+        'DROP TEMPORARY TABLE _extract_in',
+    ]
+    sql.extract_in(
+        'SELECT * FROM d WHERE {in}', 'code', ['ab', 'c'],
+        strategy='temp_table', key_type='VARCHAR(2) COLLATE utf8mb4_bin')
+    assert con.queries[-4] == (
+        'CREATE TEMPORARY TABLE _extract_in '
+        '(v VARCHAR(2) COLLATE utf8mb4_bin NOT NULL PRIMARY KEY)')
+
+
+def test_empty_keys(con):
+    sql = GrabMySQL({'host': 'fake'})
+    for strategy in ('chunks', 'temp_table'):
+        n_queries = len(con.queries)
+        df = sql.extract_in(
+            'SELECT * FROM d WHERE {in} AND country_id = %s', 'id',
+            [None, np.nan], (7, ), strategy=strategy)
+        # No temporary table nor IN list: a single query matching no rows
+        assert con.queries[n_queries:] == [
+            'SELECT * FROM d WHERE FALSE AND country_id = 7']
+        assert len(df) == 2  # The fake server answers every SELECT
+    with pytest.raises(ValueError):
+        sql.extract_in('SELECT * FROM d WHERE id IN %s', 'id', [1])
+    with pytest.raises(ValueError):
+        sql.extract_in('SELECT * FROM d WHERE {in}', 'id', [1], strategy='x')
@@ -0,0 +1,98 @@
+import datetime
+import re
+
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection, description
+from tools.incremental import IncrementalExtractor, WatermarkStore
+from tools.sql import GrabMySQL
+
+COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, None),
+    ('updated', FIELD_TYPE.LONGLONG, False, None),
+)
+
+
+@pytest.fixture
+def sql():
+    """GrabMySQL on a fake table of 12 rows (id, updated = id // 3)"""
+    rows = [(i, i // 3) for i in range(12)]
+    con = FakeConnection(0)
+
+    def answer(query):
+        if not query.startswith('SELECT * FROM t WHERE'):
+            return None
+        after = re.search(r'updated > (\d+)', query)
+        tie = re.search(r'id > (\d+)', query)
+        limit = int(re.search(r'LIMIT (\d+)$', query).group(1))
+        selected = sorted(rows, key=lambda row: (row[1], row[0]))
+        if tie:
+            start = (int(after.group(1)), int(tie.group(1)))
+            selected = [r for r in selected if (r[1], r[0]) > start]
+        elif after:
+            selected = [r for r in selected if r[1] > int(after.group(1))]
+        return description(COLUMNS), tuple(selected[:limit])
+
+    con._answer = answer
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.fake = con
+        yield sql
+
+
+@pytest.mark.parametrize('name', ['watermarks.db', 'watermarks.json'])
+def test_store_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    store = WatermarkStore(path)
+    assert store.get('job') == (None, None)
+    updated = datetime.datetime(2024, 5, 1, 12, 30, 15, 250000)
+    store.set('job', updated, 42)
+    store.set('other', datetime.date(2024, 5, 1), 'ADR-1')
+    # Another store on the same path reads the persisted pairs back
+    store = WatermarkStore(path)
+    assert store.get('job') == (updated, 42)
+    watermark, tie = store.get('other')
+    assert type(watermark) is datetime.date and tie == 'ADR-1'
+    store.set('job', 7.5)
+    assert store.get('job') == (7.5, None)
+    store.delete('job')
+    assert store.get('job') == (None, None)
+    assert store.get('other') == (datetime.date(2024, 5, 1), 'ADR-1')
+
+
+def test_pages_split_ties(sql, tmp_path):
+    job = IncrementalExtractor(
+        sql, 'job', 't', 'updated', str(tmp_path / 'w.db'), tie_column='id',
+        page_size=4)
+    pages = list(job.pages())
+    ids = [i for df, _ in pages for i in df['id']]
+    # The pages end within the groups of equal `updated`
+    assert ids == list(range(12))
+    assert [position for _, position in pages] == [(1, 3), (2, 7), (3, 11)]
+    assert sql.fake.queries[1].startswith(
+        'SELECT * FROM t WHERE (updated > 1 OR (updated = 1 AND id > 3))')
+    # `pages` does not persist the watermark, `run` does
+    assert job.watermark == (None, None)
+    assert job.run(lambda df: None) == 12
+    assert job.watermark == (3, 11)
+    assert job.run(lambda df: None) == 0
+
+
+def test_overlap_never_moves_watermark_back(sql, tmp_path):
+    job = IncrementalExtractor(
+        sql, 'job', 't', 'updated', str(tmp_path / 'w.json'),
+        tie_column='id', page_size=4, overlap=2)
+    job.reset(2, 8)
+    seen, ids = [], []
+
+    def sink(df):
+        seen.append(job.watermark)
+        ids.extend(df['id'])
+
+    assert job.run(sink) == 9
+    seen.append(job.watermark)
+    # The overlap re-extracts from `updated > 0`: the first page ends at
+    # (2, 6), before the persisted (2, 8)
+    assert ids == list(range(3, 12))
+    assert seen == [(2, 8), (2, 8), (3, 10), (3, 11)]
@@ -0,0 +1,67 @@
+import re
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL, _tsv_field, _tsv_hex
+
+
+@pytest.fixture
+def con():
+    con = FakeConnection(0)
+    with con.patch():
+        yield con
+
+
+def test_tsv_fields():
+    assert _tsv_field(None) == '\\N'
+    assert _tsv_field('a\tb\\c\n') == 'a\\tb\\\\c\\n'
+    assert _tsv_field(True) == '1'
+    assert _tsv_hex(b'\x00\t\xff') == '0009ff'
+    assert _tsv_hex('é') == 'c3a9'
+    assert _tsv_hex(None) == '\\N'
+
+
+def test_load_data_stages_rows(con, tmp_path):
+    sql = GrabMySQL({'host': 'fake', 'local_infile': True})
+    df = pd.DataFrame({
+        'id': [1, 2], 'name': ['a\tb', None], 'data': [b'\x00\xff', 'x']})
+    files = {}
+
+    def keep(path):
+        with open(path, encoding='utf-8') as file:
+            files[path] = file.read()
+
+    with mock.patch('tools.sql.os.remove', side_effect=keep):
+        sql.insert_df(df, 'db.t', load_data=True)
+    statements = con.queries[-5:]
+    assert statements[0] == 'DROP TEMPORARY TABLE IF EXISTS `_load_staging`'
+    # The staging table has no keys: duplicates raise in INSERT ... SELECT
+    assert statements[1] == (
+        'CREATE TEMPORARY TABLE `_load_staging` '
+        'SELECT id,name,data FROM db.t LIMIT 0')
+    assert re.fullmatch(
+        r"LOAD DATA LOCAL INFILE '.+\.tsv' INTO TABLE `_load_staging` "
+        r'CHARACTER SET utf8mb4 \(id,name,@_hex2\) SET data = UNHEX\(@_hex2\)',
+        statements[2]
+    )
+    assert statements[3] == (
+        'INSERT INTO db.t (id,name,data) '
+        'SELECT id,name,data FROM `_load_staging`')
+    [content] = files.values()
+    assert content == '1\ta\\tb\t00ff\n2\t\\N\t78\n'
+
+
+def test_load_data_on_duplicate_update(con):
+    sql = GrabMySQL({'host': 'fake'})
+    df = pd.DataFrame({'id': [1], 'name': ['a']})
+    sql.insert_df(
+        df, '`db`.`t`', on_dupl_update_clmns=['name'], load_data=True)
+    assert con.queries[-4] == (
+        'CREATE TEMPORARY TABLE `_load_staging` SELECT id,name FROM `db`.`t` '
+        'LIMIT 0')
+    assert con.queries[-2].startswith(
+        'INSERT INTO `db`.`t` (id,name) SELECT id,name FROM `_load_staging` '
+        'ON DUPLICATE KEY UPDATE')
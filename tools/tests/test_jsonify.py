@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from tools import sql as sql_module
+from tools.sql import jsonify_sql_dir
+
+SQL = 'SELECT * FROM t WHERE country_id = {{country>number>1}}'
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding='utf-8')
+
+
+def test_json_folder_mirrors_subfolders(tmp_path):
+    _write(tmp_path / 'sql' / 'a' / 'q.sql', SQL)
+    _write(tmp_path / 'sql' / 'b' / 'q.sql', SQL + ' AND id = 2')
+    converted = jsonify_sql_dir(
+        tmp_path / 'sql', tmp_path / 'json', pattern='**/*.sql', n_workers=1)
+    assert len(converted) == 2
+    for sub in ('a', 'b'):
+        with open(tmp_path / 'json' / sub / 'q.sql.json') as file:
+            assert json.load(file)['sql'].startswith(SQL)
+    # Unchanged files are skipped
+    assert jsonify_sql_dir(
+        tmp_path / 'sql', tmp_path / 'json', pattern='**/*.sql') == []
+
+
+def test_collisions_are_rejected(tmp_path):
+    _write(tmp_path / 'sql' / 'a' / 'q.sql', SQL)
+    _write(tmp_path / 'sql' / 'b' / 'q.sql', SQL)
+    with pytest.raises(ValueError, match='same json file'):
+        jsonify_sql_dir(tmp_path / 'sql', pattern='**/*.sql')
+    assert not (tmp_path / 'sql' / 'q.sql.json').exists()
+
+
+def test_errors_are_reported_by_kind(tmp_path):
+    _write(tmp_path / 'sql' / 'ok.sql', SQL)
+    _write(tmp_path / 'sql' / 'bad.sql', 'SELECT {{country>numeric}}')
+    _write(tmp_path / 'sql' / 'latin1.sql', 'SELECT \'é\''.encode('latin1'))
+    with pytest.raises(ValueError) as info:
+        jsonify_sql_dir(tmp_path / 'sql', tmp_path / 'json', n_workers=1)
+    message = str(info.value)
+    assert '1 .sql files with invalid parameters:\nbad.sql' in message
+    assert '1 .sql files which are not valid UTF-8:\nlatin1.sql' in message
+    assert (tmp_path / 'json' / 'ok.sql.json').is_file()
+
+
+def _manifest(folder):
+    with open(folder / '.jsonify_manifest.json') as file:
+        return json.load(file)
+
+
+def test_manifest_saved_before_unexpected_error(tmp_path, monkeypatch):
+    for name in ('a', 'b', 'c'):
+        _write(tmp_path / 'sql' / f'{name}.sql', SQL)
+    jsonify_checked = sql_module._jsonify_checked
+
+    def fail_on_b(path_sql, path_json):
+        if path_sql.endswith('b.sql'):
+            raise PermissionError(path_json)
+        return jsonify_checked(path_sql, path_json)
+
+    monkeypatch.setattr(sql_module, '_jsonify_checked', fail_on_b)
+    with pytest.raises(PermissionError):
+        jsonify_sql_dir(tmp_path / 'sql', tmp_path / 'json', n_workers=1)
+    assert sorted(_manifest(tmp_path / 'sql')) == ['a.sql', 'c.sql']
+    monkeypatch.setattr(sql_module, '_jsonify_checked', jsonify_checked)
+    converted = jsonify_sql_dir(tmp_path / 'sql', tmp_path / 'json')
+    assert converted == [str(tmp_path / 'sql' / 'b.sql')]
+
+
+def test_manifest_forgets_deleted_files(tmp_path):
+    for name in ('a', 'b'):
+        _write(tmp_path / 'sql' / f'{name}.sql', SQL)
+    jsonify_sql_dir(tmp_path / 'sql', tmp_path / 'json', n_workers=1)
+    (tmp_path / 'sql' / 'a.sql').unlink()
+    assert jsonify_sql_dir(tmp_path / 'sql', tmp_path / 'json') == []
+    assert list(_manifest(tmp_path / 'sql')) == ['b.sql']
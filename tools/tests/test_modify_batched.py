@@ -0,0 +1,141 @@
+import logging
+import re
+from unittest import mock
+
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection, description
+from tools.sql import GrabMySQL
+
+KEY = description((('id', FIELD_TYPE.LONGLONG, True, None), ))
+
+
+class FakeTable:
+    """Answers the range and `UPDATE` queries of `modify_batched` on a table
+    of keys 1 to `n_rows`, and advances a clock of `cost(key)` seconds for
+    each updated row.
+
+    """
+    def __init__(self, n_rows, cost):
+        self.keys = list(range(1, n_rows + 1))
+        self.cost = cost
+        self.clock = 0.0
+
+
+    def after(self, query):
+        match = re.search(r'id > (\d+)', query)
+        lo = int(match.group(1)) if match else 0
+        return [k for k in self.keys if k > lo]
+
+
+    def __call__(self, query):
+        keys = self.after(query)
+        offset = re.search(r'LIMIT 1 OFFSET (\d+)$', query)
+        if offset:
+            offset = int(offset.group(1))
+            return KEY, ((keys[offset], ), ) if offset < len(keys) else ()
+        if query.startswith('SELECT MAX(id)'):
+            return KEY, ((max(keys, default=None), ), )
+        if query.startswith(('UPDATE', 'DELETE')):
+            hi = int(re.search(r'id <= (\d+)$', query).group(1))
+            rows = [k for k in keys if k <= hi]
+            self.clock += sum(self.cost(k) for k in rows)
+            return None, tuple((k, ) for k in rows)
+        return None
+
+
+class FakeReplica:
+
+    def __init__(self, *lags):
+        self.lags = list(lags)
+
+
+    def replication_lag(self):
+        return self.lags.pop(0) if len(self.lags) > 1 else self.lags[0]
+
+
+@pytest.fixture
+def table():
+    # Updating a row takes 1/64s up to the key 100, then 1/8s
+    table = FakeTable(200, lambda key: 1 / 64 if key <= 100 else 1 / 8)
+    con = FakeConnection(0)
+    con._answer = table
+    with con.patch(), \
+            mock.patch('tools.sql.time.perf_counter', lambda: table.clock), \
+            mock.patch('tools.sql.time.sleep') as sleep:
+        table.sql = GrabMySQL({'host': 'fake'})
+        table.con, table.sleep = con, sleep
+        yield table
+
+
+def test_batch_size_adapts(table):
+    states = []
+    total, last_key = table.sql.modify_batched(
+        'UPDATE t SET flag = 1 WHERE flag = 0', 'id', batch_size=10,
+        progress=states.append)
+    assert (total, last_key) == (200, 200)
+    sizes = [state['batch_size'] for state in states]
+    # At most doubled while fast, then at most halved when 8 times slower,
+    # so that each batch takes 0.5s
+    assert sizes[:8] == [10, 20, 32, 32, 32, 16, 8, 4]
+    assert set(sizes[7:]) == {4}
+    assert [state['last_key'] for state in states[:8]] == [
+        10, 30, 62, 94, 126, 142, 150, 154]
+    assert sum(state['rows'] for state in states) == 200
+    updates = [q for q in table.con.queries if q.startswith('UPDATE')]
+    assert updates[:2] == [
+        'UPDATE t SET flag = 1 WHERE (flag = 0) AND id <= 10',
+        'UPDATE t SET flag = 1 WHERE (flag = 0) AND id > 10 AND id <= 30',
+    ]
+    assert updates[-1].endswith('id > 198 AND id <= 200')
+
+
+def test_batch_size_bounds(table):
+    table.keys = list(range(1, 1001))
+    table.cost = lambda key: 1
+    states = []
+    table.sql.modify_batched(
+        'DELETE FROM t', 'id', batch_size=200, progress=states.append)
+    # Never below 1/100 of the initial size
+    sizes = [state['batch_size'] for state in states]
+    assert sizes[:9] == [200, 100, 50, 25, 12, 6, 3, 2, 2]
+    assert min(sizes) == 2
+    table.cost = lambda key: 0
+    states.clear()
+    table.sql.modify_batched(
+        'DELETE FROM t', 'id', batch_size=2, progress=states.append)
+    # Nor above 10 times the initial size
+    sizes = [state['batch_size'] for state in states]
+    assert sizes == [2, 4, 8, 16] + [20] * 49
+
+
+def test_range_end(table):
+    sql = table.sql
+    assert sql._range_end('t', 'id', None, 10) == 10
+    assert sql._range_end('t', 'id', 10, 50) == 60
+    # The last range ends at the maximum key
+    assert sql._range_end('t', 'id', 190, 50) == 200
+    assert table.con.queries[-2:] == [
+        'SELECT id FROM t WHERE id > 190 ORDER BY id LIMIT 1 OFFSET 49',
+        'SELECT MAX(id) FROM t WHERE id > 190',
+    ]
+    assert sql._range_end('t', 'id', 200, 50) is None
+
+
+def test_wait_replicas(table, caplog):
+    sql = table.sql
+    replicas = [FakeReplica(0), FakeReplica(30, 5, 0)]
+    assert sql._wait_replicas(replicas, 1, 64, 2) == 16
+    assert table.sleep.call_count == 2
+    # A stopped replication is reported, and does not pause the batches
+    with caplog.at_level(logging.WARNING):
+        assert sql._wait_replicas([FakeReplica(None)], 1, 64, 2) == 64
+    assert 'Replication stopped' in caplog.text
+    assert table.sleep.call_count == 2
+    replicas = [FakeReplica(None), FakeReplica(5, 0)]
+    assert sql._wait_replicas(replicas, 1, 64, 2) == 32
+    total, _ = sql.modify_batched(
+        'DELETE FROM t', 'id', batch_size=50, target_time=None,
+        replicas=[FakeReplica(None)], max_lag=1)
+    assert total == 200
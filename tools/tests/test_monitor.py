@@ -0,0 +1,73 @@
+from unittest import mock
+
+import pandas as pd
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.dbapi import QueryMonitor
+from tools.sql import GrabMySQL, GrabMySQLRouter
+
+
+def _connection(n_rows=10):
+    con = FakeConnection(n_rows)
+    con.answer(
+        'SELECT TIMER_WAIT',
+        (('t', FIELD_TYPE.DOUBLE, False, lambda i: 0.25), ))
+    return con
+
+
+@pytest.fixture
+def records():
+    return []
+
+
+@pytest.fixture
+def sql(records):
+    with _connection().patch():
+        sql = GrabMySQL({'host': 'fake'})
+    sql.monitor = QueryMonitor(server_timing=True)
+    sql.monitor.add_hook(records.append)
+    return sql
+
+
+def test_extract_iter_is_recorded(sql, records):
+    dfs = list(sql.extract_iter('SELECT * FROM t WHERE id > 3', chunksize=4))
+    assert sum(len(df) for df in dfs) == 10
+    [record] = records
+    assert record.fingerprint == 'SELECT * FROM t WHERE id > ?'
+    assert (record.kind, record.rows, record.server_time) == (
+        'extract', 10, 0.25)
+
+
+def test_extract_to_parquet_is_recorded(sql, records, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'out.parquet')
+    nrows, nbytes = sql.extract_to_parquet('SELECT * FROM t', None, path)
+    [record] = records
+    assert (record.kind, record.rows) == ('extract', nrows)
+    assert record.bytes == nbytes + len('SELECT * FROM t')
+
+
+def test_insert_df_is_recorded(sql, records):
+    df = pd.DataFrame({'id': range(1000), 'name': ['a'] * 1000})
+    sql.insert_df(df, 't', batch_size=300)
+    inserts = [r for r in records if r.kind == 'modify']
+    assert len(inserts) == 4
+    assert {r.fingerprint for r in inserts} == {
+        'INSERT INTO t (id,name) VALUES (?+)'}
+
+
+def test_router_times_queries_on_replica(records):
+    primary, replica = _connection(), _connection()
+    with mock.patch('pymysql.connect', side_effect=[primary, replica]):
+        router = GrabMySQLRouter({'host': 'primary'}, [{'host': 'replica'}])
+    router.monitor = QueryMonitor(slow_threshold=0, server_timing=True)
+    router.monitor.add_hook(records.append)
+    router.extract('SELECT * FROM t')
+    list(router.extract_iter('SELECT * FROM t'))
+    assert len(records) == 2
+    for con, n_queries in ((primary, 0), (replica, 2)):
+        assert sum('performance_schema' in q for q in con.queries) == (
+            n_queries)
+        assert sum(q.startswith('EXPLAIN') for q in con.queries) == n_queries
@@ -0,0 +1,65 @@
+import threading
+
+import pandas as pd
+
+from tools.multidb import MultiDB
+
+
+class Target:
+    """Target returning a fixed result"""
+    def __init__(self, df):
+        self.df = df
+
+
+    def extract(self, query, params=None):
+        return self.df.copy()
+
+
+def test_source_column_collision_fails_only_its_target():
+    dbs = MultiDB({
+        'a': Target(pd.DataFrame({'id': [1, 2]})),
+        'b': Target(pd.DataFrame({'source': ['x'], 'id': [3]})),
+    })
+    frame, errors = dbs.extract('SELECT * FROM t')
+    assert list(frame.columns) == ['source', 'id']
+    assert list(frame['source']) == ['a', 'a']
+    assert list(errors) == ['b']
+    assert isinstance(errors['b'], ValueError)
+    assert "'source' column" in str(errors['b'])
+
+
+def test_custom_source_column():
+    dbs = MultiDB(
+        {'b': Target(pd.DataFrame({'source': ['x']}))}, source_column='db')
+    frame, errors = dbs.extract('SELECT * FROM t')
+    assert errors == {}
+    assert frame.to_dict('list') == {'db': ['b'], 'source': ['x']}
+
+
+class SlowTarget(Target):
+    """Target blocked until `release` is set"""
+    def __init__(self, df):
+        super().__init__(df)
+        self.release = threading.Event()
+
+
+    def extract(self, query, params=None):
+        self.release.wait(10)
+        return super().extract(query, params)
+
+
+def test_timed_out_target_does_not_block_exit():
+    slow = SlowTarget(pd.DataFrame({'id': [2]}))
+    dbs = MultiDB({'a': Target(pd.DataFrame({'id': [1]})), 'slow': slow})
+    frame, errors = dbs.extract('SELECT * FROM t', timeout=0.05)
+    assert frame['id'].tolist() == [1]
+    assert isinstance(errors['slow'], TimeoutError)
+    # Not joined at interpreter exit
+    [thread] = [t for t in threading.enumerate() if t.name == 'MultiDB-slow']
+    assert thread.daemon
+    _, errors = dbs.extract('SELECT * FROM t', targets=['slow'])
+    assert isinstance(errors['slow'], RuntimeError)
+    slow.release.set()
+    thread.join(5)
+    frame, errors = dbs.extract('SELECT * FROM t', targets=['slow'])
+    assert errors == {} and frame['id'].tolist() == [2]
@@ -0,0 +1,88 @@
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL, _keyset_condition
+
+
+def key_columns(start):
+    """Columns (country_id, id) of rows `start`, `start + 1`... with two rows
+    per country, so that the pages end within a country.
+
+    """
+    return (
+        ('country_id', FIELD_TYPE.LONG, False, lambda i: (start + i) // 2),
+        ('id', FIELD_TYPE.LONGLONG, False, lambda i: start + i),
+    )
+
+
+@pytest.fixture
+def con():
+    con = FakeConnection(0)
+    with con.patch():
+        yield con
+
+
+def test_keyset_condition():
+    assert _keyset_condition(['id']) == ('(id > %s)', [0])
+    condition, indices = _keyset_condition(['a', 'b', 'c'])
+    assert condition == (
+        'a >= %s AND ((a > %s) OR (a = %s AND b > %s) '
+        'OR (a = %s AND b = %s AND c > %s))')
+    assert indices == [0, 0, 0, 1, 0, 1, 2]
+    condition, _ = _keyset_condition(['a', 'b'], named=True)
+    assert condition == (
+        'a >= %(_after_0)s AND ((a > %(_after_0)s) '
+        'OR (a = %(_after_0)s AND b > %(_after_1)s))')
+
+
+def test_pages_follow_the_last_key(con):
+    # Pages of 3 rows: 0-2, 3-5, then an empty page
+    con.answer('SELECT * FROM t ORDER BY', key_columns(0), 3)
+    con.answer('SELECT * FROM t WHERE country_id >= 1 ', key_columns(3), 3)
+    con.answer('SELECT * FROM t WHERE country_id >= 2 ', key_columns(6), 0)
+    sql = GrabMySQL({'host': 'fake'})
+    pages = list(sql.extract_pages('t', ['country_id', 'id'], page_size=3))
+    assert [list(df['id']) for df, _ in pages] == [[0, 1, 2], [3, 4, 5]]
+    assert [key for _, key in pages] == [(1, 2), (2, 5)]
+    assert all(type(v) is int for v in pages[0][1])
+    # The first page ends within country 1, so its row 3 is not skipped
+    assert con.queries[-3:] == [
+        'SELECT * FROM t ORDER BY country_id, id LIMIT 3',
+        'SELECT * FROM t WHERE country_id >= 1 AND ((country_id > 1) '
+        'OR (country_id = 1 AND id > 2)) ORDER BY country_id, id LIMIT 3',
+        'SELECT * FROM t WHERE country_id >= 2 AND ((country_id > 2) '
+        'OR (country_id = 2 AND id > 5)) ORDER BY country_id, id LIMIT 3',
+    ]
+
+
+def test_short_page_is_the_last(con):
+    con.answer('SELECT * FROM t WHERE', key_columns(7), 2)
+    sql = GrabMySQL({'host': 'fake'})
+    n_queries = len(con.queries)
+    pages = list(sql.extract_pages(
+        't', ['country_id', 'id'], page_size=3, start_after=(3, 6)))
+    assert [key for _, key in pages] == [(4, 8)]
+    # No query for an empty page after the short one
+    assert con.queries[n_queries:] == [
+        'SELECT * FROM t WHERE country_id >= 3 AND ((country_id > 3) '
+        'OR (country_id = 3 AND id > 6)) ORDER BY country_id, id LIMIT 3']
+
+
+def test_query_params(con):
+    columns = key_columns(0)[1:]
+    con.answer('SELECT * FROM (SELECT', columns, 1)
+    sql = GrabMySQL({'host': 'fake'})
+    query = 'SELECT id FROM d WHERE status = %s'
+    list(sql.extract_pages(query, 'id', 5, ('open', ), start_after=9))
+    assert con.queries[-1] == (
+        "SELECT * FROM (SELECT id FROM d WHERE status = 'open') AS _pages "
+        'WHERE (id > 9) ORDER BY id LIMIT 5')
+    query = 'SELECT id FROM d WHERE status = %(status)s'
+    list(sql.extract_pages(
+        query, ['id'], 5, {'status': 'open'}, start_after=(9, )))
+    assert con.queries[-1] == (
+        "SELECT * FROM (SELECT id FROM d WHERE status = 'open') AS _pages "
+        'WHERE (id > 9) ORDER BY id LIMIT 5')
+    with pytest.raises(ValueError):
+        next(sql.extract_pages('t', ['country_id', 'id'], start_after=9))
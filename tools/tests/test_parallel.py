@@ -0,0 +1,58 @@
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL
+
+# First and last keys of 3 tiles of skewed keys
+TILES = (
+    ('min', FIELD_TYPE.LONGLONG, False, lambda i: (1, 40, 41)[i]),
+    ('max', FIELD_TYPE.LONGLONG, False, lambda i: (39, 40, 900)[i]),
+)
+
+
+def shards(con):
+    return sorted(q for q in con.queries if q.startswith('SELECT * FROM'))
+
+
+def test_quantile_bounds_in_one_query():
+    con = FakeConnection(1)
+    con.answer('SELECT MIN(k), MAX(k)', TILES, 3)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        n_queries = len(con.queries)
+        bounds = sql._quantile_bounds(
+            '(SELECT * FROM d WHERE status = %s) AS _source', 'id',
+            ('open', ), 3)
+        assert bounds == [1, 40, 41, 900]
+        assert con.queries[n_queries:] == [
+            'SELECT MIN(k), MAX(k) FROM (SELECT id AS k, NTILE(3) OVER '
+            "(ORDER BY id) AS tile FROM (SELECT * FROM d WHERE status = 'open')"
+            ' AS _source WHERE id IS NOT NULL) AS _tiles GROUP BY tile '
+            'ORDER BY tile'
+        ]
+        con.queries.clear()
+        df = sql.extract_parallel('d', 'id', n_workers=3, quantiles=True)
+    assert len(df) == 4
+    assert shards(con) == [
+        'SELECT * FROM d WHERE id >= 1 AND id < 40',
+        'SELECT * FROM d WHERE id >= 40 AND id < 41',
+        'SELECT * FROM d WHERE id >= 41 AND id <= 900',
+        'SELECT * FROM d WHERE id IS NULL',
+    ]
+
+
+def test_quantile_bounds_of_few_keys():
+    con = FakeConnection(1)
+    con.answer('SELECT MIN(k), MAX(k)', TILES, 0)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        assert sql._quantile_bounds('d', 'id', None, 4) == []
+        sql.extract_parallel('d', 'id', quantiles=True)
+        assert shards(con) == ['SELECT * FROM d WHERE id IS NULL']
+        # A single key makes a single shard
+        con.answers.clear()
+        con.answer('SELECT MIN(k), MAX(k)', (
+            ('min', FIELD_TYPE.LONGLONG, False, lambda i: 7),
+            ('max', FIELD_TYPE.LONGLONG, False, lambda i: 7),
+        ), 1)
+        assert sql._quantile_bounds('d', 'id', {'a': 1}, 4) == [7, 7]
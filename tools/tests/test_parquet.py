@@ -0,0 +1,113 @@
+import datetime
+import decimal
+import io
+
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools import dbapi
+from tools.sql import GrabMySQL, mysql_kind
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def _late(value, n_nulls=2):
+    """Value of the rows after the first `n_nulls` ones, which are NULL"""
+    return lambda i: None if i < n_nulls else value
+
+
+COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, lambda i: i),
+    ('amount', FIELD_TYPE.NEWDECIMAL, True, _late(decimal.Decimal('-12.34'))),
+    ('country_id', FIELD_TYPE.LONG, True, _late(3)),
+    ('created', FIELD_TYPE.DATETIME, True,
+     _late(datetime.datetime(2024, 1, 1))),
+    ('status', FIELD_TYPE.VAR_STRING, True, _late('approved')),
+)
+
+
+def _write(tmp_path, conversion, columns=COLUMNS):
+    con = FakeConnection(5, columns, raw=True)
+    # DECIMAL(10, 2): `pymysql` reports its display length as precision
+    con.description = tuple(
+        d[:4] + (12, 2) + d[6:] if d[1] == FIELD_TYPE.NEWDECIMAL else d
+        for d in con.description
+    )
+    path = str(tmp_path / 'out.parquet')
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sql.conversion = conversion
+        assert sql.extract_to_parquet(
+            'SELECT * FROM t', None, path, row_group_size=2)[0] == 5
+    return pq.read_table(path)
+
+
+@pytest.mark.parametrize('conversion', ['python', 'fast_exact'])
+def test_schema_from_description(tmp_path, conversion):
+    table = _write(tmp_path, conversion)
+    assert table.schema.field('amount').type == pa.decimal128(12, 2)
+    assert table.schema.field('country_id').type == pa.int64()
+    assert table.schema.field('created').type == pa.timestamp('us')
+    assert table.schema.field('status').type == pa.string()
+    assert table.column('amount').to_pylist() == (
+        [None, None] + [decimal.Decimal('-12.34')] * 3)
+
+
+def test_fast_decimals_are_floats(tmp_path):
+    table = _write(tmp_path, 'fast')
+    assert table.schema.field('amount').type == pa.float64()
+    assert table.column('amount').to_pylist() == [None, None] + [-12.34] * 3
+
+
+@pytest.mark.parametrize('conversion', ['python', 'fast'])
+def test_zero_dates_are_nulls(tmp_path, conversion):
+    created = datetime.datetime(2024, 1, 1)
+    columns = COLUMNS[:3] + ((
+        'created', FIELD_TYPE.DATETIME, True,
+        lambda i: '0000-00-00 00:00:00' if i == 3 else created),)
+    table = _write(tmp_path, conversion, columns)
+    assert table.schema.field('created').type == pa.timestamp('us')
+    assert table.column('created').to_pylist() == [
+        created, created, created, None, created]
+
+
+def _failing_fetchmany():
+    """Fetches a row group, then fails"""
+    rows = iter([((1, 'a'), (2, 'b'))])
+
+    def fetchmany(size):
+        try:
+            return next(rows)
+        except StopIteration:
+            raise ConnectionResetError('Lost connection') from None
+
+    return fetchmany
+
+
+DESCRIPTION = (
+    ('id', FIELD_TYPE.LONGLONG, None, None, None, None, 0),
+    ('status', FIELD_TYPE.VAR_STRING, None, None, None, None, 1),
+)
+
+
+def test_error_leaves_path_unchanged(tmp_path):
+    path = tmp_path / 'out.parquet'
+    path.write_bytes(b'previous')
+    with pytest.raises(ConnectionResetError):
+        dbapi.write_parquet(
+            _failing_fetchmany(), DESCRIPTION, mysql_kind, str(path), 2)
+    assert path.read_bytes() == b'previous'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.parquet']
+
+
+def test_error_stops_writing_to_file_object():
+    buffer = io.BytesIO()
+    with pytest.raises(ConnectionResetError):
+        dbapi.write_parquet(
+            _failing_fetchmany(), DESCRIPTION, mysql_kind, buffer, 2)
+    # No footer: the truncated file cannot be read as valid
+    assert not buffer.getvalue().endswith(b'PAR1')
+    with pytest.raises(pa.ArrowInvalid):
+        pq.read_table(io.BytesIO(buffer.getvalue()))
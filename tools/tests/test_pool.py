@@ -0,0 +1,90 @@
+import threading
+
+import pymysql
+import pytest
+
+from fake_pymysql import FakeConnection, FakeCursor
+from tools.sql import GrabMySQL
+
+
+@pytest.fixture
+def pool():
+    con = FakeConnection(10)
+    with con.patch():
+        pool = GrabMySQL.pool({'host': 'fake'}, min_size=0, max_size=2)
+        yield pool
+        pool.close()
+
+
+def test_checkin_reuses_connection(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert second is first
+    assert len(pool.extract('SELECT * FROM t')) == 10
+    assert pool._size == 1
+    assert len(pool._idle) == 1
+
+
+def test_full_pool_times_out(pool):
+    held = [pool.checkout(), pool.checkout()]
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.05)
+    pool.checkin(held.pop())
+    assert pool.checkout(timeout=0.05) is not None
+
+
+def test_checkin_wakes_waiter(pool):
+    held = [pool.checkout(), pool.checkout()]
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout(5)))
+    waiter.start()
+    pool.checkin(held[0])
+    waiter.join(5)
+    assert got == [held[0]]
+
+
+def test_closed_pool_refuses_checkout(pool):
+    sql = pool.checkout()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+    # Connections checked out before closing are closed on checkin
+    pool.checkin(sql)
+    assert pool._size == 0
+    assert not pool._idle
+
+
+def test_expired_connection_is_replaced(pool):
+    pool.max_lifetime = 0
+    with pool.connection() as first:
+        pass
+    assert pool._size == 0
+    with pool.connection() as second:
+        assert second is not first
+
+
+def test_retry_reconnects_after_failure(monkeypatch):
+    monkeypatch.setattr('backoff._sync.time.sleep', lambda seconds: None)
+    con = FakeConnection(10)
+    events = []
+    execute = FakeCursor.execute
+
+    def fail_once(cursor, query, args=None):
+        events.append('execute')
+        if events.count('execute') == 1:
+            raise pymysql.err.OperationalError(2013, 'Lost connection')
+        return execute(cursor, query, args)
+
+    monkeypatch.setattr(FakeCursor, 'execute', fail_once)
+    monkeypatch.setattr(con, 'ping', lambda reconnect=True: events.append(
+        f'ping reconnect={reconnect}'))
+    with con.patch():
+        pool = GrabMySQL.pool(
+            {'host': 'fake'}, min_size=1, max_size=1, idle_ping=30)
+        with pool.connection():
+            pass  # Used recently: no ping before the first attempt
+        assert len(pool.extract('SELECT * FROM t')) == 10
+        pool.close()
+    assert events == ['execute', 'ping reconnect=True', 'execute']
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.sql import iter_prepared, prepare_df
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, 5],
+        'amount': [1.5, np.nan, 2.25, 3.0, np.nan],
+        'country_id': pd.array([1, None, 3, None, 5], dtype='Int64'),
+        'created': [datetime.datetime(2020, 1, d) for d in range(1, 5)]
+                   + [pd.NaT],
+        'status': ['a', None, 'c', 'd', 'e'],
+    })
+
+
+def reference(df, type):
+    """Rows as built by the former `prepare_df`, with `df.where`"""
+    df = df.astype(object).where(pd.notnull(df), None)
+    if type == 'dict':
+        return df.to_dict('records')
+    rows = df.values.tolist()
+    return [tuple(row) for row in rows] if type == 'tuple' else rows
+
+
+@pytest.mark.parametrize('type', ['tuple', 'list', 'dict'])
+def test_prepare_df_matches_reference(df, type):
+    expected = reference(df, type)
+    assert prepare_df(df, type) == expected
+    batches = list(iter_prepared(df, type, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [row for batch in batches for row in batch] == expected
+
+
+def test_nulls_become_none(df):
+    before = df.copy()
+    rows = prepare_df(df, 'tuple')
+    assert rows[1] == (2, None, None, datetime.datetime(2020, 1, 2), None)
+    assert rows[4][3] is None
+    assert not any(isinstance(v, float) and np.isnan(v)
+                   for row in rows for v in row)
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_nulls_kept(df):
+    rows = prepare_df(df, 'list', null_to_none=False)
+    assert np.isnan(rows[1][1])
+    assert rows[4][3] is pd.NaT
+
+
+def test_empty_and_invalid_type(df):
+    assert prepare_df(df.iloc[:0]) == []
+    assert list(iter_prepared(df.iloc[:0])) == []
+    with pytest.raises(ValueError):
+        prepare_df(df, 'set')
@@ -0,0 +1,129 @@
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL, GrabMySQLRouter
+
+
+"""Every `SELECT` returns the row (0, 10), which suits the MIN/MAX query of
+`extract_parallel` as well as the shards"""
+COLUMNS = (
+    ('lo', FIELD_TYPE.LONGLONG, False, lambda i: 0),
+    ('hi', FIELD_TYPE.LONGLONG, False, lambda i: 10),
+)
+PRIMARY = {'host': 'primary'}
+REPLICAS = [{'host': 'replica'}]
+
+
+def _router():
+    with FakeConnection(1, COLUMNS).patch():
+        return GrabMySQLRouter(PRIMARY, REPLICAS)
+
+
+def test_pool():
+    with FakeConnection(1, COLUMNS).patch():
+        pool = GrabMySQLRouter.pool(
+            PRIMARY, REPLICAS, router_kwargs={'max_lag': 5})
+        with pool.connection() as sql:
+            assert isinstance(sql, GrabMySQLRouter)
+            assert sql.max_lag == 5
+            assert len(sql.extract('SELECT lo, hi FROM t')) == 1
+        pool.close()
+
+
+def test_extract_parallel():
+    router = _router()
+    with FakeConnection(1, COLUMNS).patch() as con:
+        df = router.extract_parallel('t', 'lo', n_workers=2)
+    assert len(df) == 3
+    assert con.round_trips
+
+
+def test_extract_in_chunks():
+    router = _router()
+    with FakeConnection(1, COLUMNS).patch():
+        df = router.extract_in(
+            'SELECT * FROM t WHERE {in}', 'lo', range(10), strategy='chunks',
+            chunk_size=2, n_workers=2
+        )
+    assert len(df) == 5
+
+
+def test_helper_pool_reads_from_replica():
+    router = _router()
+    pool = router._helper_pool(2)
+    assert pool._factory is GrabMySQL
+    assert pool._db_params == REPLICAS[0]
+    with router.primary():
+        assert router._helper_pool(2)._db_params == PRIMARY
+
+
+def _lagging_router(lags, **kwargs):
+    """Router to replicas whose `replication_lag` returns or raises the values
+    of `lags`, checked at each read.
+
+    """
+    with FakeConnection(1, COLUMNS).patch():
+        router = GrabMySQLRouter(
+            PRIMARY, [{'host': f'replica{i}'} for i in range(len(lags))],
+            check_interval=0, **kwargs
+        )
+    for i, replica in enumerate(router.replicas):
+        def lag(i=i):
+            if isinstance(lags[i], Exception):
+                raise lags[i]
+            return lags[i]
+        replica.replication_lag = lag
+    return router
+
+
+def _read_on(router, con):
+    """Returns the host the next read is sent to."""
+    with con.patch():
+        router.extract('SELECT lo, hi FROM t')
+    return router._ran_on._db_params['host']
+
+
+def test_lagging_replicas_fall_back_to_primary():
+    lags = [3, 60]
+    router = _lagging_router(lags, max_lag=10)
+    con = FakeConnection(1, COLUMNS)
+    assert [_read_on(router, con) for _ in range(2)] == ['replica0'] * 2
+    lags[0] = None  # Replication stopped
+    assert _read_on(router, con) == 'primary'
+    assert router.replica_status()['healthy'].tolist() == [False, False]
+    lags[1] = 0
+    assert _read_on(router, con) == 'replica1'
+
+
+def test_unreachable_replica_is_skipped():
+    lags = [OSError('unreachable'), 0]
+    router = _lagging_router(lags)
+    con = FakeConnection(1, COLUMNS)
+    assert {_read_on(router, con) for _ in range(3)} == {'replica1'}
+    assert router.replica_status()['healthy'].tolist() == [False, True]
+
+
+def test_round_robin_and_primary():
+    router = _lagging_router([0, 0])
+    con = FakeConnection(1, COLUMNS)
+    hosts = [_read_on(router, con) for _ in range(4)]
+    assert hosts == ['replica0', 'replica1'] * 2
+    with router.primary():
+        assert _read_on(router, con) == 'primary'
+    with con.patch(), router:
+        router.extract('SELECT lo, hi FROM t')
+    assert router._ran_on is router
+
+
+def test_read_your_writes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('tools.sql.time.monotonic', lambda: now[0])
+    router = _lagging_router([0], read_your_writes=30)
+    con = FakeConnection(1, COLUMNS)
+    assert _read_on(router, con) == 'replica0'
+    with con.patch():
+        router.modify('UPDATE t SET lo = 1')
+    now[0] += 29
+    assert _read_on(router, con) == 'primary'
+    now[0] += 1
+    assert _read_on(router, con) == 'replica0'
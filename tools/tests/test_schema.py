@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.dbapi import SchemaCache
+from tools.sql import GrabMySQL
+
+"""Columns of `t` (id INT, amount DECIMAL(10,2), created DATETIME,
+code VARCHAR(3)) as returned by `information_schema.COLUMNS`"""
+SCHEMA = (
+    ('name', FIELD_TYPE.VAR_STRING, False,
+     lambda i: ('id', 'amount', 'created', 'code')[i]),
+    ('data_type', FIELD_TYPE.VAR_STRING, False,
+     lambda i: ('INT', 'decimal', 'datetime', 'varchar')[i]),
+    ('column_type', FIELD_TYPE.VAR_STRING, False,
+     lambda i: ('int', 'decimal(10,2)', 'datetime', 'varchar(3)')[i]),
+    ('nullable', FIELD_TYPE.LONGLONG, False, lambda i: int(i > 0)),
+    ('max_length', FIELD_TYPE.LONGLONG, True,
+     lambda i: 3 if i == 3 else None),
+    ('precision', FIELD_TYPE.LONGLONG, True,
+     lambda i: (10, 10, None, None)[i]),
+    ('scale', FIELD_TYPE.LONGLONG, True, lambda i: (0, 2, None, None)[i]),
+)
+
+
+@pytest.fixture
+def con():
+    con = FakeConnection(0)
+    con.answer('SELECT COLUMN_NAME', SCHEMA, n_rows=4)
+    with con.patch():
+        yield con
+
+
+def test_cache_ttl_and_invalidate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('tools.dbapi.time.monotonic', lambda: now[0])
+    cache, loads = SchemaCache(ttl=10), []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get('k', load) == 1
+    now[0] = 9.9
+    assert cache.get('k', load) == 1
+    now[0] = 10
+    assert cache.get('k', load) == 2
+    cache.invalidate('k')
+    assert cache.get('k', load) == 3
+    cache.invalidate()
+    assert cache.get('k', load) == 4
+    assert cache.loads == 4
+
+
+def test_cache_loads_once_concurrently():
+    cache, release = SchemaCache(), threading.Event()
+
+    def load():
+        release.wait()
+        return 'schema'
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(cache.get, 'k', load) for _ in range(8)]
+        release.set()
+    assert [f.result() for f in futures] == ['schema'] * 8
+    assert cache.loads == 1
+
+
+def test_table_schema_is_cached(con):
+    sql = GrabMySQL({'host': 'fake'})
+    schema = sql.table_schema('db.t')
+    assert list(schema.index) == ['id', 'amount', 'created', 'code']
+    assert schema.loc['id', 'data_type'] == 'int'
+    assert sql.table_schema('db.t') is schema
+    n_queries = len(con.queries)
+    # Shared by the connections of a pool
+    pool = GrabMySQL.pool({'host': 'fake'}, min_size=0, max_size=1)
+    pool.schemas = sql.schemas
+    with pool.connection() as pooled:
+        assert pooled.table_schema('db.t') is schema
+    pool.close()
+    assert len(con.queries) == n_queries
+
+
+def test_typed_insert_casts_columns(con):
+    sql = GrabMySQL({'host': 'fake'})
+    df = pd.DataFrame({
+        'ID': ['1', '2'], 'amount': ['1.5', None],
+        'created': ['2020-01-02', '2020-01-03 04:05:06'], 'code': [1.0, 22],
+        'other': [0, 0],
+    })
+    with pytest.raises(ValueError, match=r"\['other'\]"):
+        sql.insert_df(df, 'db.t', typed=True)
+    sql.insert_df(df, 'db.t', typed=True, drop_unknown=True)
+    assert con.queries[-1] == (
+        'INSERT INTO db.t (ID,amount,created,code) VALUES '
+        "(1,1.5e0,'2020-01-02 00:00:00','1'),"
+        "(2,NULL,'2020-01-03 04:05:06','22')"
+    )
+
+
+def test_typed_insert_rejects_invalid_values(con):
+    sql = GrabMySQL({'host': 'fake'})
+    with pytest.raises(ValueError, match='cannot be cast to int'):
+        sql.insert_df(pd.DataFrame({'id': ['x']}), 'db.t', typed=True)
+    with pytest.raises(ValueError, match='longer than 3'):
+        sql.insert_df(pd.DataFrame({'code': ['abcd']}), 'db.t', typed=True)
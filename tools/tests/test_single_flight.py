@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.dbapi import SingleFlight
+from tools.sql import GrabMySQL, _flight_key
+
+
+def test_do_shares_result_and_error():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return 42
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(single_flight.do, 'k', slow)
+        started.wait()
+        waiters = [executor.submit(single_flight.do, 'k', slow)
+                   for _ in range(3)]
+        while single_flight.stats()['saved'] < 3:
+            pass
+        release.set()
+    assert [f.result() for f in [leader] + waiters] == [42] * 4
+    assert single_flight.stats() == {
+        'executions': 1, 'saved': 3, 'in_flight': 0}
+    with pytest.raises(ZeroDivisionError):
+        single_flight.do('k', lambda: 1 / 0)
+
+
+def test_flight_key_escapes_params():
+    db_params = {'host': 'h', 'db': 'd'}
+    query = 'SELECT * FROM t WHERE a = %s AND b IN %s'
+    key = _flight_key(db_params, query, ("it's", (1, 2)))
+    assert key == ('h|None|d|None', "SELECT * FROM t WHERE a = 'it\\'s' "
+                   'AND b IN (1,2)')
+    assert key != _flight_key(db_params, query, ('its', (1, 2)))
+    assert _flight_key(db_params, 'SELECT %(a)s', {'a': None})[1] == (
+        'SELECT NULL')
+
+
+def test_pool_coalesces_before_checkout():
+    n_threads = 8
+    con = FakeConnection(100, latency=0.02)
+    with con.patch():
+        pool = GrabMySQL.pool({'host': 'fake'}, min_size=0, max_size=3)
+        pool.single_flight = SingleFlight()
+        barrier = threading.Barrier(n_threads)
+
+        def extract(query):
+            barrier.wait()
+            return pool.extract(query)
+
+        with ThreadPoolExecutor(n_threads) as executor:
+            dfs = list(executor.map(extract, ['SELECT * FROM t'] * n_threads))
+        # Only the leader checked a connection out
+        assert pool._size == 1
+        pool.close()
+    assert all(len(df) == 100 for df in dfs)
+    assert pool.single_flight.stats() == {
+        'executions': 1, 'saved': n_threads - 1, 'in_flight': 0}
+
+
+def test_named_lock_is_not_coalesced():
+    con = FakeConnection(0, latency=0.02)
+    held = set()
+    answer = con._answer
+
+    def server_lock(query):
+        """Emulates GET_LOCK with a zero timeout and RELEASE_LOCK."""
+        name = query.split("'")[1]
+        if query.startswith('SELECT GET_LOCK'):
+            value = int(name not in held)
+            held.add(name)
+        elif query.startswith('SELECT RELEASE_LOCK'):
+            value = int(name in held)
+            held.discard(name)
+        else:
+            return answer(query)
+        return ((('lock', FIELD_TYPE.LONGLONG, None, None, None, None, 1), ),
+                ((value, ), ))
+
+    con._answer = server_lock
+    with con.patch():
+        pool = GrabMySQL.pool({'host': 'fake'}, min_size=2, max_size=2)
+        pool.single_flight = SingleFlight()
+        barrier = threading.Barrier(2)
+
+        def run_locked():
+            with pool.connection() as sql:
+                barrier.wait()
+                with sql.named_lock('job', 0):
+                    time.sleep(0.1)  # Both would hold the lock here
+                return True
+
+        with ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(run_locked) for _ in range(2)]
+            errors = [f.exception(5) for f in futures]
+        pool.close()
+    assert errors.count(None) == 1
+    assert sum(isinstance(e, RuntimeError) for e in errors) == 1
+    assert sum(q.startswith('SELECT GET_LOCK') for q in con.queries) == 2
+    assert held == set()
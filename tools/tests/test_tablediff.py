@@ -0,0 +1,114 @@
+import hashlib
+import re
+import zlib
+
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection, description
+from tools.sql import GrabMySQL
+from tools.tablediff import _checksums, table_diff
+
+KEY = (('k', FIELD_TYPE.LONGLONG, False, None), )
+SUMS = (
+    ('n', FIELD_TYPE.LONGLONG, False, None),
+    ('crc', FIELD_TYPE.VAR_STRING, False, None),
+    ('md5', FIELD_TYPE.VAR_STRING, False, None),
+)
+HASHES = KEY + (('h', FIELD_TYPE.VAR_STRING, False, None), )
+
+
+class FakeTable:
+    """Answers the queries of `table_diff` on rows {id: text}, computing the
+    checksums like the server.
+
+    """
+    def __init__(self, rows):
+        self.rows = rows
+
+
+    def select(self, condition):
+        lo = re.search(r'`id` >= (\d+)', condition)
+        hi = re.search(r'`id` < (\d+)', condition)
+        return sorted(
+            k for k in self.rows
+            if (lo is None or k >= int(lo.group(1)))
+            and (hi is None or k < int(hi.group(1)))
+        )
+
+
+    def __call__(self, query):
+        if query.startswith('SELECT k FROM'):
+            step = int(re.search(r'MOD\(rn - 1, (\d+)\)', query).group(1))
+            keys = self.select(query.split(') AS _keys')[0])
+            return description(KEY), tuple((k, ) for k in keys[::step])
+        if query.startswith('SELECT COUNT(*)'):
+            sums = []
+            for branch in query.split(' UNION ALL '):
+                texts = [
+                    self.rows[k].encode() for k in self.select(branch)]
+                md5 = 0
+                for text in texts:
+                    md5 ^= int(hashlib.md5(text).hexdigest()[:16], 16)
+                sums.append((
+                    len(texts), str(sum(zlib.crc32(t) for t in texts)),
+                    str(md5)
+                ))
+            return description(SUMS), tuple(sums)
+        if query.startswith('SELECT `id` AS k, MD5'):
+            keys = set()
+            for condition in query.split(' WHERE ', 1)[1].split(' OR '):
+                keys.update(self.select(condition))
+            return description(HASHES), tuple(
+                (k, hashlib.md5(self.rows[k].encode()).hexdigest())
+                for k in sorted(keys)
+            )
+        return None
+
+
+def connect(rows):
+    con = FakeConnection(0)
+    con._answer = FakeTable(rows)
+    with con.patch():
+        return GrabMySQL({'host': 'fake'}), con
+
+
+def test_table_diff():
+    src_rows = {i: f'row {i}#0' for i in range(1, 1001)}
+    dst_rows = dict(src_rows)
+    del dst_rows[17]
+    dst_rows[500] = 'row 500 changed#0'
+    dst_rows[1001] = 'row 1001#0'
+    src, src_con = connect(src_rows)
+    dst, _ = connect(dst_rows)
+    df = table_diff(
+        src, dst, 't', 'id', chunk_size=100, columns=['name'], leaf_size=10)
+    assert df.to_dict('list') == {
+        'id': [17, 500, 1001], 'diff': ['missing', 'changed', 'extra']}
+    # Only the 3 differing ranges of 100 rows are split, into 10 ranges
+    checksums = [q for q in src_con.queries if 'COUNT(*)' in q]
+    assert [q.count('UNION ALL') + 1 for q in checksums] == [10, 30]
+    assert table_diff(src, src, 't', 'id', columns=['name']).empty
+
+
+def test_checksums_are_exact():
+    # Above 2**53, the sums would not survive a conversion to float
+    con = FakeConnection(0)
+    con.answer('SELECT COUNT(*)', (
+        ('n', FIELD_TYPE.LONGLONG, False, lambda i: 3),
+        ('crc', FIELD_TYPE.VAR_STRING, False,
+         lambda i: str(2**53 + 1 + i)),
+        ('md5', FIELD_TYPE.VAR_STRING, False, lambda i: str(2**64 - 1)),
+    ), n_rows=2)
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+        sums = _checksums(
+            sql, 't', '`id`', '`name`', [(None, 5), (5, None)], 50)
+    assert sums == [(3, 2**53 + 1, 2**64 - 1), (3, 2**53 + 2, 2**64 - 1)]
+    assert con.queries[-1] == (
+        'SELECT COUNT(*), CAST(COALESCE(SUM(CRC32(`name`)), 0) AS CHAR), '
+        'CAST(BIT_XOR(CAST(CONV(LEFT(MD5(`name`), 16), 16, 10) AS UNSIGNED)) '
+        'AS CHAR) FROM t WHERE `id` < 5 UNION ALL SELECT COUNT(*), '
+        'CAST(COALESCE(SUM(CRC32(`name`)), 0) AS CHAR), '
+        'CAST(BIT_XOR(CAST(CONV(LEFT(MD5(`name`), 16), 16, 10) AS UNSIGNED)) '
+        'AS CHAR) FROM t WHERE `id` >= 5'
+    )
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from pymysql.constants import FIELD_TYPE
+
+from fake_pymysql import FakeConnection
+from tools.sql import GrabMySQL
+from tools.taskqueue import MySQLTaskQueue
+
+
+TASK_COLUMNS = (
+    ('id', FIELD_TYPE.LONGLONG, False, lambda i: i + 1),
+    ('payload', FIELD_TYPE.VAR_STRING, False, lambda i: f'{{"n": {i}}}'),
+    ('attempts', FIELD_TYPE.LONG, False, lambda i: 0),
+)
+
+
+def _queue(n_tasks, available=0):
+    con = FakeConnection(0)
+    con.answer('SELECT id, payload', TASK_COLUMNS, n_tasks)
+    con.answer(
+        'SELECT EXISTS',
+        (('available', FIELD_TYPE.LONGLONG, False, lambda i: available), ))
+    with con.patch():
+        sql = GrabMySQL({'host': 'fake'})
+    return con, MySQLTaskQueue(sql, 'tq', 'refunds')
+
+
+def _claims(con):
+    return [q for q in con.queries if q.startswith('SELECT id, payload')]
+
+
+def test_claim_index_matches_order():
+    con, queue = _queue(0)
+    queue.create_table()
+    assert 'KEY ix_claim (queue, status, priority DESC, id)' in ''.join(
+        con.queries)
+    assert queue.claim(5) == []
+    claims = _claims(con)
+    assert len(claims) == 2
+    assert "status = 'running'" in claims[0]
+    assert "status = 'queued'" in claims[1]
+    assert all('ORDER BY priority DESC, id LIMIT 5' in q for q in claims)
+
+
+def test_claim_stops_when_full():
+    con, queue = _queue(3)
+    tasks = queue.claim(3)
+    assert [t.payload for t in tasks] == [{'n': 0}, {'n': 1}, {'n': 2}]
+    assert [t.attempts for t in tasks] == [1, 1, 1]
+    assert len(_claims(con)) == 1
+
+
+def test_process_stops_when_no_task_available():
+    con, queue = _queue(0, available=0)
+    assert queue.process(print) == 0
+    assert len(_claims(con)) == 2
+    assert con.queries[-1].startswith('SELECT EXISTS')
+
+
+def test_process_retries_when_tasks_are_locked():
+    con, queue = _queue(0)
+    with mock.patch.object(
+            queue, '_available', side_effect=[True, True, False]) as available:
+        assert queue.process(print) == 0
+    assert available.call_count == 3
+    assert len(_claims(con)) == 6
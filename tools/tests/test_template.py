@@ -0,0 +1,65 @@
+import re
+
+import pytest
+
+from tools.sql import SqlTemplate, get_params, jsonify_sql, replace
+
+
+def _replace(sql, params_dict):
+    """Reference implementation: `replace` before `SqlTemplate`"""
+    for param in get_params(sql):
+        value = param.get('default', None) or params_dict.get(param['name'])
+        if value is None:
+            raise ValueError(
+                f'Parameter {param["name"]} must be included in params_dict')
+        if param['type'] == 'number':
+            value = str(value)
+        elif param['type'] == 'date':
+            value = f"date('{value}')"
+        elif param['type'] == 'string':
+            value = "'" + value + "'"
+        else:
+            raise ValueError('Invalid type ' + param['type'])
+        sql = re.sub(param['replace'], value, sql)
+    return sql
+
+
+SQL = (
+    "SELECT * FROM disputes WHERE country_id = {{country>number}} "
+    "AND created >= {{start>date>2024-01-01}} AND status = {{status>string}} "
+    "AND id IN (SELECT id FROM logs WHERE country_id = {{country>number}})"
+)
+
+
+@pytest.mark.parametrize('params_dict', [
+    {'country': 2, 'status': 'approved'},
+    {'country': 1.5, 'status': '', 'start': '2020-01-01'},
+])
+def test_render_as_replace(params_dict):
+    assert replace(SQL, params_dict) == _replace(SQL, params_dict)
+    assert SqlTemplate(SQL).render(params_dict) == _replace(SQL, params_dict)
+
+
+def test_render_many():
+    template = SqlTemplate(SQL)
+    params_dicts = [{'country': c, 'status': 'x'} for c in range(3)]
+    assert template.render_many(params_dicts) == [
+        _replace(SQL, p) for p in params_dicts]
+
+
+def test_missing_param():
+    with pytest.raises(ValueError, match='Parameter status'):
+        SqlTemplate(SQL).render({'country': 2})
+
+
+def test_unknown_type_with_default(tmp_path):
+    sql = 'SELECT * FROM t WHERE country_id = {{country>numeric>1}}'
+    assert get_params(sql) == [{
+        'name': 'country', 'type': 'numeric', 'default': '1',
+        'replace': '{{country>numeric>1}}'
+    }]
+    path_sql = tmp_path / 'q.sql'
+    path_sql.write_text(sql, encoding='utf-8')
+    jsonify_sql(str(path_sql), str(tmp_path / 'q.json'))
+    with pytest.raises(ValueError, match='Invalid type numeric'):
+        replace(sql, {})
@@ -1,5 +1,13 @@
 from .gsuite import GoogleSheet, GoogleDrive, url2id
 from .aws import GrabS3, get_ssm_parameter
-from .sql import GrabMySQL, prepare_df, mysql_retry
+from .sql import (
+    GrabMySQL, GrabMySQLPool, GrabMySQLRouter, prepare_df, iter_prepared,
+    mysql_retry
+)
 from .bpapi import BatMan, ServiceAPI
-from .presto import GrabPresto
\ No newline at end of file
+from .presto import GrabPresto
+from .dbapi import QueryCache, QueryMonitor, SingleFlight
+from .incremental import IncrementalExtractor, WatermarkStore
+from .multidb import MultiDB
+from .taskqueue import MySQLTaskQueue
+from .tablediff import table_diff
\ No newline at end of file
@@ -0,0 +1,425 @@
+"""Module to interact with MySQL from asyncio code
+
+Classes
+-------
+    AsyncGrabMySQL :
+        Asyncio counterpart of `GrabMySQL`, built on a pool of `aiomysql`
+        connections. Can be used either for single queries which are directly
+        commited, or within an `async with` statement to replicate MySQL
+        transaction.
+
+"""
+import contextlib
+import contextvars
+import logging
+import ssl
+import time
+
+import aiomysql
+
+from . import dbapi
+from .sql import (
+    GrabMySQL, insert_statements, mysql_kind, mysql_retry, on_dupl_update,
+    query_repr, query_type
+)
+
+
+class AsyncGrabMySQL():
+    """Class implementing common and simple interactions with MySQL, for
+    asyncio code.
+
+    The surface is the same as `GrabMySQL`, with coroutines: `extract`,
+    `modify`, `insert_df` and `named_lock`. Each query outside a transaction
+    acquires its own connection from the pool, so that independent queries
+    can run concurrently with `asyncio.gather`. Outside an `async with`
+    statement, the queries are commited directly, and rolled-back and retried
+    with `mysql_retry` in case of errors.
+    Within an `async with` statement, all the queries of the current task
+    run on the same connection, and the transaction is commited when exiting
+    the statement. No retry is applied. Queries of a transaction must not be
+    gathered concurrently.
+
+    Examples
+    --------
+    >>> sql = await AsyncGrabMySQL.connect(db_params, min_size=1, max_size=10)
+
+    Concurrent queries
+
+    >>> df_ph, df_sg = await asyncio.gather(
+    ...     sql.extract("SELECT * FROM disputes WHERE country_id = %s", 2),
+    ...     sql.extract("SELECT * FROM disputes WHERE country_id = %s", 4))
+
+    Transaction mode
+
+    >>> async with sql:
+    ...     await sql.modify(query_insert, ((12, 23, 'a'), (12, 2333, 'a')))
+    ...     await sql.modify(query_insert, ((14, 23, 'a'), (1222, 2333, 'a')))
+    >>> await sql.close()
+
+    """
+    def __init__(self, pool, db_params):
+        """Instantiate a AsyncGrabMySQL object. Use `AsyncGrabMySQL.connect`
+        instead, which creates the pool.
+
+        Parameters
+        ----------
+        pool : <aiomysql.Pool>
+            Pool of connections.
+        db_params : dict
+            Connection parameters used to create the pool.
+
+        Returns
+        -------
+        <AsyncGrabMySQL> object.
+
+        """
+        self._pool = pool
+        self._db_params = db_params
+        self._transaction = contextvars.ContextVar('transaction', default=None)
+        self._max_allowed_packet = None
+
+
+    @classmethod
+    async def connect(cls, db_params, min_size=1, max_size=10,
+                      max_lifetime=3600):
+        """Creates an AsyncGrabMySQL object with a pool of connections.
+
+        The SSL certificate is handled as in `GrabMySQL`.
+
+        Parameters
+        ----------
+        db_params : dict
+            Connection parameters.
+        min_size : int
+            Number of connections opened upfront and kept open.
+        max_size : int
+            Maximum number of connections opened at the same time.
+        max_lifetime : float
+            Age in seconds after which a connection is replaced. Default 3600.
+
+        Returns
+        -------
+        <AsyncGrabMySQL> object.
+
+        """
+        logging.info('Connecting to %s', db_params.get('host'))
+        db_params = GrabMySQL._ssl_params(db_params)
+        if 'ssl' in db_params:
+            db_params['ssl'] = ssl.create_default_context(
+                cafile=db_params['ssl']['ca'])
+        pool = await aiomysql.create_pool(
+            minsize=min_size, maxsize=max_size, pool_recycle=max_lifetime,
+            autocommit=False, **db_params
+        )
+        logging.info('Connection pool opened successfully')
+        return cls(pool, db_params)
+
+
+    def __repr__(self):
+        host = self._db_params.get('host')
+        return f"AsyncGrabMySQL({{'host':{host!r}, ...}})"
+
+
+    async def __aenter__(self):
+        """Enter transaction mode for the current task.
+
+        The transactions are automatically commited or rolled-back (in case of
+        errors) when exiting the `async with` statement. No retry is applied.
+
+        """
+        if self._transaction.get() is not None:
+            raise RuntimeError('A transaction is already running.')
+        con = await self._pool.acquire()
+        await con.begin()
+        self._transaction.set(con)
+        return self
+
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        """Exit transaction mode.
+
+        The transactions are either rolled-back or commited.
+        """
+        con = self._transaction.get()
+        self._transaction.set(None)
+        try:
+            if traceback:
+                await con.rollback()
+            else:
+                await con.commit()
+        finally:
+            self._pool.release(con)
+
+
+    async def extract(self, query, params=None):
+        """Runs a `SELECT` or `EXPLAIN` query and returns its result as a
+        DataFrame.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `SELECT` or `EXPLAIN` query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+
+        Returns
+        -------
+        <pd.DataFrame>
+        """
+        if query_type(query) not in ('SELECT', 'EXPLAIN'):
+            logging.info(
+                'The query %s is not a SELECT or EXPLAIN query',
+                query_repr(query)
+            )
+            raise ValueError('`query` must be a SELECT or EXPLAIN query.')
+        con = self._transaction.get()
+        if con is not None:
+            return await self._extract(con, query, params)
+        return await mysql_retry(self._extract_pooled)(query, params)
+
+
+    async def modify(self, query, params=None):
+        """Run an `INSERT`, `UPDATE` or `DELETE` query.
+
+        If params is a list/tuple of dict/list/tuple, then the query is run
+        using `executemany`. Otherwise, it is run using `execute`.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `INSERT`, `UPDATE` or `DELETE` query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+
+        Returns
+        -------
+        A 2-elements tuple with number of modified rows, and the id of the
+        first modified row.
+
+        """
+        if query_type(query) not in ('INSERT', 'UPDATE', 'DELETE'):
+            logging.info(
+                'The query %s is not a INSERT, UPDATE or DELETE query',
+                query_repr(query)
+            )
+            raise ValueError('`query` must be a UPDATE, INSERT or DELETE query.')
+        con = self._transaction.get()
+        if con is not None:
+            logging.info('Using transaction mode')
+            return await self._modify(con, query, params)
+        return await mysql_retry(self._modify_pooled)(query, params)
+
+
+    async def insert_df(self, df, table_name, on_dupl_update_clmns=None,
+                        batch_size=None):
+        """Insert a DataFrame into a table.
+
+        Same as `GrabMySQL.insert_df`, without the `load_data` option: the
+        rows are sent as multi-row `INSERT` statements as large as allowed
+        by `max_allowed_packet`, and commited by batch of `batch_size` rows.
+
+        Parameters
+        ----------
+        df : <pd.DataFrame>
+            The DataFrame to insert.
+        table_name : str
+            The name of the table. The column names must match the DataFrame
+            column names.
+        on_dupl_update_clmns : iterable
+            The list of columns to update in case of duplicated key.
+        batch_size : int, optional
+            Number of rows commited at once. None (default) commits all the
+            rows at once.
+
+        Returns
+        -------
+        A 2-elements tuple as returned by `AsyncGrabMySQL.modify`.
+
+        """
+        if len(df) == 0:
+            logging.info(
+                'Inserting dataframe into %s. Nothing to insert.', table_name
+            )
+            return (0, 0)
+        max_allowed_packet = await self.max_allowed_packet()
+        async with self._connection() as con:
+            # Escaping is done locally, the connection is not used
+            literal, encoding = con.literal, con.encoding
+        batches = insert_statements(
+            df, table_name, ','.join(list(df.columns)),
+            on_dupl_update(on_dupl_update_clmns), literal, encoding, 
+            max_allowed_packet, batch_size
+        )
+        start = time.perf_counter()
+        nrows, first_row_id = 0, None
+        for statements in batches:
+            con = self._transaction.get()
+            if con is not None:
+                res = await self._execute_statements(con, statements)
+            else:
+                res = await mysql_retry(self._execute_statements_pooled)(
+                    statements)
+            nrows += sum(r[0] for r in res)
+            if first_row_id is None:
+                first_row_id = res[0][1]
+        elapsed = time.perf_counter() - start
+        logging.info(
+            '%s rows inserted into %s in %.2fs (%.0f rows/s)',
+            len(df), table_name, elapsed, len(df) / max(elapsed, 1e-9)
+        )
+        return nrows, first_row_id
+
+
+    async def max_allowed_packet(self):
+        """Returns the maximum size in bytes of a statement sent to the server.
+
+        """
+        if self._max_allowed_packet is None:
+            df = await self.extract('SELECT @@max_allowed_packet')
+            self._max_allowed_packet = int(df.iloc[0, 0])
+        return self._max_allowed_packet
+
+
+    @contextlib.asynccontextmanager
+    async def named_lock(self, lock_name, timeout):
+        """Get a named lock on MySQL database.
+
+        Same as `GrabMySQL.named_lock`. A connection of the pool is held
+        while the lock is held, as the lock belongs to the MySQL session.
+
+        Parameters
+        ----------
+        lock_name : str
+            Name of the lock.
+        timeout : int
+            Timeout in seconds to acquire lock before raising an error. A
+            negative timeout means infinite timeout.
+
+        Returns
+        -------
+        None.
+
+        """
+        async with self._pool.acquire() as con:
+            lock = await self._extract(
+                con, 'SELECT GET_LOCK(%s, %s)', (lock_name, timeout))
+            if lock.iloc[0, 0] == 1:
+                logging.debug('Named lock %s obtained successfully', lock_name)
+                try:
+                    yield None
+                finally:
+                    logging.debug('Releasing named lock %s', lock_name)
+                    await self._extract(
+                        con, 'SELECT RELEASE_LOCK(%s)', (lock_name, ))
+            else:
+                e = (
+                    f'Could not obtain named lock {lock_name} within '
+                    f'{timeout} seconds.'
+                )
+                raise RuntimeError(e)
+
+
+    async def close(self):
+        """Close all the connections of the pool
+
+        """
+        self._pool.close()
+        await self._pool.wait_closed()
+        logging.info('Connection pool closed successfully.')
+
+
+    def _connection(self):
+        """Returns an async context manager yielding the connection of the
+        running transaction, or a connection from the pool.
+
+        """
+        con = self._transaction.get()
+        if con is not None:
+            return _nullcontext(con)
+        return self._pool.acquire()
+
+
+    async def _extract_pooled(self, query, params):
+        async with self._pool.acquire() as con:
+            return await self._extract(con, query, params)
+
+
+    async def _extract(self, con, query, params):
+        logging.info(
+            'Extract data using %s with parameters %s',
+            query_repr(query), query_repr(params)
+        )
+        async with con.cursor() as cursor:
+            await cursor.execute(query, params)
+            data = await cursor.fetchall()
+            df = dbapi.build_frame(data, cursor.description, mysql_kind)
+        if con is not self._transaction.get():
+            await con.commit()  # End the implicit read transaction
+        logging.info('%s rows extracted successfully', len(df))
+        return df
+
+
+    async def _modify_pooled(self, query, params):
+        async with self._pool.acquire() as con:
+            try:
+                res = await self._modify(con, query, params)
+                await con.commit()
+            except Exception:
+                logging.info(
+                    'Catching exception during modify', exc_info=True)
+                await con.rollback()
+                raise
+        return res
+
+
+    async def _modify(self, con, query, params):
+        many = False
+        if isinstance(params, (list, tuple)):
+            if isinstance(params[0], (dict, list, tuple)):
+                many = True
+        logging.info(
+            'Run modifier query %s with parameters %s',
+            query_repr(query), query_repr(params))
+        async with con.cursor() as cursor:
+            if many:
+                nrows = await cursor.executemany(query, params)
+            else:
+                nrows = await cursor.execute(query, params)
+            first_row_id = cursor.lastrowid
+        logging.info(
+            '%s rows modified with %s first row id', nrows, first_row_id)
+        return nrows, first_row_id
+
+
+    async def _execute_statements_pooled(self, statements):
+        async with self._pool.acquire() as con:
+            try:
+                res = await self._execute_statements(con, statements)
+                await con.commit()
+            except Exception:
+                await con.rollback()
+                raise
+        return res
+
+
+    async def _execute_statements(self, con, statements):
+        res = []
+        async with con.cursor() as cursor:
+            for statement in statements:
+                res.append(
+                    (await cursor.execute(statement), cursor.lastrowid))
+        return res
+
+
+class _nullcontext:
+    """Async context manager returning `value`, doing nothing else"""
+    def __init__(self, value):
+        self.value = value
+
+
+    async def __aenter__(self):
+        return self.value
+
+
+    async def __aexit__(self, *exc):
+        return False
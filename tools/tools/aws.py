@@ -10,6 +10,9 @@ Classes
     GrabS3 :
         Wrapper class around `boto3.s3` client. Provide functionalities to read
         and write files, list the keys, and delete objects.
+    S3UploadStream :
+        Writable file-like object uploading a file to S3 by parts, created
+        with `GrabS3.open_upload`.
 
 """
 import io
@@ -314,3 +317,128 @@ class GrabS3:
         df.to_excel(writer, **kwargs)
         writer.save()
         self.upload(output.getvalue(), file_name)
+
+
+    def open_upload(self, file_name, part_size=8 * 2**20):
+        """Opens a writable stream uploading a file to S3 by parts.
+
+        The data written is uploaded with a S3 multipart upload, by parts of
+        `part_size` bytes, so that the whole file is never held in memory.
+        The upload is completed when the stream is closed, and aborted if an
+        exception is raised within a `with` statement, or if the stream is 
+        garbage collected without being closed.
+
+        Parameters
+        ----------
+        file_name : str
+            The filename, including prefix.
+        part_size : int, optional
+            Size in bytes of the uploaded parts, at least 5MB. Default 8MB.
+
+        Returns
+        -------
+        <S3UploadStream> object.
+
+        Examples
+        --------
+        >>> with s3.open_upload('staging/disputes.parquet') as stream:
+        ...     sql.extract_to_parquet(query, None, stream)
+
+        """
+        return S3UploadStream(self._s3, self.bucket, file_name, part_size)
+
+
+class S3UploadStream(io.RawIOBase):
+    """Writable file-like object uploading to S3 with a multipart upload.
+
+    Created with `GrabS3.open_upload`.
+
+    """
+    MIN_PART_SIZE = 5 * 2**20
+
+    def __init__(self, client, bucket, key, part_size=8 * 2**20):
+        super().__init__()
+        self._s3 = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
+        self._buffer = bytearray()
+        self._parts = []
+        self._position = 0
+        self._upload_id = self._s3.create_multipart_upload(
+            Bucket=bucket, Key=key)['UploadId']
+
+
+    def __repr__(self):
+        return f"S3UploadStream(bucket='{self.bucket}', key='{self.key}')"
+
+
+    def writable(self):
+        return True
+
+
+    def tell(self):
+        return self._position
+
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('I/O operation on closed stream.')
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+        return len(data)
+
+
+    def _upload_part(self, data):
+        number = len(self._parts) + 1
+        res = self._s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=number, Body=bytes(data)
+        )
+        self._parts.append({'ETag': res['ETag'], 'PartNumber': number})
+
+
+    def close(self):
+        """Uploads the remaining data and completes the upload."""
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._parts:
+                self._upload_part(self._buffer)
+                self._buffer = bytearray()
+            self._s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        except Exception:
+            self.abort()
+            raise
+        super().close()
+
+
+    def abort(self):
+        """Aborts the upload: nothing is written to S3."""
+        if self.closed:
+            return
+        self._s3.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        super().close()
+
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if traceback:
+            self.abort()
+        else:
+            self.close()
+
+
+    def __del__(self):
+        # `io.IOBase.__del__` calls `close`, which would publish the partial
+        # object of a stream dropped after an exception
+        try:
+            self.abort()
+        except Exception:
+            pass
@@ -0,0 +1,1036 @@
+"""Helpers shared by the DB-API 2.0 wrappers (`sql` and `presto` modules)
+
+Functions
+---------
+    build_frame :
+        Builds a typed `pd.DataFrame` from the rows fetched by a cursor, using
+        the column types of `cursor.description`.
+
+    write_parquet :
+        Streams the rows fetched by a cursor into a Parquet file, by row
+        groups.
+
+    fingerprint :
+        Normalizes a query by replacing its literals and parameters with `?`.
+
+    shared_copy :
+        Copies a `pd.DataFrame`, as a cheap view with pandas Copy-on-Write.
+
+Classes
+-------
+    QueryCache :
+        Two-tier (memory and Parquet files) cache of query results, used by
+        `GrabMySQL.extract` and `GrabPresto.extract`.
+    QueryMonitor :
+        Collects per-query statistics, aggregates them by fingerprint, and
+        keeps a slow-query log.
+    SchemaCache :
+        Time-limited cache of table schemas, used by `GrabMySQL.insert_df`.
+    SingleFlight :
+        Coalesces identical concurrent executions, used by `GrabMySQL.extract`
+        and `GrabPresto.extract`.
+
+"""
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+"""Column kinds, used to map the cursor type codes to typed arrays"""
+INT = 'int'
+FLOAT = 'float'
+BOOL = 'bool'
+DATETIME = 'datetime'
+STRING = 'string'
+DECIMAL = 'decimal'
+OBJECT = 'object'
+
+
+def _object_array(col, n):
+    values = np.empty(n, dtype=object)
+    try:
+        values[:] = col
+    except ValueError:
+        # Sequence values (e.g. Presto arrays) cannot be broadcast
+        for i, v in enumerate(col):
+            values[i] = v
+    return values
+
+
+def _int_array(col, n, nullable):
+    if not nullable and None not in col:
+        return np.fromiter(col, dtype=np.int64, count=n)
+    mask = np.fromiter((v is None for v in col), dtype=bool, count=n)
+    values = np.fromiter(
+        (0 if v is None else v for v in col), dtype=np.int64, count=n)
+    return pd.arrays.IntegerArray(values, mask)
+
+
+def _bool_array(col, n, nullable):
+    if not nullable and None not in col:
+        return np.fromiter(col, dtype=bool, count=n)
+    return pd.array(list(col), dtype='boolean')
+
+
+def _datetime_array(col):
+    """Parses ISO formatted strings (e.g. datetimes not decoded by the
+    driver) in bulk with numpy, and other values with pandas, into a
+    `datetime64[us]` array (`datetime64[ns]` before pandas 2).
+
+    """
+    first = next((v for v in col if v is not None), None)
+    if isinstance(first, str):
+        # Raises a ValueError for invalid values, e.g. MySQL zero dates
+        values = pd.to_datetime(np.array(col, dtype='datetime64[us]'))
+    else:
+        values = pd.to_datetime(col)
+    if hasattr(values, 'as_unit'):
+        # From pandas 2, the unit is inferred from the values (e.g. seconds
+        # for dates, or all NULL values): fixed so that it does not vary
+        # between the chunks of a query. Microseconds hold the whole MySQL
+        # range (e.g. '9999-12-31'), unlike nanoseconds
+        values = values.as_unit('us')
+    return values
+
+
+def _coerced(convert, v):
+    """Returns `convert(v)`, or None if `v` cannot be converted."""
+    try:
+        return convert(v)
+    except (OverflowError, TypeError, ValueError):
+        return None
+
+
+def _int64(v):
+    v = int(v)
+    if not -2**63 <= v < 2**63:
+        raise OverflowError(f'{v} out of the int64 range')
+    return v
+
+
+def _is_iso(v):
+    return _coerced(np.datetime64, v) is not None
+
+
+def _coerced_array(col, n, kind, nullable):
+    """Converts a column into a typed array, the values which cannot be 
+    converted being replaced by nulls.
+
+    """
+    if kind == INT:
+        values = tuple([None if v is None else _coerced(_int64, v) 
+                        for v in col])
+        if not nullable and None in values:
+            raise ValueError(
+                'NOT NULL integer values cannot be converted into int64.')
+        array = _int_array(values, n, nullable)
+    elif kind == FLOAT:
+        values = tuple([None if v is None else _coerced(float, v) 
+                        for v in col])
+        array = np.array(values, dtype=np.float64)
+    else:
+        # Unparsed strings (e.g. MySQL zero dates) among the driver values
+        values = tuple([
+            None if isinstance(v, str) and not _is_iso(v) else v 
+            for v in col
+        ])
+        array = _datetime_array(values)
+    n_coerced = sum(v is None for v in values) - col.count(None)
+    logging.warning(
+        '%s %s values cannot be converted: replaced by nulls', n_coerced, 
+        kind
+    )
+    return array
+
+
+def _column_array(col, n, kind, nullable, categorical_ratio, decoder=None,
+                  errors='ignore'):
+    """Converts a column (tuple of values) into a typed array.
+
+    If the values cannot be converted, then falls back to an object array,
+    with the strings converted by `decoder` (if not None), or with
+    `errors='coerce'` replaces the values which cannot be converted by
+    nulls.
+
+    """
+    try:
+        if kind == INT:
+            return _int_array(col, n, nullable)
+        if kind == FLOAT:
+            return np.array(col, dtype=np.float64)
+        if kind == BOOL:
+            return _bool_array(col, n, nullable)
+        if kind == DATETIME:
+            return _datetime_array(col)
+    except (OverflowError, TypeError, ValueError, pd.errors.ParserError):
+        if errors == 'coerce' and kind != BOOL:
+            return _coerced_array(col, n, kind, nullable)
+        if decoder is not None:
+            col = tuple([
+                decoder(v) if isinstance(v, str) else v for v in col])
+    values = _object_array(col, n)
+    if kind == STRING and categorical_ratio and n > 0:
+        try:
+            n_unique = len(set(col))
+        except TypeError:
+            return values
+        if n_unique <= categorical_ratio * n:
+            return pd.Categorical(values)
+    return values
+
+
+def build_frame(data, description, kind_of, categorical_ratio=None,
+                decoders=None, errors='ignore'):
+    """Builds a typed DataFrame from the rows fetched by a cursor.
+
+    The rows are read column by column, and each column is converted into a
+    typed array according to its type code in `description`: `int64` (nullable
+    `Int64` with a null mask if the column is nullable), `float64`, `bool`,
+    `datetime64[us]` (`datetime64[ns]` before pandas 2) or object. String
+    columns are converted into categoricals when their ratio of unique values
+    is below `categorical_ratio`. A column whose values cannot be converted
+    (e.g. MySQL zero dates, or integers out of the `int64` range) is an
+    object column, so that the dtypes of the chunks of a same query may
+    differ, unless `errors='coerce'`: these values are then replaced by
+    nulls, and the dtypes only depend on `description`.
+
+    Parameters
+    ----------
+    data : sequence of tuple
+        Rows as returned by `cursor.fetchall` or `cursor.fetchmany`.
+    description : sequence of tuple
+        The `cursor.description`.
+    kind_of : callable
+        Function mapping a type code from `description` to a column kind
+        (INT, FLOAT, BOOL, DATETIME, STRING, DECIMAL or OBJECT). Decimals are
+        object columns of `decimal.Decimal`.
+    categorical_ratio : float, optional
+        Maximum ratio of unique values for a string column to be converted
+        into a categorical. None (default) never converts.
+    decoders : dict, optional
+        Converters of the values left as strings by the driver, by type code,
+        applied to the columns which cannot be converted into typed arrays
+        (e.g. out of range integers), so that their values are the ones the
+        driver would have returned.
+    errors : str {'ignore', 'coerce'}
+        If 'ignore' (default), then the columns whose values cannot be 
+        converted are object columns. If 'coerce', then these values are
+        replaced by nulls (a `ValueError` is raised for integer columns
+        which are not nullable).
+
+    Returns
+    -------
+    <pd.DataFrame>
+
+    """
+    if errors not in ('ignore', 'coerce'):
+        raise ValueError('errors must be either "ignore" or "coerce".')
+    clmns = [d[0] for d in description]
+    n = len(data)
+    decoders = decoders or {}
+    arrays = {}
+    for i, d in enumerate(description):
+        col = tuple(map(itemgetter(i), data))
+        nullable = d[6] is None or bool(d[6])
+        arrays[i] = _column_array(
+            col, n, kind_of(d[1]), nullable, categorical_ratio, 
+            decoders.get(d[1]), errors
+        )
+    df = pd.DataFrame(arrays, copy=False)
+    df.columns = clmns
+    return df
+
+
+def _decimal_type(d, field):
+    """Returns the Arrow decimal type of a column, from the precision and
+    scale of its description (the precision is an upper bound with `pymysql`,
+    which reports the display length), or else widened from its first
+    values.
+
+    """
+    import pyarrow as pa
+
+    precision, scale = d[4], d[5]
+    if scale is None:
+        scale = field.type.scale if pa.types.is_decimal(field.type) else 0
+    if precision is None:
+        precision = 38
+    precision = max(precision, scale, 1)
+    if precision > 38:
+        return pa.decimal256(min(precision, 76), scale)
+    return pa.decimal128(precision, scale)
+
+
+def _parquet_schema(table, description, kind_of):
+    """Returns the schema of the Parquet file, typed from the kind of each
+    column in `description`, so that all the row groups fit in it whatever
+    the values of the first one (e.g. all NULL).
+
+    Only the string and object columns (which can hold bytes, or any Python
+    object) are typed from the values of the first row group, as strings if
+    they are all NULL, and decimals without precision in `description` are
+    widened to the maximum precision.
+
+    """
+    import pyarrow as pa
+
+    kind_types = {
+        INT: pa.int64(), FLOAT: pa.float64(), BOOL: pa.bool_(),
+        DATETIME: pa.timestamp('us')
+    }
+    fields = []
+    for field, d in zip(table.schema, description):
+        kind = kind_of(d[1])
+        if kind in kind_types:
+            field = field.with_type(kind_types[kind])
+        elif kind == DECIMAL or pa.types.is_decimal(field.type):
+            field = field.with_type(_decimal_type(d, field))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class _Abortable(io.RawIOBase):
+    """Writable stream forwarding the bytes to `sink` until aborted.
+
+    The Parquet writer writes its footer when released, even after an error:
+    once aborted, the bytes are discarded instead of ending a truncated file
+    which would read as valid.
+
+    """
+    def __init__(self, sink):
+        self.sink = sink
+        self.aborted = False
+
+
+    def writable(self):
+        return True
+
+
+    def write(self, b):
+        if not self.aborted:
+            self.sink.write(b)
+        return len(b)
+
+
+    def tell(self):
+        return self.sink.tell()
+
+
+    def flush(self):
+        if not self.aborted:
+            self.sink.flush()
+
+
+def write_parquet(fetchmany, description, kind_of, sink, 
+                  row_group_size=100000, decoders=None):
+    """Streams the rows fetched by a cursor into a Parquet file.
+
+    The rows are fetched and written by row groups of `row_group_size` rows,
+    so that at most one row group is held in memory. Requires `pyarrow`.
+    The file schema is typed from `description`: the values which cannot be
+    converted into their column type (e.g. MySQL zero dates) are written as
+    nulls, see `build_frame` with `errors='coerce'`.
+    If an error occurs, then a file at `sink` is left unchanged (the file is
+    written under a temporary name, renamed once complete), and nothing more
+    is written to a file-like object, which must then be discarded (e.g.
+    with `S3UploadStream.abort`).
+
+    Parameters
+    ----------
+    fetchmany : callable
+        The `cursor.fetchmany` of an executed query.
+    description : sequence of tuple
+        The `cursor.description`.
+    kind_of : callable
+        Function mapping a type code from `description` to a column kind.
+    sink : str or file-like object
+        Path to the Parquet file, or writable binary file-like object (with
+        `tell`), such as `GrabS3.open_upload`. A file-like object is not
+        closed.
+    row_group_size : int
+        Number of rows per row group. Default 100000.
+    decoders : dict, optional
+        Converters of the values left as strings by the driver, see
+        `build_frame`.
+
+    Returns
+    -------
+    A 2-elements tuple with the number of rows and the size of the file in
+    bytes.
+
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    is_path = isinstance(sink, (str, os.PathLike))
+    if is_path:
+        path = os.path.expanduser(sink)
+        file = open(path + '.tmp', 'wb')
+    else:
+        file = sink
+    out = _Abortable(file)
+    start = file.tell()
+    nrows = 0
+    try:
+        writer = None
+        while True:
+            data = fetchmany(row_group_size)
+            df = build_frame(
+                data, description, kind_of, decoders=decoders, 
+                errors='coerce'
+            )
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                schema = _parquet_schema(table, description, kind_of)
+                writer = pq.ParquetWriter(out, schema)
+            if not data:
+                break
+            writer.write_table(
+                table.cast(schema), row_group_size=row_group_size)
+            nrows += len(data)
+            logging.debug('%s rows written so far', nrows)
+        writer.close()
+        nbytes = file.tell() - start
+    except BaseException:
+        out.aborted = True
+        raise
+    finally:
+        if is_path:
+            file.close()
+            if out.aborted:
+                os.remove(path + '.tmp')
+    if is_path:
+        os.replace(path + '.tmp', path)
+    return nrows, nbytes
+
+
+class QueryCache:
+    """Cache of query results, with an in-memory LRU tier and an optional 
+    on-disk Parquet tier.
+
+    The results are keyed by the connection identity and the full query 
+    string (with parameters replaced). An entry is only returned if it is
+    younger than the `ttl` given when reading it. The `extract` methods only
+    use the cache for the queries given a `ttl`. When the memory tier 
+    exceeds `max_bytes`, the least recently used results are evicted (and
+    kept on disk if `path` is set). When the disk tier exceeds 
+    `max_disk_bytes`, the oldest files are deleted. Writing Parquet files
+    requires `pyarrow` or `fastparquet`; results which cannot be written are
+    only kept in memory. The returned DataFrames are copies, which can be
+    safely modified.
+
+    Attributes
+    ----------
+    ttl : float
+        Default time-to-live of the results read with `get`, in seconds.
+    hits, disk_hits, misses, evictions : int
+        Cache statistics, also available as a dict with `stats`.
+
+    Examples
+    --------
+    >>> sql.cache = QueryCache(path='~/.cache/queries', ttl=3600)
+    >>> df = sql.extract("SELECT * FROM disputes", ttl=3600)  # Runs it
+    >>> df = sql.extract("SELECT * FROM disputes", ttl=3600)  # From cache
+    >>> df = sql.extract("SELECT * FROM disputes", ttl=60)  # Fresher result
+    >>> df = sql.extract("SELECT * FROM disputes")  # Not cached
+    >>> sql.cache.stats()
+    {'hits': 1, 'disk_hits': 0, 'misses': 2, 'evictions': 0, ...}
+
+    """
+    def __init__(self, path=None, ttl=3600, max_bytes=512 * 2**20, 
+                 max_disk_bytes=4 * 2**30):
+        """Instantiates a QueryCache object.
+
+        Parameters
+        ----------
+        path : str, optional
+            Folder of the Parquet files. If None (default), then the results 
+            are only cached in memory.
+        ttl : float
+            Default time-to-live of the results read with `get`, in seconds.
+            Default 3600.
+        max_bytes : int
+            Maximum size in bytes of the results kept in memory. 
+            Default 512MB.
+        max_disk_bytes : int
+            Maximum size in bytes of the Parquet files. Default 4GB.
+
+        Returns
+        -------
+        <QueryCache> object.
+
+        """
+        self.path = None
+        if path is not None:
+            self.path = os.path.expanduser(path)
+            os.makedirs(self.path, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # key -> (created, nbytes, df)
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+
+    def __repr__(self):
+        return f'QueryCache(path={self.path!r}, ttl={self.ttl})'
+
+
+    def __len__(self):
+        return len(self._memory)
+
+
+    @staticmethod
+    def key(identity, query):
+        """Returns the cache key of a query string run on a connection."""
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', errors='replace')
+        return hashlib.sha256(f'{identity}\n{query}'.encode()).hexdigest()
+
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.parquet')
+
+
+    def get(self, key, ttl=None):
+        """Returns a copy of the cached result, or None if not found or 
+        expired.
+
+        Parameters
+        ----------
+        key : str
+            Key as returned by `QueryCache.key`.
+        ttl : float, optional
+            Maximum age in seconds of the result. Default to the cache `ttl`.
+
+        Returns
+        -------
+        <pd.DataFrame> or None.
+
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[2].copy()
+                self._pop(key)
+            if self.path is not None:
+                file = self._file(key)
+                try:
+                    created = os.path.getmtime(file)
+                except OSError:
+                    created = None
+                if created is not None and now - created <= ttl:
+                    try:
+                        df = pd.read_parquet(file)
+                    except Exception:
+                        logging.debug('Cannot read %s', file, exc_info=True)
+                    else:
+                        self._store(key, df, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return df.copy()
+            self.misses += 1
+            return None
+
+
+    def put(self, key, df):
+        """Adds a result to the cache.
+
+        Parameters
+        ----------
+        key : str
+            Key as returned by `QueryCache.key`.
+        df : <pd.DataFrame>
+            The result to cache. A copy is stored.
+
+        Returns
+        -------
+        None.
+
+        """
+        df = df.copy()
+        with self._lock:
+            self._store(key, df, time.time())
+            if self.path is not None:
+                self._write(key, df)
+
+
+    def _store(self, key, df, created):
+        self._pop(key)
+        nbytes = int(df.memory_usage(deep=True, index=True).sum())
+        self._memory[key] = (created, nbytes, df)
+        self._nbytes += nbytes
+        while self._nbytes > self.max_bytes and len(self._memory) > 1:
+            self._pop(next(iter(self._memory)))
+            self.evictions += 1
+
+
+    def _pop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry[1]
+
+
+    def _write(self, key, df):
+        file = self._file(key)
+        try:
+            df.to_parquet(file + '.tmp')
+            os.replace(file + '.tmp', file)
+        except Exception:
+            logging.debug('Result not cached on disk', exc_info=True)
+            try:
+                os.remove(file + '.tmp')
+            except OSError:
+                pass
+            return
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+    def stats(self):
+        """Returns the cache statistics as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits, 'disk_hits': self.disk_hits, 
+                'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._memory), 'bytes': self._nbytes
+            }
+
+
+    def clear(self):
+        """Removes all the results from memory and disk."""
+        with self._lock:
+            self._memory.clear()
+            self._nbytes = 0
+            if self.path is not None:
+                for entry in os.scandir(self.path):
+                    if entry.name.endswith('.parquet'):
+                        os.remove(entry.path)
+
+
+"""Patterns replaced to compute the fingerprint of a query"""
+FINGERPRINT_PATTERNS = (
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), '?'),
+    (re.compile(r'"(?:[^"\\]|\\.|"")*"'), '?'),
+    (re.compile(r'%\(\w+\)s|%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.IGNORECASE), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(query):
+    """Normalizes a query by replacing its literals and parameters with `?`.
+
+    Queries only differing by their literal values, parameters, length of
+    IN lists or whitespaces have the same fingerprint.
+
+    Parameters
+    ----------
+    query : str or bytes
+        The SQL query, parametrized or not.
+
+    Returns
+    -------
+    str
+
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', errors='replace')
+    for pattern, repl in FINGERPRINT_PATTERNS:
+        query = pattern.sub(repl, query)
+    return query.strip()
+
+
+"""Statistics of a single query"""
+QueryRecord = namedtuple(
+    'QueryRecord', 
+    [
+        'fingerprint', 'kind', 'wall_time', 'server_time', 'rows', 'bytes',
+        'retries', 'created'
+    ]
+)
+
+
+class QueryMonitor:
+    """Collects the statistics of the queries run by `GrabMySQL`.
+
+    For every `extract` and `modify`, a `QueryRecord` is passed to the hooks
+    and aggregated by fingerprint: `summary` returns the count, p50/p95 of
+    the wall time, and the total rows, bytes and retries of each fingerprint.
+    The queries slower than `slow_threshold` are written to the slow-query log
+    (a file of json lines, if `slow_log` is set) together with their
+    `EXPLAIN`, and logged as warnings.
+    The server time is read from `performance_schema` after each query (one 
+    more round trip) only if `server_timing=True`; otherwise it is None.
+
+    Examples
+    --------
+    >>> sql.monitor = QueryMonitor(slow_threshold=2, slow_log='slow.jsonl')
+    >>> sql.monitor.add_hook(print)
+    >>> df = sql.extract("SELECT * FROM disputes WHERE id > %s", 10)
+    QueryRecord(fingerprint='SELECT * FROM disputes WHERE id > ?', ...)
+    >>> sql.monitor.summary()
+
+    """
+    def __init__(self, slow_threshold=None, slow_log=None, 
+                 server_timing=False, max_samples=1000):
+        """Instantiates a QueryMonitor object.
+
+        Parameters
+        ----------
+        slow_threshold : float, optional
+            Wall time in seconds above which a query is slow. None (default)
+            disables the slow-query log.
+        slow_log : str, optional
+            Path of the slow-query log file.
+        server_timing : bool
+            Whether to read the server time of each query. Default False.
+        max_samples : int
+            Number of most recent wall times kept per fingerprint to compute
+            the percentiles.
+
+        Returns
+        -------
+        <QueryMonitor> object.
+
+        """
+        self.slow_threshold = slow_threshold
+        self.slow_log = slow_log
+        self.server_timing = server_timing
+        self.max_samples = max_samples
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._stats = {}
+
+
+    def __repr__(self):
+        return (
+            f'QueryMonitor(slow_threshold={self.slow_threshold}, '
+            f'fingerprints={len(self._stats)})'
+        )
+
+
+    def add_hook(self, hook):
+        """Adds a function called with each `QueryRecord`."""
+        self.hooks.append(hook)
+
+
+    def is_slow(self, wall_time):
+        """Whether a query with this wall time is slow."""
+        threshold = self.slow_threshold
+        return threshold is not None and wall_time >= threshold
+
+
+    def record(self, record, query=None, explain=None):
+        """Aggregates a `QueryRecord`, and passes it to the hooks.
+
+        Parameters
+        ----------
+        record : <QueryRecord>
+            The query statistics.
+        query : str, optional
+            The full query, written to the slow-query log.
+        explain : <pd.DataFrame>, optional
+            The `EXPLAIN` of a slow query, written to the slow-query log.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self._lock:
+            stats = self._stats.get(record.fingerprint)
+            if stats is None:
+                stats = {
+                    'count': 0, 'time': 0, 'rows': 0, 'bytes': 0, 
+                    'retries': 0, 'wall_times': deque(maxlen=self.max_samples)
+                }
+                self._stats[record.fingerprint] = stats
+            stats['count'] += 1
+            stats['time'] += record.wall_time
+            stats['rows'] += record.rows or 0
+            stats['bytes'] += record.bytes or 0
+            stats['retries'] += record.retries
+            stats['wall_times'].append(record.wall_time)
+        if self.is_slow(record.wall_time):
+            self._log_slow(record, query, explain)
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:
+                logging.warning('Query hook %s failed', hook, exc_info=True)
+
+
+    def _log_slow(self, record, query, explain):
+        logging.warning(
+            'Slow query (%.2fs): %s', record.wall_time, record.fingerprint)
+        if self.slow_log is None:
+            return
+        entry = {
+            **record._asdict(), 
+            'created': datetime.datetime.fromtimestamp(
+                record.created).isoformat(),
+            'query': query if isinstance(query, str) else repr(query),
+            'explain': (
+                None if explain is None 
+                else json.loads(explain.to_json(orient='records'))
+            )
+        }
+        with self._lock:
+            with open(self.slow_log, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, default=str) + '\n')
+
+
+    def summary(self):
+        """Returns the statistics aggregated by fingerprint.
+
+        Returns
+        -------
+        <pd.DataFrame> indexed by fingerprint, with the count, the p50, p95 
+        and max of the wall time, and the total rows, bytes and retries.
+        Sorted by total wall time.
+
+        """
+        with self._lock:
+            rows = []
+            for fp, stats in self._stats.items():
+                wall_times = np.array(stats['wall_times'])
+                rows.append({
+                    'fingerprint': fp, 'count': stats['count'],
+                    'p50': np.percentile(wall_times, 50),
+                    'p95': np.percentile(wall_times, 95),
+                    'max': wall_times.max(),
+                    'total_time': stats['time'], 
+                    'rows': stats['rows'], 'bytes': stats['bytes'], 
+                    'retries': stats['retries']
+                })
+        clmns = [
+            'fingerprint', 'count', 'p50', 'p95', 'max', 'total_time', 
+            'rows', 'bytes', 'retries'
+        ]
+        df = pd.DataFrame(rows, columns=clmns).set_index('fingerprint')
+        return df.sort_values('total_time', ascending=False)
+
+
+    def reset(self):
+        """Clears the aggregated statistics."""
+        with self._lock:
+            self._stats.clear()
+
+
+class SchemaCache:
+    """Time-limited cache of table schemas, shared by connections.
+
+    Each entry is loaded at most once per `ttl` seconds, including when
+    several threads look it up at the same time. The cached values must not
+    be modified.
+
+    Attributes
+    ----------
+    ttl : float
+        Time-to-live of the entries in seconds.
+    loads : int
+        Number of entries loaded (i.e. of schema queries run).
+
+    """
+    def __init__(self, ttl=300):
+        """Instantiates a SchemaCache object.
+
+        Parameters
+        ----------
+        ttl : float
+            Time-to-live of the entries in seconds. Default 300.
+
+        Returns
+        -------
+        <SchemaCache> object.
+
+        """
+        self.ttl = ttl
+        self.loads = 0
+        self._entries = {}  # key -> (loaded, value)
+        self._loading = {}  # key -> lock held while loading
+        self._lock = threading.Lock()
+
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry
+        return None
+
+
+    def get(self, key, load):
+        """Returns the entry of `key`, loaded with `load()` if missing or
+        expired.
+
+        """
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                return entry[1]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._fresh(key)
+            if entry is not None:
+                return entry[1]  # Loaded by another thread meanwhile
+            value = load()
+            with self._lock:
+                self._entries[key] = (time.monotonic(), value)
+                self.loads += 1
+        return value
+
+
+    def invalidate(self, key=None):
+        """Removes the entry of `key`, or all the entries if None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+def _copy_on_write():
+    """Whether pandas Copy-on-Write is enabled (always from pandas 3)"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+def shared_copy(df):
+    """Returns a copy of `df` which can be modified without affecting `df`.
+
+    With pandas Copy-on-Write, the copy is a cheap view sharing the data of
+    `df` until one of them is modified. Otherwise, it is a deep copy.
+
+    """
+    return df.copy(deep=not _copy_on_write())
+
+
+class _Flight:
+    """An execution in flight, shared by the identical concurrent calls"""
+    __slots__ = ('done', 'waiters', 'results', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.results = []
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent executions into a single one.
+
+    The first call of a key runs the function, and the calls of the same key
+    made while it is running wait for it and receive its result instead of
+    running the function again (or its exception). DataFrame results are
+    given to the waiting calls as `shared_copy`: each call can modify its own
+    result. Thread-safe.
+
+    Attributes
+    ----------
+    executions : int
+        Number of functions actually run.
+    saved : int
+        Number of calls which received the result of another call instead of
+        running the function.
+
+    Examples
+    --------
+    The calls of `GrabMySQLPool.extract` are coalesced before checking out a
+    connection, so that a pool of 3 connections serves 8 identical queries
+    with a single one:
+
+    >>> pool = GrabMySQL.pool(db_params, max_size=3)
+    >>> pool.single_flight = SingleFlight()
+    >>> with ThreadPoolExecutor(8) as executor:
+    ...     dfs = list(executor.map(pool.extract, [query] * 8))
+    >>> pool.single_flight.stats()
+    {'executions': 1, 'saved': 7, 'in_flight': 0}
+
+    """
+    def __init__(self):
+        self.executions = 0
+        self.saved = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+
+    def do(self, key, fn):
+        """Returns `fn()`, or the result of the running call of `key`.
+
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                flight.waiters += 1
+                self.saved += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.results.pop()
+        result = None
+        try:
+            result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            copy = shared_copy if isinstance(result, pd.DataFrame) else _same
+            with self._lock:
+                del self._flights[key]  # No more waiters can join
+                if flight.error is None:
+                    flight.results = [
+                        copy(result) for _ in range(flight.waiters)]
+            flight.done.set()
+        return result
+
+
+    def stats(self):
+        """Returns the counters as a dict."""
+        with self._lock:
+            return {
+                'executions': self.executions, 'saved': self.saved,
+                'in_flight': len(self._flights)
+            }
+
+
+def _same(value):
+    return value
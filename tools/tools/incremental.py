@@ -0,0 +1,344 @@
+"""Module to extract only the new rows of MySQL tables
+
+Classes
+-------
+    WatermarkStore :
+        Persists the high-watermark of each job, in a SQLite database or in a
+        json file.
+    IncrementalExtractor :
+        Extracts the rows of a table or query past the last watermark, by
+        pages, and advances the watermark after each page is processed.
+
+"""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from .sql import _as_python, query_repr
+
+
+def _dump(value):
+    """Serializes a watermark value (int, float, str, date or datetime)"""
+    if isinstance(value, datetime.datetime):
+        return json.dumps({'datetime': value.isoformat()})
+    if isinstance(value, datetime.date):
+        return json.dumps({'date': value.isoformat()})
+    return json.dumps(value)
+
+
+def _load(text):
+    """Deserializes a watermark value serialized with `_dump`"""
+    value = json.loads(text)
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        return datetime.date.fromisoformat(value['date'])
+    return value
+
+
+def _position(watermark, tie):
+    """Returns the (watermark, tie) pair as a comparable tuple, or None"""
+    if watermark is None:
+        return None
+    if tie is None:
+        return (watermark, )
+    return (watermark, tie)
+
+
+class WatermarkStore:
+    """Persists the high-watermark of each job.
+
+    If `path` ends with `.json`, the watermarks are stored in a json file,
+    which is atomically replaced at each update. Otherwise, they are stored
+    in a SQLite database. A watermark is a pair of values: the watermark
+    column value and the tie-breaker column value (None if not used).
+
+    """
+    def __init__(self, path):
+        """Instantiates a WatermarkStore object.
+
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite database or json file. Created if needed.
+
+        Returns
+        -------
+        <WatermarkStore> object.
+
+        """
+        self.path = os.path.expanduser(path)
+        self._json = self.path.lower().endswith('.json')
+        self._lock = threading.Lock()
+        if not self._json:
+            with self._connect() as con:
+                con.execute(
+                    'CREATE TABLE IF NOT EXISTS watermarks '
+                    '(job TEXT PRIMARY KEY, watermark TEXT, tie TEXT, '
+                    'updated TEXT)'
+                )
+
+
+    def __repr__(self):
+        return f'WatermarkStore({self.path!r})'
+
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Yields a SQLite connection, commited and closed on exit."""
+        with contextlib.closing(sqlite3.connect(self.path)) as con:
+            with con:
+                yield con
+
+
+    def _read_json(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+
+    def get(self, job):
+        """Returns the (watermark, tie) pair of `job`, or (None, None)."""
+        with self._lock:
+            if self._json:
+                row = self._read_json().get(job)
+                if row is not None:
+                    row = (row['watermark'], row['tie'])
+            else:
+                with self._connect() as con:
+                    row = con.execute(
+                        'SELECT watermark, tie FROM watermarks WHERE job = ?',
+                        (job, )
+                    ).fetchone()
+        if row is None:
+            return None, None
+        return _load(row[0]), _load(row[1])
+
+
+    def set(self, job, watermark, tie=None):
+        """Atomically replaces the (watermark, tie) pair of `job`."""
+        watermark, tie = _dump(watermark), _dump(tie)
+        updated = datetime.datetime.now().isoformat()
+        with self._lock:
+            if self._json:
+                states = self._read_json()
+                states[job] = {
+                    'watermark': watermark, 'tie': tie, 'updated': updated}
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(states, file, indent=2)
+                os.replace(tmp_path, self.path)
+            else:
+                with self._connect() as con:
+                    con.execute(
+                        'INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)',
+                        (job, watermark, tie, updated)
+                    )
+
+
+    def delete(self, job):
+        """Removes the watermark of `job`."""
+        with self._lock:
+            if self._json:
+                states = self._read_json()
+                states.pop(job, None)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(states, file, indent=2)
+                os.replace(tmp_path, self.path)
+            else:
+                with self._connect() as con:
+                    con.execute('DELETE FROM watermarks WHERE job = ?', (job, ))
+
+
+class IncrementalExtractor:
+    """Extracts the rows of a table or query past a persisted high-watermark.
+
+    The rows are extracted by pages of `page_size` rows ordered by the
+    watermark column (e.g. `updated` or an auto-increment `id`). If the
+    watermark column is not unique, a unique `tie_column` (e.g. `id`) must be
+    given so that pages never split or skip rows sharing the same watermark.
+    Each page is passed to the caller's `sink`, and the watermark is only
+    persisted once the sink returns successfully. A failed run is thus
+    resumed from the last processed page.
+    To catch the late-arriving updates, the extraction starts `overlap` before
+    the persisted watermark (a number for numeric watermarks, a
+    `datetime.timedelta` or seconds for datetimes). Overlapping rows are
+    extracted again, so the sink must be idempotent (e.g. `insert_df` with
+    `on_dupl_update_clmns`).
+
+    Examples
+    --------
+    >>> job = IncrementalExtractor(
+    ...     sql, 'disputes_sync', 'disputes', 'updated', 'watermarks.db',
+    ...     tie_column='id', overlap=datetime.timedelta(minutes=10))
+    >>> job.run(lambda df: sql_stg.insert_df(
+    ...     df, 'disputes', on_dupl_update_clmns=df.columns))
+    12000
+
+    """
+    def __init__(self, sql, job_name, table_or_query, watermark_column,
+                 store, tie_column=None, page_size=50000, overlap=None,
+                 params=None):
+        """Instantiates an IncrementalExtractor object.
+
+        Parameters
+        ----------
+        sql : <GrabMySQL> or <GrabMySQLPool>
+            Connection used to extract the rows.
+        job_name : str
+            Name of the job, used as key of the watermark.
+        table_or_query : str
+            Name of the table, or `SELECT` query, to extract. A query is
+            wrapped in a derived table, so the watermark and tie columns must
+            be among its output columns.
+        watermark_column : str
+            Column tracked by the watermark.
+        store : <WatermarkStore> or str
+            Store of the watermarks, or path to create one.
+        tie_column : str, optional
+            Unique column ordering the rows with the same watermark.
+        page_size : int
+            Maximum number of rows per page. Default 50000.
+        overlap : number or `datetime.timedelta`, optional
+            How far before the persisted watermark to start the extraction.
+        params : tuple or list, optional
+            Parameters used with query.
+
+        Returns
+        -------
+        <IncrementalExtractor> object.
+
+        """
+        self.sql = sql
+        self.job_name = job_name
+        if len(table_or_query.split()) == 1:
+            self._source = table_or_query
+        else:
+            self._source = f'({table_or_query}) AS _source'
+        self.watermark_column = watermark_column
+        if isinstance(store, str):
+            store = WatermarkStore(store)
+        self.store = store
+        self.tie_column = tie_column
+        self.page_size = page_size
+        self.overlap = overlap
+        self.params = tuple(params or ())
+
+
+    def __repr__(self):
+        return (
+            f'IncrementalExtractor({self.job_name!r}, '
+            f'{query_repr(self._source)}, {self.watermark_column!r})'
+        )
+
+
+    @property
+    def watermark(self):
+        """The persisted (watermark, tie) pair."""
+        return self.store.get(self.job_name)
+
+
+    def reset(self, watermark=None, tie=None):
+        """Resets the persisted watermark (deleted if `watermark` is None)."""
+        if watermark is None:
+            self.store.delete(self.job_name)
+        else:
+            self.store.set(self.job_name, watermark, tie)
+
+
+    def _start(self):
+        """Returns the (watermark, tie) pair to start the extraction from."""
+        watermark, tie = self.store.get(self.job_name)
+        if watermark is None or not self.overlap:
+            return watermark, tie
+        overlap = self.overlap
+        if (isinstance(watermark, datetime.date)
+                and not isinstance(overlap, datetime.timedelta)):
+            overlap = datetime.timedelta(seconds=overlap)
+        return watermark - overlap, None
+
+
+    def _page_query(self, watermark, tie):
+        """Returns the query and parameters of the page after the
+        (watermark, tie) pair.
+
+        """
+        clmn, tie_clmn = self.watermark_column, self.tie_column
+        order = f'{clmn}, {tie_clmn}' if tie_clmn else clmn
+        where = f'{clmn} IS NOT NULL'
+        params = self.params
+        if watermark is not None and tie is not None:
+            where = f'({clmn} > %s OR ({clmn} = %s AND {tie_clmn} > %s))'
+            params = params + (watermark, watermark, tie)
+        elif watermark is not None:
+            where = f'{clmn} > %s'
+            params = params + (watermark, )
+        query = (
+            f'SELECT * FROM {self._source} WHERE {where} '
+            f'ORDER BY {order} LIMIT {int(self.page_size)}'
+        )
+        return query, params
+
+
+    def pages(self):
+        """Yields the pages past the watermark, without persisting it.
+
+        Returns
+        -------
+        Generator of (<pd.DataFrame>, (watermark, tie)) with each page and
+        its last (watermark, tie) pair.
+
+        """
+        watermark, tie = self._start()
+        while True:
+            query, params = self._page_query(watermark, tie)
+            df = self.sql.extract(query, params or None)
+            if len(df) == 0:
+                return
+            watermark = _as_python(df[self.watermark_column].iloc[-1])
+            tie = None
+            if self.tie_column:
+                tie = _as_python(df[self.tie_column].iloc[-1])
+            yield df, (watermark, tie)
+            if len(df) < self.page_size:
+                return
+
+
+    def run(self, sink):
+        """Extracts the rows past the watermark and passes them to `sink`, page
+        by page. The watermark is persisted after each successful call to
+        `sink`.
+
+        Parameters
+        ----------
+        sink : callable
+            Function called with each page as a <pd.DataFrame>. An exception
+            raised by `sink` stops the run, without advancing the watermark.
+
+        Returns
+        -------
+        int : Number of extracted rows.
+
+        """
+        nrows = 0
+        persisted = _position(*self.store.get(self.job_name))
+        for df, (watermark, tie) in self.pages():
+            sink(df)
+            nrows += len(df)
+            # With overlap, re-extracted pages must not move the watermark back
+            position = _position(watermark, tie)
+            if persisted is None or not position < persisted:
+                self.store.set(self.job_name, watermark, tie)
+                persisted = position
+            logging.info(
+                'Job %s: %s rows processed up to %s=%s', self.job_name,
+                nrows, self.watermark_column, watermark
+            )
+        return nrows
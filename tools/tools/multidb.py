@@ -0,0 +1,233 @@
+"""Module to run the same query on several databases at once
+
+Classes
+-------
+    MultiDB :
+        Runs a query concurrently on several databases, and returns the union
+        of the results with a source column, and the errors of each database.
+
+"""
+import concurrent.futures
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from .sql import GrabMySQL, query_repr
+
+
+"""Result of `MultiDB.extract`: the union of the results as `frame`, and the
+exception of each failed target as `errors`"""
+MultiResult = namedtuple('MultiResult', ['frame', 'errors'])
+
+
+def _submit(name, fn, *args):
+    """Runs `fn(*args)` in a daemon thread, and returns its future.
+
+    Unlike the threads of a `ThreadPoolExecutor`, which are joined at
+    interpreter exit, a daemon thread blocked in a query which timed out does
+    not prevent the interpreter from exiting.
+
+    """
+    future = concurrent.futures.Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, name=f'MultiDB-{name}', daemon=True).start()
+    return future
+
+
+class MultiDB:
+    """Runs the same query concurrently on several databases.
+
+    The targets are given as a mapping of names to `GrabMySQL` objects (or
+    `GrabMySQLPool`, `GrabPresto`, any object with an `extract` method), or
+    to connection parameters such as the ones returned by
+    `get_ssm_parameter`, in which case the connection is opened on first use.
+    Each target runs in its own daemon thread, and a target failing or timing
+    out does not fail the others: its exception is returned in `errors`. The
+    thread of a target which timed out is not waited for, even at
+    interpreter exit.
+    A `GrabMySQL` can only run one query at a time. A target which timed out
+    is not used again until its query completes: it fails with a
+    `RuntimeError` in the meantime.
+
+    Examples
+    --------
+    >>> PARAMS = get_ssm_parameter(os.environ['SSM_PARAM'])
+    >>> dbs = MultiDB({
+    ...     'external': PARAMS['db_ext'], 'external-8': PARAMS['db_ext8'],
+    ...     'staging': sql_stg}, timeout=60)
+    >>> df, errors = dbs.extract(
+    ...     "SELECT country_id, COUNT(*) AS n FROM disputes GROUP BY 1")
+    >>> df
+         source  country_id     n
+    0  external           2  1200
+    1  external           4   830
+    ...
+    >>> errors
+    {'staging': TimeoutError('No result from staging within 60 seconds.')}
+
+    Same query with different parameters per target
+
+    >>> dbs.extract(
+    ...     "SELECT * FROM disputes WHERE country_id = %s",
+    ...     target_params={'external': 2, 'external-8': 4})
+
+    """
+    def __init__(self, targets, timeout=None, source_column='source'):
+        """Instantiates a MultiDB object.
+
+        Parameters
+        ----------
+        targets : dict
+            Mapping of target names to `GrabMySQL` objects (or any object
+            with an `extract` method), or to connection parameters.
+        timeout : float or dict, optional
+            Default time in seconds to wait for the result of each target, or
+            mapping of target names to timeouts. None (default) waits
+            forever.
+        source_column : str
+            Name of the column holding the target name. Default 'source'.
+
+        Returns
+        -------
+        <MultiDB> object.
+
+        """
+        self._targets = dict(targets)
+        self.timeout = timeout
+        self.source_column = source_column
+        self._opened = set()
+        self._running = {}  # name -> future still running after a timeout
+
+
+    def __repr__(self):
+        return f'MultiDB({list(self._targets)})'
+
+
+    def _connection(self, name):
+        target = self._targets[name]
+        if isinstance(target, dict):
+            target = self._targets[name] = GrabMySQL(target)
+            self._opened.add(name)
+        return target
+
+
+    def _extract(self, name, query, params):
+        start = time.perf_counter()
+        df = self._connection(name).extract(query, params)
+        logging.info(
+            '%s rows extracted from %s in %.2fs', len(df), name,
+            time.perf_counter() - start
+        )
+        if self.source_column in df.columns:
+            raise ValueError(
+                f'The result already has a {self.source_column!r} column: '
+                'set another `source_column`.'
+            )
+        df.insert(0, self.source_column, name)
+        return df
+
+
+    def _timeout(self, name, timeout):
+        if timeout is None:
+            timeout = self.timeout
+        if isinstance(timeout, dict):
+            return timeout.get(name)
+        return timeout
+
+
+    def extract(self, query, params=None, targets=None, timeout=None,
+                target_params=None):
+        """Runs a `SELECT` query on all the targets concurrently, and returns
+        the union of the results.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `SELECT` query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+        targets : iterable of str, optional
+            Names of the targets to query. None (default) queries all of
+            them.
+        timeout : float or dict, optional
+            Timeout of each target, overriding the default `timeout`.
+        target_params : dict, optional
+            Mapping of target names to the parameters used for that target,
+            instead of `params`.
+
+        Returns
+        -------
+        A 2-elements namedtuple `MultiResult` with the union of the results
+        as `frame` (<pd.DataFrame> with the target name as first column), and
+        the exception of each failed target as `errors` (dict).
+
+        """
+        names = list(self._targets) if targets is None else list(targets)
+        target_params = target_params or {}
+        logging.info(
+            'Extract data from %s targets using %s', len(names),
+            query_repr(query)
+        )
+        errors, futures = {}, {}
+        start = time.monotonic()
+        for name in names:
+            running = self._running.get(name)
+            if running is not None and not running.done():
+                errors[name] = RuntimeError(
+                    f'{name} is still running a query which timed out.')
+                continue
+            futures[name] = _submit(
+                name, self._extract, name, query,
+                target_params.get(name, params)
+            )
+
+        frames = []
+        for name, future in futures.items():
+            timeout_ = self._timeout(name, timeout)
+            remaining = None
+            if timeout_ is not None:
+                remaining = max(0, start + timeout_ - time.monotonic())
+            try:
+                df = future.result(remaining)
+            except concurrent.futures.TimeoutError:
+                self._running[name] = future
+                errors[name] = TimeoutError(
+                    f'No result from {name} within {timeout_} seconds.')
+            except Exception as e:
+                errors[name] = e
+            else:
+                frames.append(df)
+        for name, e in errors.items():
+            logging.warning('Extraction from %s failed: %r', name, e)
+
+        if frames:
+            frame = pd.concat(frames, ignore_index=True)
+            frame[self.source_column] = pd.Categorical(
+                frame[self.source_column], categories=names)
+        else:
+            frame = pd.DataFrame(columns=[self.source_column])
+        logging.info(
+            '%s rows extracted from %s targets (%s failed)', len(frame),
+            len(frames), len(errors)
+        )
+        return MultiResult(frame, errors)
+
+
+    def close(self):
+        """Closes the connections opened from connection parameters."""
+        for name in self._opened:
+            self._targets[name].close()
+        self._opened.clear()
@@ -1,14 +1,46 @@
 import logging
 
-import pandas as pd
 from pyhive import presto
 
+from . import dbapi
+
+"""Column kind of each Presto type name, used to build typed DataFrames"""
+PRESTO_KINDS = {
+    **dict.fromkeys(('tinyint', 'smallint', 'integer', 'bigint'), dbapi.INT),
+    **dict.fromkeys(('real', 'double'), dbapi.FLOAT),
+    'boolean': dbapi.BOOL,
+    **dict.fromkeys(('date', 'timestamp'), dbapi.DATETIME),
+    **dict.fromkeys(('varchar', 'char'), dbapi.STRING),
+}
+
+
+def presto_kind(type_code):
+    """Returns the column kind of a Presto type name (default object)
+
+    Parametrized types such as `varchar(10)` are mapped from their base name.
+
+    """
+    return PRESTO_KINDS.get(type_code.split('(')[0], dbapi.OBJECT)
+
 
 class GrabPresto:
     """A simple wrapper around `pyhive.presto`.
 
     Presto should not be queried directly from Python in production. Only for
     testing on local laptop.
+
+    Attributes
+    ----------
+    categorical_ratio : float or None
+        If set, string columns returned by `extract` whose ratio of unique
+        values is at most `categorical_ratio` are returned as categoricals.
+        Default None.
+    cache : <QueryCache> or None
+        If set, the results of the `extract` called with a `ttl` are cached.
+        Default None.
+    single_flight : <SingleFlight> or None
+        If set, the identical concurrent `extract` are coalesced. Default
+        None.
     
     """
     DEFAULT_CONNECTION = {
@@ -31,32 +63,108 @@ class GrabPresto:
 
         """
         logging.info('Connecting to Presto')
-        self._con = presto.connect(
-            **{**self.__class__.DEFAULT_CONNECTION, **db_params})
+        self._db_params = {**self.__class__.DEFAULT_CONNECTION, **db_params}
+        self._con = presto.connect(**self._db_params)
         self._cursor = self._con.cursor()    
+        self.categorical_ratio = None
+        self.cache = None
+        self.single_flight = None
 
 
     def __repr__(self):
         return f'GrabPresto(...)'
 
 
-    def extract(self, query, params=None):
+    def extract(self, query, params=None, ttl=None):
         """Extracts data from Presto and returns its result as a DataFrame.
 
+        If a `QueryCache` is set as `cache` attribute and `ttl` is given,
+        then a result younger than `ttl` is read from the cache, or the query
+        is run and its result cached.
+        If a `SingleFlight` is set as `single_flight` attribute, then the
+        identical queries run concurrently are run only once.
+
         Parameters
         ----------
         query : str
             The SQL query to run.
         params : tuple, list, or dict
             Parameters used with query.
+        ttl : float, optional
+            Maximum age in seconds of a cached result. None (default) or 0
+            bypasses the cache.
         
         Returns
         -------
         <pd.DataFrame>
+        """
+        cache = self.cache
+        if cache is None or not ttl:
+            cache = key = None
+        else:
+            key = cache.key(self._identity(), f'{query}\n{params!r}')
+            df = cache.get(key, ttl)
+            if df is not None:
+                logging.info('%s rows extracted from cache', len(df))
+                return df
+
+        def run():
+            self._cursor.execute(query, params)
+            data = self._cursor.fetchall()
+            df = dbapi.build_frame(
+                data, self._cursor.description, presto_kind, 
+                self.categorical_ratio
+            )
+            logging.info('%s rows extracted successfully', len(df))
+            if cache is not None:
+                cache.put(key, df)
+            return df
+
+        if self.single_flight is None:
+            return run()
+        return self.single_flight.do(
+            (self._identity(), f'{query}\n{params!r}'), run)
+
+
+    def extract_to_parquet(self, query, params, path, row_group_size=100000):
+        """Extracts data from Presto and writes it into a Parquet file.
+
+        The rows are fetched and written by row groups of `row_group_size` 
+        rows, so that the memory used is bounded by one row group instead of
+        the whole result. Requires `pyarrow`. The cache is not used.
+
+        Parameters
+        ----------
+        query : str
+            The SQL query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+        path : str or file-like object
+            Path to the Parquet file, or writable binary file-like object, 
+            such as `GrabS3.open_upload`.
+        row_group_size : int
+            Number of rows per row group. Default 100000.
+
+        Returns
+        -------
+        A 2-elements tuple with the number of rows and the size of the file in
+        bytes.
+
         """
         self._cursor.execute(query, params)
-        data = self._cursor.fetchall()
-        clmns = [d[0] for d in self._cursor.description]
-        df = pd.DataFrame(list(data), columns=clmns)
-        logging.info('%s rows extracted successfully', len(df))
-        return df
+        nrows, nbytes = dbapi.write_parquet(
+            self._cursor.fetchmany, self._cursor.description, presto_kind, 
+            path, row_group_size
+        )
+        logging.info(
+            '%s rows written successfully (%s bytes)', nrows, nbytes)
+        return nrows, nbytes
+
+
+    def _identity(self):
+        """Identifies the server and user the connection is opened to."""
+        params = self._db_params
+        return '|'.join(
+            str(params.get(k)) 
+            for k in ('host', 'port', 'catalog', 'schema', 'username')
+        )
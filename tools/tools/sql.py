@@ -6,8 +6,13 @@ Functions
         Decorator used to retry MySQL queries.
     prepare_df :
         Prepares a `pd.DataFrame` to be used a query parameters for MySQL.
+    iter_prepared :
+        Same as `prepare_df`, but lazily yields the rows by batch.
     jsonify_sql :
         Turns a SQL query into a json files for BatMan-style source input.
+    jsonify_sql_dir :
+        Same as `jsonify_sql` for all the queries of a folder, in parallel,
+        skipping the queries not modified since the last build.
     replace :
         Replaces the parameter from a BatMan-style parametrized query.
            
@@ -17,21 +22,45 @@ Classes
         Class used to interact with MySQL. Can be used either for single
         query which are directly commited, or within a context manager to
         replicate MySQL transaction.
+    GrabMySQLPool :
+        Thread-safe pool of GrabMySQL connections, created with
+        `GrabMySQL.pool`.
+    GrabMySQLRouter :
+        GrabMySQL sending the reads to healthy replicas, and the writes and
+        transactions to the primary.
+    SqlTemplate :
+        BatMan-style parametrized query, parsed once and rendered in a single
+        pass.
 
 """
 import contextlib
+import datetime
+import functools
+import hashlib
 import json
 import logging
 import os
 import pathlib
 import re
 import reprlib
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections.abc import Iterator
 from ssl import SSLError
 from pathlib import Path
 import backoff
+import numpy as np
 import pandas as pd
 import pymysql
+import pymysql.cursors
 import pyperclip
+from pymysql.constants import FIELD_TYPE
+
+from . import dbapi
+from .utils import chunks
 
 """Errors to retry for MySQL
 """
@@ -58,6 +87,140 @@ class QueryRepr(reprlib.Repr):
 query_repr = QueryRepr().repr
 
 
+class _Lazy:
+    """Log argument computed only if the log record is actually emitted.
+
+    `logging` formats its arguments with `%s` only when a handler accepts the
+    record, so `_Lazy(fn, *args)` costs a single allocation on the hot path
+    while `fn(*args)` would always be evaluated.
+
+    """
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+
+"""Bytes kept free in a packet for the protocol headers"""
+PACKET_MARGIN = 1024
+
+
+"""Marker of the condition on the values in `GrabMySQL.extract_in` queries"""
+IN_MARKER = '{in}'
+
+
+"""Escape sequences of the default `LOAD DATA` format"""
+TSV_ESCAPES = str.maketrans(
+    {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+
+def _tsv_field(value):
+    """Formats a value for the default `LOAD DATA` format (tab separated)
+
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value).translate(TSV_ESCAPES)
+
+
+def _tsv_hex(value):
+    """Formats a value of a binary column for `LOAD DATA`, as hexadecimal
+    digits decoded by `UNHEX`
+
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    elif not isinstance(value, (bytes, bytearray)):
+        value = str(value).encode('utf-8')
+    return value.hex()
+
+
+def _is_binary(s):
+    """Whether a column holds bytes"""
+    if s.dtype != object:
+        return False
+    return any(isinstance(v, (bytes, bytearray)) for v in s)
+
+
+def on_dupl_update(clmns):
+    """Returns the `ON DUPLICATE KEY UPDATE` clause updating `clmns`
+
+    An empty string is returned if `clmns` is None or empty.
+
+    """
+    if isinstance(clmns, str):
+        clmns = [clmns]
+    if clmns is None or len(clmns) == 0:
+        return ''
+    update = [f'{clmn}=VALUES({clmn})' for clmn in clmns]
+    return ' ON DUPLICATE KEY UPDATE ' + ', '.join(update)
+
+
+def insert_statements(df, table_name, clmns, update, literal, encoding, 
+                      max_allowed_packet, batch_size=None):
+    """Yields the multi-row `INSERT` statements inserting a DataFrame.
+
+    Each statement is at most `max_allowed_packet` bytes long. The statements
+    are yielded by list holding `batch_size` rows (all the rows if None).
+
+    Parameters
+    ----------
+    df : <pd.DataFrame>
+        The DataFrame to insert.
+    table_name : str
+        The name of the table.
+    clmns : str
+        Comma separated column names.
+    update : str
+        The `ON DUPLICATE KEY UPDATE` clause (possibly empty).
+    literal : callable
+        Function escaping a value, such as `connection.literal`.
+    encoding : str
+        Encoding of the connection.
+    max_allowed_packet : int
+        Maximum size in bytes of a statement.
+    batch_size : int, optional
+        Number of rows per list of statements.
+
+    Returns
+    -------
+    Generator of list of bytes.
+
+    """
+    prefix = f'INSERT INTO {table_name} ({clmns}) VALUES '.encode(encoding)
+    suffix = update.encode(encoding)
+    max_size = max_allowed_packet - PACKET_MARGIN - len(prefix) - len(suffix)
+    statements, values, size, batch_rows = [], [], 0, 0
+    for rows in iter_prepared(df, 'tuple', True):
+        for row in rows:
+            value = (
+                '(' + ','.join([literal(v) for v in row]) + ')'
+            ).encode(encoding)
+            if values and size + len(value) > max_size:
+                statements.append(prefix + b','.join(values) + suffix)
+                values, size = [], 0
+            values.append(value)
+            size += len(value) + 1
+            batch_rows += 1
+            if batch_size and batch_rows >= batch_size:
+                statements.append(prefix + b','.join(values) + suffix)
+                yield statements
+                statements, values, size, batch_rows = [], [], 0, 0
+    if values:
+        statements.append(prefix + b','.join(values) + suffix)
+    if statements:
+        yield statements
+
+
 def query_type(query):
     """Returns the type (SELECT, EXPLAIN, INSERT or UPDATE) of query
 
@@ -72,29 +235,374 @@ def prepare_df(df, type='list', null_to_none=True):
     un-named query parameters (%s or %(1)s) - or into a list of dictionary
     (type='dict') - for named query parameters (%(name)s).
     If `null_to_none=True` then the Null values are replaced by None.
+    To avoid building the full list at once, use `iter_prepared`.
 
     Parameters
     ----------
     df : `pd.DataFrame`
         The DataFrame to prepare.
-    type : str {'list', 'dict'}
-        If 'list' then the a list of list is returned. If 'dict' then a dict of
-        list is returned. 
+    type : str {'list', 'tuple', 'dict'}
+        If 'list' then the a list of list is returned. If 'tuple' then a list
+        of tuple is returned. If 'dict' then a list of dict is returned. 
     null_to_none : bool
         If `True` then null values are replaced to None.
     
     Returns
     -------
-    List of list, or list of dict, depending on `type` parameter.
+    List of list, list of tuple, or list of dict, depending on `type` 
+    parameter.
     """
-    if null_to_none:
-        df = df.where((pd.notnull(df)), None)
-    if type.lower() == 'list':
-        return df.values.tolist()
-    elif type.lower() == 'dict':
-        return df.to_dict('records')
-    else:
-        raise ValueError('type must be either "list" or "dict".')
+    rows = []
+    for batch in iter_prepared(df, type, null_to_none, max(len(df), 1)):
+        rows.extend(batch)
+    return rows
+
+
+def iter_prepared(df, type='tuple', null_to_none=True, batch_size=10000):
+    """Yields the rows of a DataFrame, prepared as query parameters, by batch.
+
+    The DataFrame is converted column by column, and only for `batch_size`
+    rows at a time: the values are converted into Python objects, and the null
+    values (NaN, NaT, NA) are replaced by None only in the columns which
+    contain nulls. The DataFrame itself is neither modified nor copied. Each
+    batch can directly be used as parameters of `GrabMySQL.modify`, and the
+    generator itself can be passed to `GrabMySQL.modify`.
+
+    Parameters
+    ----------
+    df : `pd.DataFrame`
+        The DataFrame to prepare.
+    type : str {'tuple', 'list', 'dict'}
+        Type of each row. 'tuple' and 'list' for un-named query parameters,
+        'dict' for named query parameters.
+    null_to_none : bool
+        If `True` then null values are replaced to None.
+    batch_size : int
+        Number of rows per batch.
+
+    Returns
+    -------
+    Generator of list of rows.
+
+    """
+    type = type.lower()
+    if type not in ('tuple', 'list', 'dict'):
+        raise ValueError('type must be either "tuple", "list" or "dict".')
+    columns = [df.iloc[:, i] for i in range(df.shape[1])]
+    masks = []
+    for clmn in columns:
+        mask = None
+        if null_to_none:
+            mask = clmn.isna().to_numpy()
+            if not mask.any():
+                mask = None
+        masks.append(mask)
+    names = list(df.columns)
+    for start in range(0, len(df), batch_size):
+        stop = start + batch_size
+        values = []
+        for clmn, mask in zip(columns, masks):
+            clmn_values = clmn.iloc[start:stop].tolist()
+            if mask is not None:
+                for i in np.flatnonzero(mask[start:stop]):
+                    clmn_values[i] = None
+            values.append(clmn_values)
+        if type == 'tuple':
+            yield list(zip(*values))
+        elif type == 'list':
+            yield [list(row) for row in zip(*values)]
+        else:
+            yield [dict(zip(names, row)) for row in zip(*values)]
+
+
+"""Column kind of each MySQL field type, used to build typed DataFrames"""
+MYSQL_KINDS = {
+    **dict.fromkeys((
+        FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, 
+        FIELD_TYPE.LONGLONG, FIELD_TYPE.INT24, FIELD_TYPE.YEAR), dbapi.INT),
+    **dict.fromkeys((FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE), dbapi.FLOAT),
+    **dict.fromkeys((
+        FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP, FIELD_TYPE.DATE,
+        FIELD_TYPE.NEWDATE), dbapi.DATETIME),
+    **dict.fromkeys((
+        FIELD_TYPE.VARCHAR, FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING,
+        FIELD_TYPE.ENUM), dbapi.STRING),
+    **dict.fromkeys(
+        (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL), dbapi.DECIMAL),
+}
+
+
+def mysql_kind(type_code):
+    """Returns the column kind of a MySQL field type (default object)
+
+    """
+    return MYSQL_KINDS.get(type_code, dbapi.OBJECT)
+
+
+"""Conversion profiles of `GrabMySQL.conversion`"""
+CONVERSIONS = ('python', 'fast', 'fast_exact')
+
+
+"""MySQL decimal field types"""
+DECIMAL_TYPES = (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL)
+
+
+def mysql_fast_kind(type_code):
+    """Returns the column kind of a MySQL field type with the `fast` 
+    conversion profile, where decimals are floats (default object)
+
+    """
+    if type_code in DECIMAL_TYPES:
+        return dbapi.FLOAT
+    return MYSQL_KINDS.get(type_code, dbapi.OBJECT)
+
+
+"""Field types left undecoded (as strings) by `pymysql` with the `fast`
+profiles, and parsed in bulk by `dbapi.build_frame` instead"""
+BULK_TYPES = tuple(
+    type_code for type_code, kind in MYSQL_KINDS.items() 
+    if kind in (dbapi.INT, dbapi.FLOAT, dbapi.DATETIME)
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _decoders(conversion):
+    """Returns the `pymysql` decoders of a conversion profile"""
+    skipped = _skipped_decoders(conversion)
+    return {
+        k: v for k, v in pymysql.converters.decoders.items() 
+        if type(k) is int and k not in skipped
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _skipped_decoders(conversion):
+    """Returns the `pymysql` decoders removed by a conversion profile, used
+    by `dbapi.build_frame` for the columns it cannot parse in bulk
+
+    """
+    skipped = ()
+    if conversion != 'python':
+        skipped = BULK_TYPES
+    if conversion == 'fast':
+        skipped += DECIMAL_TYPES
+    return {
+        k: v for k, v in pymysql.converters.decoders.items() if k in skipped}
+
+
+"""Groups of `information_schema.COLUMNS.DATA_TYPE` values"""
+SCHEMA_INT_TYPES = (
+    'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'year')
+SCHEMA_FLOAT_TYPES = ('float', 'double', 'real', 'decimal', 'numeric')
+SCHEMA_DATETIME_TYPES = ('date', 'datetime', 'timestamp')
+SCHEMA_STRING_TYPES = (
+    'char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum',
+    'set')
+
+
+def _cast_column(s, data_type, max_length):
+    """Casts a column to match a MySQL data type (vectorized).
+
+    Columns already of a compatible type are returned unchanged. Raises a
+    `ValueError` or `TypeError` if the values cannot be cast.
+
+    """
+    inferred = pd.api.types.infer_dtype(s, skipna=True)
+    if inferred == 'empty':
+        return s
+    if data_type in SCHEMA_INT_TYPES:
+        if inferred in ('integer', 'boolean'):
+            return s
+        # Raises a TypeError on floats with a fractional part
+        return pd.to_numeric(s).astype('Int64')
+    if data_type in SCHEMA_FLOAT_TYPES:
+        if inferred in ('integer', 'floating', 'decimal', 'boolean',
+                        'mixed-integer-float'):
+            return s
+        return pd.to_numeric(s)
+    if data_type in SCHEMA_DATETIME_TYPES:
+        if inferred in ('datetime64', 'datetime', 'date'):
+            return s
+        return pd.to_datetime(s, format='ISO8601')
+    if data_type in SCHEMA_STRING_TYPES:
+        if inferred == 'floating' and (s.dropna() % 1 == 0).all():
+            s = s.astype('Int64')  # 1.0 as '1', not '1.0'
+        if inferred != 'string':
+            s = s.astype(object).where(s.isna(), s.astype(str))
+        if max_length is not None and not pd.isna(max_length):
+            too_long = s.str.len() > max_length
+            if too_long.any():
+                raise ValueError(
+                    f'{too_long.sum()} values longer than {int(max_length)} '
+                    'characters'
+                )
+        return s
+    return s
+
+
+def _row_width(df, schema):
+    """Estimates the size in bytes of a row in an `INSERT` statement.
+
+    """
+    width = 2
+    sample = df.head(1000)
+    for name, clmn in schema.iterrows():
+        if name not in df.columns:
+            continue
+        data_type = clmn['data_type']
+        if data_type in SCHEMA_INT_TYPES:
+            width += 11
+        elif data_type in ('float', 'double', 'real'):
+            width += 24
+        elif data_type in ('decimal', 'numeric'):
+            width += int(clmn['precision'] or 20) + 2
+        elif data_type in SCHEMA_DATETIME_TYPES:
+            width += 21
+        else:
+            lengths = sample[name].dropna().astype(str).str.len()
+            width += (lengths.mean() if len(lengths) else 0) + 2
+        width += 1
+    return int(width)
+
+
+def _as_tuple(params):
+    """Returns query parameters as a tuple (empty if None)"""
+    if params is None:
+        return ()
+    if isinstance(params, (list, tuple)):
+        return tuple(params)
+    return (params, )
+
+
+def _as_python(value):
+    """Converts numpy and pandas scalars into python objects (NaN to None)"""
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _identity(db_params):
+    """Identifies the database of connection parameters"""
+    return '|'.join(
+        str(db_params.get(k)) for k in ('host', 'port', 'db', 'user'))
+
+
+def _literal(value):
+    """Escapes a parameter like `pymysql.Connection.literal`"""
+    if isinstance(value, str):
+        return "'" + pymysql.converters.escape_string(value) + "'"
+    if isinstance(value, (bytes, bytearray)):
+        return pymysql.converters.escape_bytes(value)
+    return pymysql.converters.escape_item(value, 'utf8mb4')
+
+
+def _flight_key(db_params, query, params):
+    """Returns the `SingleFlight` key of a query: its database and the query
+    with its parameters replaced, computed without a connection.
+
+    """
+    if isinstance(params, (list, tuple)):
+        query = query % tuple(_literal(v) for v in params)
+    elif isinstance(params, dict):
+        query = query % {k: _literal(v) for k, v in params.items()}
+    elif params is not None:
+        query = query % _literal(params)
+    return _identity(db_params), query
+
+
+def _keyset_condition(key_columns, named=False):
+    """Returns the condition selecting the rows following a key in the order
+    of `key_columns`, and the indices of the key values in its parameters.
+
+    For the key (a, b), the condition is `a >= %s AND ((a > %s) OR (a = %s
+    AND b > %s))`, whose leading `a >= %s` allows an index range scan.
+    With `named=True`, the parameters are named `_after_<i>` instead.
+
+    """
+    def placeholder(i):
+        return f'%(_after_{i})s' if named else '%s'
+
+    terms, indices = [], []
+    for i, clmn in enumerate(key_columns):
+        equals = [
+            f'{c} = {placeholder(j)}' for j, c in enumerate(key_columns[:i])]
+        terms.append(' AND '.join(equals + [f'{clmn} > {placeholder(i)}']))
+        indices += list(range(i)) + [i]
+    condition = ' OR '.join(f'({term})' for term in terms)
+    if len(key_columns) > 1:
+        condition = f'{key_columns[0]} >= {placeholder(0)} AND ({condition})'
+        indices = [0] + indices
+    return condition, indices
+
+
+DML_TABLE_PATTERN = re.compile(
+    r'^\s*(?:DELETE\s+(?:(?:LOW_PRIORITY|QUICK|IGNORE)\s+)*FROM'
+    r'|UPDATE\s+(?:(?:LOW_PRIORITY|IGNORE)\s+)*)\s*([\w.`]+)',
+    re.IGNORECASE
+)
+
+
+def _split_dml(query):
+    """Splits a single-table `UPDATE` or `DELETE` query into its table, the
+    part before `WHERE`, and the `WHERE` condition (empty if none).
+
+    """
+    if query_type(query) not in ('UPDATE', 'DELETE'):
+        raise ValueError('`query` must be a UPDATE or DELETE query.')
+    match = DML_TABLE_PATTERN.match(query)
+    if match is None:
+        raise ValueError(f'Cannot find the table of {query_repr(query)}.')
+    parts = re.split(r'\bWHERE\b', query, maxsplit=1, flags=re.IGNORECASE)
+    condition = parts[1].strip().rstrip(';') if len(parts) > 1 else ''
+    if re.search(r'\b(ORDER\s+BY|LIMIT)\b', condition, re.IGNORECASE):
+        raise ValueError('`query` must not have ORDER BY or LIMIT clauses.')
+    return match.group(1), parts[0].rstrip().rstrip(';'), condition
+
+
+def _sql_type(values):
+    """Returns the SQL column type able to hold the (not null) values"""
+    types = {type(v) for v in values}
+    if types <= {int, bool}:
+        return 'BIGINT'
+    if types <= {int, bool, float}:
+        return 'DOUBLE'
+    if types <= {datetime.datetime, pd.Timestamp}:
+        return 'DATETIME(6)'
+    if types <= {datetime.date}:
+        return 'DATE'
+    if types <= {bytes}:
+        return f'VARBINARY({max(len(v) for v in values)})'
+    width = max(len(str(v)) for v in values)
+    return f'VARCHAR({width}) CHARACTER SET utf8mb4'
+
+
+def _unique_bounds(bounds):
+    """Removes the consecutive duplicated bounds"""
+    unique = []
+    for bound in bounds:
+        if not unique or bound != unique[-1]:
+            unique.append(bound)
+    if len(unique) == 1:
+        unique.append(unique[0])  # A single shard including the single value
+    return unique
+
+
+def _approx_params_bytes(params, n_samples=100):
+    """Approximates the size of the query parameters, from a sample of rows
+    if used with `executemany`.
+
+    """
+    if params is None:
+        return 0
+    if isinstance(params, (list, tuple)) and params:
+        if isinstance(params[0], (dict, list, tuple)):
+            sample = params[:n_samples]
+            return len(repr(sample)) * len(params) // len(sample)
+    return len(repr(params))
 
 
 class GrabMySQL():
@@ -111,6 +619,46 @@ class GrabMySQL():
     When a GrabMySQL object is used as a context manager, then the transaction
     is commited when exiting the `with` statement. No retry is applied in this 
     case; the retry needs to be manually implemented.
+    The columns of the extracted DataFrames are typed from the MySQL field
+    types: integers are `int64` (`Int64` if nullable), floats are `float64`,
+    and dates are `datetime64[us]` (`datetime64[ns]` before pandas 2).
+
+    Attributes
+    ----------
+    categorical_ratio : float or None
+        If set, string columns returned by `extract` whose ratio of unique
+        values is at most `categorical_ratio` are returned as categoricals.
+        Default None.
+    cache : <QueryCache> or None
+        If set, the results of the `extract` called with a `ttl` are cached.
+        Default None.
+    monitor : <QueryMonitor> or None
+        If set, the statistics of each `extract` and `modify` (including 
+        the statements of `insert_df`, and the streamed `extract_iter` and
+        `extract_to_parquet`) are recorded. Default None.
+    single_flight : <SingleFlight> or None
+        If set, the identical concurrent `extract` are coalesced. Default
+        None.
+    schemas : <SchemaCache>
+        Cache of the table schemas used by `insert_df`, with a ttl of 300
+        seconds by default.
+    trace : bool
+        If True, the full query (with its parameters replaced) and the full
+        extraction are logged at `DEBUG` level. Default False, as formatting
+        them is costly on large queries and results.
+    conversion : str
+        Conversion profile of the extracted values. 'python' (default):
+        `pymysql` converts each value into a Python object (`int`,
+        `datetime.datetime`, `decimal.Decimal`...) before the columns are
+        typed. 'fast': the integer, float, decimal and date columns are left
+        undecoded by `pymysql`, and parsed in bulk into `int64`, `float64`
+        and `datetime64` arrays, which is several times faster on large
+        results. Decimals become floats, and may lose precision. 
+        'fast_exact': same as 'fast', except that decimals are kept as exact
+        `decimal.Decimal` objects. The columns which cannot be parsed in
+        bulk (e.g. unsigned integers above 2**63, or zero dates, which are
+        kept as strings) are decoded by the `pymysql` converters, into the
+        same Python objects as with 'python'.
 
     Examples
     --------
@@ -157,6 +705,11 @@ class GrabMySQL():
     ...         sql.modify(query_insert, ((14, 23, 'a'), (1222, 2333, 'a')))
     >>> transaction(sql)     
 
+    Stream large results by chunk, with bounded memory
+
+    >>> for df in sql.extract_iter("SELECT * FROM disputes", chunksize=50000):
+    ...     df.to_csv('disputes.csv', mode='a', header=False)
+
     Some additional convenience functions
 
     >>> query = 'SELECT * FROM disputes WHERE country_id = %s'
@@ -167,7 +720,7 @@ class GrabMySQL():
     DEFAULT_SSL_PATH = os.path.join(
         pathlib.Path(__file__).parent.absolute(), 'ssl', 'Amazon RDS 2020.pem')
 
-    def __init__(self, db_params):
+    def __init__(self, db_params, ping_interval=0):
         """Instantiate a GrabMySQL object
 
         if `db_params` does not specified the SSL certificate or the specified
@@ -178,13 +731,74 @@ class GrabMySQL():
         ----------
         db_params : dict
             Connection parameters.
+        ping_interval : float, optional
+            Minimum idle time in seconds before the connection is pinged (and
+            reconnected if needed) prior to a query. Default 0: the connection
+            is pinged before every query.
         
         Returns
         -------
         <GrabMySQL> object.
 
+        """
+        self._db_params = db_params.copy()  # Avoid modification of arguments
+        self._con = self._connect(self._db_params)
+        self._auto_commit = True
+        self._ping_interval = ping_interval
+        self.categorical_ratio = None
+        self.cache = None
+        self.monitor = None
+        self.schemas = dbapi.SchemaCache()
+        self.single_flight = None
+        self.trace = False
+        self.conversion = 'python'
+        self._max_allowed_packet = None
+        self._attempts = 0
+        self._ran_on = self
+        self._created = self._last_used = time.monotonic()
+
+
+    @property
+    def conversion(self):
+        """Conversion profile of the extracted values, see `GrabMySQL`."""
+        return self._conversion
+
+
+    @conversion.setter
+    def conversion(self, conversion):
+        if conversion not in CONVERSIONS:
+            raise ValueError(f'`conversion` must be one of {CONVERSIONS}.')
+        # Read by `pymysql` for each result, and kept when reconnecting
+        self._con.decoders = _decoders(conversion)
+        self._kind_of = mysql_fast_kind if conversion == 'fast' else mysql_kind
+        self._skipped = _skipped_decoders(conversion)
+        self._conversion = conversion
+
+
+    @classmethod
+    def _connect(cls, db_params):
+        """Opens a new `pymysql` connection using `db_params`.
+
         """
         logging.info('Connecting to %s', db_params.get('host'))
+        db_params = cls._ssl_params(db_params)
+        try:
+            con = pymysql.connect(**db_params)
+        except SSLError:
+            ssl =  db_params.pop('ssl')
+            con = pymysql.connect(**db_params)
+            logging.info(
+                'Invalid SSL certificate %s. Connect without SSL', ssl)
+        logging.info('Connection opened successfully')
+        return con
+
+
+    @classmethod
+    def _ssl_params(cls, db_params):
+        """Returns a copy of `db_params` with a valid SSL certificate, or the
+        default one if any.
+
+        """
         valid_ssl_path = False
         db_params = db_params.copy()  # Avoid modification of arguments
         if 'ssl' in db_params:
@@ -197,34 +811,71 @@ class GrabMySQL():
                 logging.info(
                     'The provided SSL certificate is invalid. Trying default.')
         if not valid_ssl_path:
-            ca_path = self.__class__.DEFAULT_SSL_PATH
+            ca_path = cls.DEFAULT_SSL_PATH
             if os.path.isfile(ca_path):
                 logging.debug('Using default SSL certificate at %s', ca_path)
                 db_params['ssl'] = {'ca': ca_path}
             else:
                 logging.debug(
                     'Default SSL certificate at %s cannot be found.', ca_path)
-        try:
-            self._con = pymysql.connect(**db_params)
-        except SSLError:
-            ssl =  db_params.pop('ssl')
-            self._con = pymysql.connect(**db_params)
-            logging.info(
-                'Invalid SSL certificate %s. Connect without SSL', ssl)
-        self._auto_commit = True
-        logging.info('Connection opened successfully')
+        return db_params
+
+
+    @classmethod
+    def pool(cls, db_params, min_size=1, max_size=10, **kwargs):
+        """Creates a thread-safe pool of connections to the same database.
+
+        Parameters
+        ----------
+        db_params : dict
+            Connection parameters, shared by all the pooled connections.
+        min_size : int
+            Number of connections opened upfront and kept open.
+        max_size : int
+            Maximum number of connections opened at the same time.
+        **kwargs :
+            Additional keyword parameters passed to `GrabMySQLPool`.
+
+        Returns
+        -------
+        <GrabMySQLPool> object.
+
+        """
+        return GrabMySQLPool(
+            db_params, min_size=min_size, max_size=max_size, factory=cls,
+            **kwargs
+        )
+
+
+    def _ping(self):
+        """Pings the server if the connection has been idle long enough.
+
+        """
+        now = time.monotonic()
+        if now - self._last_used >= self._ping_interval:
+            self._con.ping()
+        self._last_used = now
 
 
     def __repr__(self):
         return f"GrabMySQL({{'host':{reprlib.repr(self._con.host)}, ...}})"
 
 
-    def extract(self, query, params=None):
+    def extract(self, query, params=None, ttl=None):
         """Runs a `SELECT` or `EXPLAIN` query and returns its result as a 
         DataFrame.
 
         If used outside a context manager, then query is automatically retried
         in case of SQL errors.
+        If a `QueryCache` is set as `cache` attribute and `ttl` is given,
+        then a result younger than `ttl` is read from the cache, or the query
+        is run and its result cached. The cache is opt-in for each query, as
+        queries with side effects or changing results (e.g. `GET_LOCK`,
+        `NOW()`) must not be cached. It is never used inside a context
+        manager (transaction mode).
+        If a `SingleFlight` is set as `single_flight` attribute, then the
+        identical queries run concurrently in auto-commit mode (e.g. from
+        threads sharing a `GrabMySQLPool`) are run only once.
 
         Parameters
         ----------
@@ -232,108 +883,958 @@ class GrabMySQL():
             The SQL `SELECT` or `EXPLAIN` query to run.
         params : tuple, list, or dict
             Parameters used with query.
+        ttl : float, optional
+            Maximum age in seconds of a cached result. None (default) or 0
+            bypasses the cache.
         
         Returns
         -------
         <pd.DataFrame>
         """
-
-        if self._auto_commit:
-            return mysql_retry(self._extract)(query=query, params=params)
-        else:
-            return self._extract(query=query, params=params)
+        return self._extract_with(query, params, ttl, self.single_flight)
 
 
-    def modify(self, query, params=None):
-        """Run an `INSERT`, `UPDATE` or `DELETE` query.
+    def _extract_with(self, query, params, ttl, single_flight):
+        """Same as `extract`, coalescing the identical queries with
+        `single_flight` (if not None).
 
-        If params is a list/tuple of dict/list/tuple, then the query is run
-        using `executemany`. Otherwise, it is run using `execute`.
-        If used outside a context manager, then query is automatically 
-        rolled-bakc and retried in case of SQL errors, and commited when run 
-        successfully.
+        """
+        cache = self.cache
+        if cache is None or not self._auto_commit or not ttl:
+            cache = key = None
+        else:
+            key = cache.key(self._identity(), self._mogrify(query, params))
+            df = cache.get(key, ttl)
+            if df is not None:
+                logging.info(
+                    '%s rows extracted from cache for %s', 
+                    len(df), query_repr(query)
+                )
+                return df
+
+        def run():
+            df = self._run('extract', self._extract, query, params)
+            if cache is not None:
+                cache.put(key, df)
+            return df
+
+        if single_flight is None or not self._auto_commit:
+            return run()
+        key = _flight_key(self._db_params, query, params)
+        return single_flight.do(key, run)
+
+
+    def extract_parallel(self, table_or_query, split_column, n_workers=4,
+                         params=None, n_shards=None, quantiles=False):
+        """Extracts a table or query by key ranges, concurrently on several
+        connections, and returns its result as a DataFrame.
+
+        The range of `split_column` is split into `n_shards` shards, either
+        of equal width between its MIN and MAX values, or (if 
+        `quantiles=True`) holding the same number of rows, which suits skewed
+        keys but costs an additional scan of the index (with `NTILE`, which
+        requires MySQL 8.0+). Each shard is extracted on its own connection
+        (opened with the same `db_params`) and retried with `mysql_retry`.
+        The shards are concatenated in key order, starting with the rows
+        where `split_column` is NULL.
+        As queries are wrapped in a derived table, `split_column` must be one
+        of their output columns, and should be indexed. The connections do
+        not see the uncommited changes of a running transaction.
 
         Parameters
         ----------
-        query : str
-            The SQL `INSERT`, `UPDATE` or `DELETE` query to run.
+        table_or_query : str
+            Name of the table to extract, or `SELECT` query.
+        split_column : str
+            Column used to split the extraction. Must be numeric or datetime,
+            unless `quantiles=True`.
+        n_workers : int
+            Number of concurrent connections.
         params : tuple, list, or dict
             Parameters used with query.
-        
+        n_shards : int, optional
+            Number of shards. Default to `n_workers`.
+        quantiles : bool
+            Whether to split by quantiles instead of equal width ranges.
+
         Returns
         -------
-        A 2-elements tuple with number of modified rows, and the id of the
-        first modified row.
+        <pd.DataFrame>
+
+        Examples
+        --------
+        >>> df = sql.extract_parallel('disputes', 'id', n_workers=8)
+        >>> df = sql.extract_parallel(
+        ...     "SELECT * FROM disputes WHERE country_id = %s", 'created', 
+        ...     n_workers=4, params=(2, ), quantiles=True)
 
         """
-        if self._auto_commit:
-            try:
-                res = mysql_retry(self._modify)(query=query, params=params)
-            except Exception as err:
-                logging.info(
-                    'Catching exception during modify', exc_info=True)
-                self._con.rollback()
-                raise err
-            else:
-                return res
+        n_shards = n_shards or n_workers
+        if len(table_or_query.split()) == 1:
+            source = table_or_query
         else:
-            logging.info('Using transaction mode')
-            return self._modify(query, params) 
-    
+            source = f'({table_or_query}) AS _source'
+        if quantiles:
+            bounds = self._quantile_bounds(
+                source, split_column, params, n_shards)
+        else:
+            bounds = self._range_bounds(source, split_column, params, n_shards)
+        named = isinstance(params, dict)
+        if named:
+            lo, hi = '%(_shard_lo)s', '%(_shard_hi)s'
+        else:
+            lo, hi = '%s', '%s'
+        base = f'SELECT * FROM {source} WHERE '
+        shards = [(base + f'{split_column} IS NULL', params)]
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            op = '<=' if i == len(bounds) - 2 else '<'
+            query = (
+                base + f'{split_column} >= {lo} AND {split_column} {op} {hi}')
+            if named:
+                shard_params = {**params, '_shard_lo': start, '_shard_hi': stop}
+            else:
+                shard_params = tuple(_as_tuple(params)) + (start, stop)
+            shards.append((query, shard_params))
+        logging.info(
+            'Extract %s in %s shards of %s with %s workers', 
+            _Lazy(query_repr, table_or_query), len(shards), split_column,
+            n_workers
+        )
+        pool = self._helper_pool(n_workers)
+        try:
+            with ThreadPoolExecutor(n_workers) as executor:
+                dfs = list(executor.map(lambda s: pool.extract(*s), shards))
+        finally:
+            pool.close()
+        df = pd.concat(dfs, ignore_index=True)
+        logging.info('%s rows extracted successfully', len(df))
+        return df
 
-    def __enter__(self):
-        """Enter auto-commit mode.
 
-        The transactions are automatically commited or rolled-back (in case of 
-        errors) when exiting the `with` statement. No retry is applied.
+    def _helper_pool(self, n_workers):
+        """Returns a pool of up to `n_workers` connections to the database to
+        read from, for the concurrent reads of `extract_parallel` and
+        `extract_in`.
 
         """
-        self._con.ping()
-        self._cursor = self._con.cursor()
-        self._auto_commit = False
-        return self
+        pool = GrabMySQLPool(self._read_params(), 0, n_workers)
+        pool.conversion = self.conversion
+        return pool
 
 
-    def __exit__(self, exception_type, exception_value, traceback):
-        """Exit auto-commit mode.
+    def _read_params(self):
+        """Returns the connection parameters of the database to read from."""
+        return self._db_params
 
-        The transactions are either rolled-back or commited.
-        """
-        self._auto_commit = True
-        if traceback:
-            self._con.rollback()
+
+    def _range_bounds(self, source, split_column, params, n_shards):
+        """Returns the bounds of `n_shards` equal width key ranges."""
+        query = f'SELECT MIN({split_column}), MAX({split_column}) FROM {source}'
+        lo, hi = (_as_python(v) for v in self.extract(query, params).iloc[0])
+        if lo is None:
+            return []
+        if isinstance(lo, int) and isinstance(hi, int):
+            bounds = [lo + (hi - lo) * i // n_shards for i in range(n_shards)]
         else:
-            self._con.commit()
+            bounds = [lo + (hi - lo) * i / n_shards for i in range(n_shards)]
+        return _unique_bounds(bounds + [hi])
 
 
-    def _extract(self, query, params=None):
-        if query_type(query) not in ('SELECT', 'EXPLAIN'):
+    def _quantile_bounds(self, source, split_column, params, n_shards):
+        """Returns the bounds of `n_shards` key ranges with the same number of
+        rows.
+
+        """
+        # A single scan of the index: the first key of each tile, and the last
+        query = (
+            f'SELECT MIN(k), MAX(k) FROM (SELECT {split_column} AS k, '
+            f'NTILE({int(n_shards)}) OVER (ORDER BY {split_column}) AS tile '
+            f'FROM {source} WHERE {split_column} IS NOT NULL) AS _tiles '
+            f'GROUP BY tile ORDER BY tile'
+        )
+        df = self.extract(query, params)
+        if len(df) == 0:
+            return []
+        bounds = list(df.iloc[:, 0]) + [df.iloc[-1, 1]]
+        return _unique_bounds([_as_python(v) for v in bounds])
+
+
+    def extract_pages(self, query, key_columns, page_size=10000, params=None,
+                      start_after=None):
+        """Runs a `SELECT` query (or reads a table) by pages, using keyset
+        pagination, and yields the pages lazily.
+
+        Each page is a query selecting the `page_size` rows following the key
+        of the last row of the previous page, ordered by `key_columns`.
+        Unlike `LIMIT ... OFFSET`, the server does not read the rows of the
+        previous pages, so the time per page does not depend on its depth,
+        provided that the key is indexed. The key must be unique and not
+        null, and its columns must be among the output columns of `query`.
+        A query is wrapped in a derived table, which MySQL merges into the
+        page query when possible (no `GROUP BY`, `DISTINCT`, `LIMIT`...).
+        Each page is a separate `extract`, so pages can be consumed slowly
+        and the extraction resumed from the last yielded key.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `SELECT` query to run, or the name of a table.
+        key_columns : str or list of str
+            The columns of the unique key ordering the rows.
+        page_size : int
+            Maximum number of rows per page. Default 10000.
+        params : tuple, list, or dict
+            Parameters used with query.
+        start_after : value or tuple, optional
+            Key (a tuple for a multi-columns key) after which to start, such
+            as the last key yielded by a previous run. None (default) starts
+            from the beginning.
+
+        Returns
+        -------
+        Generator of (<pd.DataFrame>, tuple) with each page and the key of
+        its last row.
+
+        Examples
+        --------
+        >>> for df, last_key in sql.extract_pages(
+        ...         'disputes', ['country_id', 'id'], page_size=50000):
+        ...     df.to_csv('disputes.csv', mode='a', header=False)
+        ...     save_progress(last_key)
+        >>> pages = sql.extract_pages(
+        ...     'disputes', ['country_id', 'id'], start_after=(2, 12345))
+
+        """
+        if isinstance(key_columns, str):
+            key_columns = [key_columns]
+        if len(query.split()) == 1:
+            source = query
+        else:
+            source = f'({query}) AS _pages'
+        named = isinstance(params, dict)
+        condition, indices = _keyset_condition(key_columns, named)
+        order = ', '.join(key_columns)
+        last_key = None
+        if start_after is not None:
+            last_key = _as_tuple(start_after)
+            if len(last_key) != len(key_columns):
+                raise ValueError(
+                    '`start_after` must have one value per key column.')
+        npages = nrows = 0
+        while True:
+            where, page_params = '', params
+            if last_key is not None:
+                where = f' WHERE {condition}'
+                if named:
+                    page_params = {**params, **{
+                        f'_after_{i}': v for i, v in enumerate(last_key)}}
+                else:
+                    page_params = _as_tuple(params) + tuple(
+                        last_key[i] for i in indices)
+            df = self.extract(
+                f'SELECT * FROM {source}{where} ORDER BY {order} '
+                f'LIMIT {int(page_size)}',
+                page_params
+            )
+            if len(df) == 0:
+                return
+            last_key = tuple(_as_python(df[c].iloc[-1]) for c in key_columns)
+            npages += 1
+            nrows += len(df)
             logging.info(
-                'The query %s is not a SELECT or EXPLAIN query', 
-                query_repr(query)
+                'Page %s: %s rows extracted so far, up to %s', npages, nrows,
+                last_key
             )
-            raise ValueError('`query` must be a SELECT or EXPLAIN query.')
+            yield df, last_key
+            if len(df) < page_size:
+                return
+
+
+    def extract_in(self, query_template, column, values, params=None,
+                   strategy='auto', chunk_size=1000, n_workers=4,
+                   temp_table_threshold=20000, key_type=None):
+        """Extracts the rows whose `column` is in a (large) list of values,
+        and returns them as a single DataFrame.
+
+        The `{in}` marker of `query_template` is replaced by the condition on
+        `column`, e.g. `"SELECT * FROM disputes WHERE {in} AND country_id =
+        %s"`. The values are de-duplicated (NULL values, which never match,
+        are dropped), so that each row is extracted once. Then:
+
+        - `strategy='chunks'` splits them into chunks of `chunk_size` values
+          (with `utils.chunks`), each extracted with `column IN %s` on its own
+          pooled connection, `n_workers` at a time. The connections do not see
+          the uncommited changes of a running transaction: in transaction
+          mode, the chunks are extracted one after another on this connection.
+        - `strategy='temp_table'` inserts the values into a session temporary
+          table, and extracts with `column IN (SELECT v FROM ...)`, so that
+          the server joins them with the index of `column`. This runs in a
+          single transaction, retried with `mysql_retry` in auto-commit mode.
+        - `strategy='auto'` (default) uses the temporary table from
+          `temp_table_threshold` distinct values, and chunks otherwise.
+
+        Parameters
+        ----------
+        query_template : str
+            The SQL `SELECT` query to run, with a `{in}` marker.
+        column : str
+            The column (or expression) matched against `values`.
+        values : list-like
+            The values of `column` to extract.
+        params : tuple, list, or dict
+            Other parameters used with query.
+        strategy : str
+            'auto' (default), 'chunks' or 'temp_table'.
+        chunk_size : int
+            Number of values per chunk. Default 1000.
+        n_workers : int
+            Number of chunks extracted concurrently. Default 4.
+        temp_table_threshold : int
+            Number of distinct values from which `strategy='auto'` uses a
+            temporary table. Default 20000.
+        key_type : str, optional
+            SQL type of the temporary table column, e.g. `'VARCHAR(20) COLLATE
+            utf8mb4_unicode_ci'` to match the collation of `column`. Default
+            inferred from the values.
+
+        Returns
+        -------
+        <pd.DataFrame>
+
+        """
+        if IN_MARKER not in query_template:
+            raise ValueError(
+                f'`query_template` must have a {IN_MARKER} marker.')
+        if strategy not in ('auto', 'chunks', 'temp_table'):
+            raise ValueError(
+                "`strategy` must be 'auto', 'chunks' or 'temp_table'.")
+        # As objects, the integer keys are not cast to float by the nulls
+        values = pd.Series(values, dtype=object).dropna()
+        keys = [_as_python(v) for v in pd.unique(values)]
+        if not keys:
+            return self.extract(
+                query_template.replace(IN_MARKER, 'FALSE'), params)
+        if strategy == 'auto':
+            strategy = 'chunks'
+            if len(keys) >= temp_table_threshold:
+                strategy = 'temp_table'
         logging.info(
-            'Extract data using %s with parameters %s', 
-            query_repr(query), query_repr(params)
+            'Extract %s values of %s with %s using %s', len(keys), column,
+            strategy, _Lazy(query_repr, query_template)
         )
-        logging.debug('Full query: %s', self.query(query, params))
-        if self._auto_commit:
-            self._con.ping()
-            cursor = self._con.cursor()
+        if strategy == 'temp_table':
+            df = self._extract_in_table(
+                query_template, column, keys, params, key_type)
         else:
-            cursor = self._cursor
-        cursor.execute(query, params)
-        data = cursor.fetchall()
-        clmns = [d[0] for d in cursor.description]
-        df = pd.DataFrame(list(data), columns=clmns)
+            df = self._extract_in_chunks(
+                query_template, column, keys, params, chunk_size, n_workers)
         logging.info('%s rows extracted successfully', len(df))
-        logging.debug('Full extraction: %s', df)
         return df
 
 
-    def _modify(self, query, params=None):
-        if query_type(query) not in ('INSERT', 'UPDATE', 'DELETE'):
+    def _extract_in_chunks(self, query_template, column, keys, params,
+                           chunk_size, n_workers):
+        """Extracts the rows of each chunk of keys with `column IN %s`."""
+        if isinstance(params, dict):
+            query = query_template.replace(IN_MARKER, f'{column} IN %(_in)s')
+            chunk_params = [
+                {**params, '_in': tuple(chunk)} 
+                for chunk in chunks(keys, chunk_size)
+            ]
+        else:
+            query = query_template.replace(IN_MARKER, f'{column} IN %s')
+            # Position of the IN list among the positional parameters
+            params = _as_tuple(params)
+            i = query_template.split(IN_MARKER, 1)[0].count('%s')
+            chunk_params = [
+                params[:i] + (tuple(chunk), ) + params[i:]
+                for chunk in chunks(keys, chunk_size)
+            ]
+        if len(chunk_params) == 1 or not self._auto_commit:
+            dfs = [self.extract(query, p) for p in chunk_params]
+        else:
+            n_workers = min(n_workers, len(chunk_params))
+            pool = self._helper_pool(n_workers)
+            try:
+                with ThreadPoolExecutor(n_workers) as executor:
+                    dfs = list(executor.map(
+                        lambda p: pool.extract(query, p), chunk_params))
+            finally:
+                pool.close()
+        return pd.concat(dfs, ignore_index=True)
+
+
+    def _extract_in_table(self, query_template, column, keys, params,
+                          key_type):
+        """Extracts the rows joined with the keys inserted into a temporary
+        table.
+
+        """
+        table = '_extract_in'
+        key_type = key_type or _sql_type(keys)
+        query = query_template.replace(
+            IN_MARKER, f'{column} IN (SELECT v FROM {table})')
+        keys = pd.DataFrame({'v': keys})
+
+        def run():
+            self._execute_statements([
+                f'DROP TEMPORARY TABLE IF EXISTS {table}',
+                f'CREATE TEMPORARY TABLE {table} '
+                f'(v {key_type} NOT NULL PRIMARY KEY)'
+            ])
+            self.insert_df(keys, table)
+            df = self.extract(query, params)
+            self._execute_statements([f'DROP TEMPORARY TABLE {table}'])
+            return df
+
+        if not self._auto_commit:
+            return run()
+
+        @mysql_retry
+        def transaction():
+            with self:
+                return run()
+
+        return transaction()
+
+
+    def extract_iter(self, query, params=None, chunksize=10000, 
+                     errors='ignore'):
+        """Runs a `SELECT` or `EXPLAIN` query and yields its result as 
+        DataFrames of at most `chunksize` rows.
+
+        The rows are streamed from the server using an unbuffered cursor
+        (`pymysql.cursors.SSCursor`), so that only one chunk is held in memory
+        at a time. The column dtypes are derived from the cursor description
+        (strings are never categorical), so that they are the same in all the
+        chunks, except where a column holds values which cannot be converted
+        (e.g. zero dates, or unsigned integers above 2**63): by default, it
+        is an object column in these chunks only, as in `extract`. With
+        `errors='coerce'`, these values are replaced by nulls instead, and
+        the dtypes are stable across chunks. No DataFrame is yielded if the
+        query returns no rows.
+        If used outside a context manager, then the query execution is 
+        automatically retried in case of SQL errors. Errors raised while
+        streaming are not retried, as rows would be yielded twice.
+        The connection cannot run other queries until the generator is 
+        exhausted or closed.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `SELECT` or `EXPLAIN` query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+        chunksize : int
+            Maximum number of rows per DataFrame.
+        errors : str {'ignore', 'coerce'}
+            If 'ignore' (default), then the columns with values which cannot
+            be converted are object columns in the chunks holding them. If
+            'coerce', then these values are replaced by nulls (a 
+            `ValueError` is raised for integer columns which are not
+            nullable).
+        
+        Returns
+        -------
+        Generator of <pd.DataFrame>.
+
+        """
+        monitor = self.monitor
+        start = time.perf_counter()
+        cursor = self._retried(self._execute_unbuffered, query, params)
+        try:
+            nrows = nbytes = 0
+            while True:
+                data = cursor.fetchmany(chunksize)
+                if not data:
+                    break
+                nrows += len(data)
+                df = dbapi.build_frame(
+                    data, cursor.description, self._kind_of, 
+                    decoders=self._skipped, errors=errors
+                )
+                if monitor is not None:
+                    nbytes += int(
+                        df.memory_usage(index=False, deep=True).sum())
+                logging.debug('%s rows extracted so far', nrows)
+                yield df
+            logging.info('%s rows extracted successfully', nrows)
+        finally:
+            cursor.close()
+        if monitor is not None:
+            self._record(
+                'extract', query, params, time.perf_counter() - start, nrows,
+                nbytes
+            )
+
+
+    def extract_to_parquet(self, query, params, path, row_group_size=100000):
+        """Runs a `SELECT` query and writes its result into a Parquet file.
+
+        The rows are streamed from the server using an unbuffered cursor, and
+        written by row groups of `row_group_size` rows: the memory used is
+        bounded by one row group instead of the whole result. Requires 
+        `pyarrow`. The retries are the same as `extract_iter`.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `SELECT` or `EXPLAIN` query to run.
+        params : tuple, list, or dict
+            Parameters used with query.
+        path : str or file-like object
+            Path to the Parquet file, or writable binary file-like object, 
+            such as `GrabS3.open_upload`.
+        row_group_size : int
+            Number of rows per row group. Default 100000.
+
+        Returns
+        -------
+        A 2-elements tuple with the number of rows and the size of the file in
+        bytes.
+
+        """
+        start = time.perf_counter()
+        cursor = self._retried(self._execute_unbuffered, query, params)
+        try:
+            nrows, nbytes = dbapi.write_parquet(
+                cursor.fetchmany, cursor.description, self._kind_of, path,
+                row_group_size, self._skipped
+            )
+        finally:
+            cursor.close()
+        if self.monitor is not None:
+            self._record(
+                'extract', query, params, time.perf_counter() - start, nrows,
+                nbytes
+            )
+        logging.info(
+            '%s rows written successfully (%s bytes)', nrows, nbytes)
+        return nrows, nbytes
+
+
+    def modify(self, query, params=None):
+        """Run an `INSERT`, `UPDATE` or `DELETE` query.
+
+        If params is a list/tuple of dict/list/tuple, then the query is run
+        using `executemany`. Otherwise, it is run using `execute`.
+        If params is an iterator of such lists (e.g. from `iter_prepared`), 
+        then the query is run with `executemany` for each batch; in 
+        auto-commit mode, each batch is commited (or retried) separately.
+        If used outside a context manager, then query is automatically 
+        rolled-bakc and retried in case of SQL errors, and commited when run 
+        successfully.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `INSERT`, `UPDATE` or `DELETE` query to run.
+        params : tuple, list, dict, or iterator of list
+            Parameters used with query.
+        
+        Returns
+        -------
+        A 2-elements tuple with number of modified rows, and the id of the
+        first modified row.
+
+        """
+        if isinstance(params, Iterator):
+            return self._modify_batches(query, params)
+        if self._auto_commit:
+            try:
+                res = self._run('modify', self._modify, query, params)
+            except Exception as err:
+                logging.info(
+                    'Catching exception during modify', exc_info=True)
+                self._con.rollback()
+                raise err
+            else:
+                return res
+        else:
+            logging.info('Using transaction mode')
+            return self._run('modify', self._modify, query, params)
+
+
+    def _run(self, kind, fn, query, params):
+        """Runs `fn` (`_extract` or `_modify`), retried with `mysql_retry` in
+        auto-commit mode, and records its statistics if a `monitor` is set.
+
+        """
+        if self.monitor is None:
+            return self._retried(fn, query, params)
+        start = time.perf_counter()
+        res = self._retried(fn, query, params)
+        wall_time = time.perf_counter() - start
+        if kind == 'extract':
+            rows = len(res)
+            nbytes = int(res.memory_usage(index=False, deep=True).sum())
+        else:
+            rows = res[0]
+            nbytes = _approx_params_bytes(params)
+        self._record(kind, query, params, wall_time, rows, nbytes)
+        return res
+
+
+    def _retried(self, fn, *args):
+        """Returns `fn(*args)`, retried with `mysql_retry` in auto-commit
+        mode. The number of attempts is kept in `_attempts`. After a failed
+        attempt, the connection is pinged (and reconnected) before the next
+        one, however recently it was used.
+
+        """
+        self._attempts = 0
+
+        def attempt():
+            self._attempts += 1
+            self._ran_on = self  # Replaced by the replica which ran it
+            try:
+                return fn(*args)
+            except MYSQL_ERRORS:
+                self._ran_on._last_used = float('-inf')
+                raise
+
+        if self._auto_commit:
+            return mysql_retry(attempt)()
+        return attempt()
+
+
+    def _record(self, kind, query, params, wall_time, rows, nbytes):
+        """Records the statistics of the last query run by `_retried` into
+        the `monitor`. The server time and the `EXPLAIN` of a slow query are
+        read on the connection which ran the query.
+
+        """
+        monitor, ran_on = self.monitor, self._ran_on
+        server_time = None
+        if monitor.server_timing:
+            server_time = ran_on._server_time()
+        record = dbapi.QueryRecord(
+            dbapi.fingerprint(query), kind, wall_time, server_time, rows, 
+            nbytes + len(query), self._attempts - 1, time.time()
+        )
+        explain = None
+        if monitor.is_slow(wall_time):
+            explain = ran_on._explain_quietly(query, params)
+        monitor.record(record, query, explain)
+
+
+    def _server_time(self):
+        """Returns the server time in seconds of the last statement of the
+        session, from `performance_schema`, or None if not available.
+
+        """
+        try:
+            cursor = self._con.cursor()
+            cursor.execute(
+                'SELECT TIMER_WAIT / 1e12 '
+                'FROM performance_schema.events_statements_history '
+                'WHERE THREAD_ID = PS_CURRENT_THREAD_ID() '
+                'ORDER BY EVENT_ID DESC LIMIT 1'
+            )
+            row = cursor.fetchone()
+        except pymysql.err.MySQLError:
+            logging.debug('Server time not available', exc_info=True)
+            return None
+        return float(row[0]) if row else None
+
+
+    def _explain_quietly(self, query, params):
+        """Returns the `EXPLAIN` of a query, or None if it fails.
+
+        """
+        if isinstance(params, (list, tuple)) and params:
+            if isinstance(params[0], (dict, list, tuple)):
+                params = params[0]  # Explain the first row of executemany
+        try:
+            cursor = self._con.cursor()
+            cursor.execute('EXPLAIN ' + query, params)
+            return dbapi.build_frame(
+                cursor.fetchall(), cursor.description, self._kind_of,
+                decoders=self._skipped
+            )
+        except Exception:
+            logging.debug('Cannot explain slow query', exc_info=True)
+            return None
+    
+
+    def modify_batched(self, query, key_column, batch_size=1000, 
+                       sleep_between=0, params=None, start_after=None,
+                       target_time=0.5, replicas=None, max_lag=None,
+                       progress=None):
+        """Runs a large `UPDATE` or `DELETE` query by ranges of the primary
+        key, each range in its own short transaction.
+
+        The table is walked along `key_column` (its primary key, or any
+        unique indexed column) in ranges of `batch_size` rows, and the query
+        is run on each range with the condition `key_column > lo AND 
+        key_column <= hi` added to its `WHERE` clause. Each range is commited
+        separately (and retried with `mysql_retry`), so that the locks are
+        held briefly and the replicas can keep up.
+        If `target_time` is set, then the batch size is adapted after each
+        range so that each transaction lasts about `target_time` seconds
+        (between 1/100 and 10 times the initial `batch_size`). If `max_lag`
+        is set, then the replication lag of `replicas` is checked after each
+        range, and the next range waits until it is below `max_lag`, with a
+        halved batch size.
+        The query must be a single-table `UPDATE` or `DELETE`, without
+        `ORDER BY` or `LIMIT`. The progress is logged after each range, and
+        the run can be resumed with `start_after` from the last key reported.
+
+        Parameters
+        ----------
+        query : str
+            The SQL `UPDATE` or `DELETE` query to run.
+        key_column : str
+            The unique column ordering the ranges, typically the primary key.
+        batch_size : int
+            Initial number of rows of the table per range. Default 1000.
+        sleep_between : float
+            Time in seconds to sleep between two ranges. Default 0.
+        params : tuple, list, or dict
+            Parameters used with query.
+        start_after : value, optional
+            Key after which to start (e.g. the last key of an interrupted
+            run). None (default) starts from the beginning.
+        target_time : float, optional
+            Target duration in seconds of each range transaction. Default 
+            0.5. None keeps `batch_size` constant.
+        replicas : list of <GrabMySQL>, optional
+            Replicas whose lag is checked. Default to the `replicas` of a
+            `GrabMySQLRouter`, none otherwise.
+        max_lag : float, optional
+            Maximum replication lag in seconds before pausing. None (default)
+            never checks the lag.
+        progress : callable, optional
+            Function called after each range with a dict with the `batch`
+            number, its `rows` and `batch_size`, the `last_key` completed,
+            the `total_rows` modified so far, and the `elapsed` time.
+
+        Returns
+        -------
+        A 2-elements tuple with the number of modified rows, and the last
+        key completed.
+
+        """
+        if not self._auto_commit:
+            raise RuntimeError(
+                '`modify_batched` cannot be used in transaction mode.')
+        table, head, condition = _split_dml(query)
+        named = isinstance(params, dict)
+        lo_ph, hi_ph = ('%(_lo)s', '%(_hi)s') if named else ('%s', '%s')
+        if replicas is None:
+            replicas = getattr(self, 'replicas', [])
+        min_size, max_size = max(1, batch_size // 100), batch_size * 10
+        last_key, total, batch, start = start_after, 0, 0, time.monotonic()
+        while True:
+            with self.primary():
+                hi = self._range_end(table, key_column, last_key, batch_size)
+            if hi is None:
+                break
+            where = f'{key_column} <= {hi_ph}'
+            range_params = [hi]
+            if last_key is not None:
+                where = f'{key_column} > {lo_ph} AND ' + where
+                range_params.insert(0, last_key)
+            if condition:
+                where = f'({condition}) AND {where}'
+            if named:
+                range_params = {**params, **dict(zip(
+                    ('_lo', '_hi') if last_key is not None else ('_hi', ),
+                    range_params))}
+            else:
+                range_params = _as_tuple(params) + tuple(range_params)
+            t0 = time.perf_counter()
+            nrows, _ = self.modify(f'{head} WHERE {where}', range_params)
+            elapsed = time.perf_counter() - t0
+            total += nrows
+            batch += 1
+            last_key = hi
+            state = {
+                'batch': batch, 'rows': nrows, 'batch_size': batch_size,
+                'last_key': last_key, 'total_rows': total, 
+                'elapsed': time.monotonic() - start
+            }
+            logging.info(
+                'Batch %s: %s rows modified up to %s=%s (%s in total)', batch,
+                nrows, key_column, last_key, total
+            )
+            if progress is not None:
+                progress(state)
+            if target_time:
+                ratio = min(2, max(0.5, target_time / max(elapsed, 1e-3)))
+                batch_size = min(
+                    max_size, max(min_size, int(batch_size * ratio)))
+            if max_lag is not None and replicas:
+                batch_size = self._wait_replicas(
+                    replicas, max_lag, batch_size, min_size)
+            if sleep_between:
+                time.sleep(sleep_between)
+        logging.info('%s rows modified in %s batches', total, batch)
+        return total, last_key
+
+
+    def _range_end(self, table, key_column, last_key, batch_size):
+        """Returns the key ending the range of `batch_size` rows after
+        `last_key`, or None if there is no row after it.
+
+        """
+        where, params = '', None
+        if last_key is not None:
+            where, params = f' WHERE {key_column} > %s', (last_key, )
+        df = self.extract(
+            f'SELECT {key_column} FROM {table}{where} ORDER BY {key_column} '
+            f'LIMIT 1 OFFSET {int(batch_size) - 1}', params, ttl=0
+        )
+        if len(df) == 0:  # Last range: up to the maximum key
+            df = self.extract(
+                f'SELECT MAX({key_column}) FROM {table}{where}', params, ttl=0)
+        return _as_python(df.iloc[0, 0])
+
+
+    def _wait_replicas(self, replicas, max_lag, batch_size, min_size):
+        """Waits until the replication lag is below `max_lag` and returns 
+        the batch size, halved if the replicas lagged behind.
+
+        """
+        while True:
+            lags = [replica.replication_lag() for replica in replicas]
+            if None in lags:
+                logging.warning('Replication stopped: lag not checked.')
+            lag = max([lag for lag in lags if lag is not None], default=0)
+            if lag <= max_lag:
+                return batch_size
+            batch_size = max(min_size, batch_size // 2)
+            logging.info(
+                'Replication lag of %s seconds: pausing, batch size reduced '
+                'to %s', lag, batch_size
+            )
+            time.sleep(1)
+
+
+    def replication_lag(self):
+        """Returns the replication lag in seconds of the database.
+
+        Returns
+        -------
+        `Seconds_Behind_Master` of `SHOW SLAVE STATUS` (which requires the
+        `REPLICATION CLIENT` privilege): 0 if the database is not a replica,
+        None if its replication is stopped.
+
+        """
+        self._ping()
+        cursor = self._con.cursor(pymysql.cursors.DictCursor)
+        cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            # Not configured as a replica (e.g. managed reader): no lag
+            return 0
+        lag = row['Seconds_Behind_Master']
+        # Not decoded by `pymysql` with the `fast` conversion profiles
+        return None if lag is None else int(lag)
+
+
+    @contextlib.contextmanager
+    def primary(self):
+        """Context manager sending all the queries to the primary. A GrabMySQL
+        is only connected to its primary: see `GrabMySQLRouter`.
+
+        """
+        yield self
+
+
+    def _modify_batches(self, query, batches):
+        nrows, first_row_id = 0, None
+        for batch in batches:
+            if not batch:
+                continue
+            res = self.modify(query, batch)
+            nrows += res[0]
+            if first_row_id is None:
+                first_row_id = res[1]
+        return nrows, first_row_id
+
+
+    def __enter__(self):
+        """Enter auto-commit mode.
+
+        The transactions are automatically commited or rolled-back (in case of 
+        errors) when exiting the `with` statement. No retry is applied.
+
+        """
+        self._ping()
+        self._cursor = self._con.cursor()
+        self._auto_commit = False
+        return self
+
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """Exit auto-commit mode.
+
+        The transactions are either rolled-back or commited.
+        """
+        self._auto_commit = True
+        self._last_used = time.monotonic()
+        if traceback:
+            self._con.rollback()
+        else:
+            self._con.commit()
+
+
+    def _extract(self, query, params=None):
+        if query_type(query) not in ('SELECT', 'EXPLAIN'):
+            logging.info(
+                'The query %s is not a SELECT or EXPLAIN query', 
+                query_repr(query)
+            )
+            raise ValueError('`query` must be a SELECT or EXPLAIN query.')
+        logging.info(
+            'Extract data using %s with parameters %s', 
+            _Lazy(query_repr, query), _Lazy(query_repr, params)
+        )
+        if self.trace and logging.root.isEnabledFor(logging.DEBUG):
+            # Mogrified locally: `self.query` would ping the server
+            logging.debug('Full query: %s', _Lazy(self._mogrify, query, params))
+        if self._auto_commit:
+            self._ping()
+            cursor = self._con.cursor()
+        else:
+            cursor = self._cursor
+        cursor.execute(query, params)
+        data = cursor.fetchall()
+        df = dbapi.build_frame(
+            data, cursor.description, self._kind_of, 
+            self.categorical_ratio, self._skipped
+        )
+        logging.info('%s rows extracted successfully', len(df))
+        if self.trace:
+            logging.debug('Full extraction: %s', df)
+        return df
+
+
+    def _execute_unbuffered(self, query, params=None):
+        if query_type(query) not in ('SELECT', 'EXPLAIN'):
+            logging.info(
+                'The query %s is not a SELECT or EXPLAIN query', 
+                query_repr(query)
+            )
+            raise ValueError('`query` must be a SELECT or EXPLAIN query.')
+        logging.info(
+            'Stream data using %s with parameters %s', 
+            _Lazy(query_repr, query), _Lazy(query_repr, params)
+        )
+        if self._auto_commit:
+            self._ping()
+        cursor = self._con.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(query, params)
+        except Exception:
+            cursor.close()
+            raise
+        return cursor
+
+
+    def _modify(self, query, params=None):
+        if query_type(query) not in ('INSERT', 'UPDATE', 'DELETE'):
             logging.info(
                 'The query %s is not a INSERT, UPDATE or DELETE query', 
                 query_repr(query)
@@ -346,9 +1847,9 @@ class GrabMySQL():
                 many = True
         logging.info(
             'Run modifier query %s with parameters %s',
-            query_repr(query), query_repr(params))
+            _Lazy(query_repr, query), _Lazy(query_repr, params))
         if self._auto_commit:
-            self._con.ping()
+            self._ping()
             cursor = self._con.cursor()
         else:
             cursor = self._cursor
@@ -365,137 +1866,955 @@ class GrabMySQL():
         return nrows, first_row_id
 
 
-    def insert_df(self, df, table_name, on_dupl_update_clmns=None):
-        """Insert a DataFrame into a table.
+    def insert_df(self, df, table_name, on_dupl_update_clmns=None, 
+                  batch_size=None, load_data=False, typed=False,
+                  drop_unknown=False):
+        """Insert a DataFrame into a table.
+
+        The column names of the DataFrame and table must match. As the SQL
+        query is created from the DataFrame columns and table_name it is not
+        safe from SQL query injection. It is the responsabilty of the user to
+        make sure the query is safe.
+        The rows are sent as multi-row `INSERT ... VALUES` statements, each
+        one as large as allowed by the server `max_allowed_packet`. If
+        `batch_size` is set, then the rows are commited by batch of
+        `batch_size` rows, each batch being retried independently. Otherwise,
+        all the rows are commited at once. In transaction mode, nothing is
+        commited before exiting the `with` statement.
+        If `load_data=True`, then the rows are written to a temporary file
+        which is loaded with `LOAD DATA LOCAL INFILE`. This is the fastest
+        method, but the connection must be opened with `local_infile=True`
+        in `db_params` (and allowed by the server), and `batch_size` is 
+        ignored. The rows are loaded into a temporary table first, so that
+        duplicate keys raise an error (or are updated) as with `INSERT`.
+        If `typed=True`, then the DataFrame columns are checked against the
+        table schema (see `table_schema`) before anything is sent: unknown
+        columns are dropped or rejected, and the columns are cast to the
+        table column types (e.g. strings of digits to integers, strings to
+        dates). A `ValueError` is raised if a column cannot be cast, or if
+        strings are longer than the column maximum length.
+        The insert throughput (rows/s) is logged.
+
+        Parameters
+        ----------
+        df : <pd.DataFrame>
+            The DataFrame to insert.
+        table_name : str
+            The name of the table. The column names must match the DataFrame
+            column names.
+        on_dupl_update_clmns : iterable
+            The list of columns to update in case of duplicated key. If None, 
+            then no columns are updated (and an error is raised in case of 
+            duplicated keys.).
+        batch_size : int or 'auto', optional
+            Number of rows commited at once. None (default) commits all the
+            rows at once. With 'auto', each batch holds the number of rows
+            fitting in a single statement, estimated from the row width.
+        load_data : bool
+            Whether to use `LOAD DATA LOCAL INFILE`. Default False.
+        typed : bool
+            Whether to cast the columns to the table schema. Default False.
+        drop_unknown : bool
+            With `typed=True`, whether to drop the columns which are not in
+            the table. Default False: a `ValueError` is raised.
+        
+        Returns
+        -------
+        A 2-elements tuple as returned by `GrabMySQL.modify`.
+
+        """
+        if len(df) == 0:
+            logging.info(
+                'Inserting dataframe into %s. Nothing to insert.', table_name
+            )
+            return (0, 0)
+
+        if typed or batch_size == 'auto':
+            schema = self.table_schema(table_name)
+            if typed:
+                df = self._cast_to_schema(df, table_name, schema, drop_unknown)
+            if batch_size == 'auto':
+                width = _row_width(df, schema)
+                batch_size = max(
+                    1, (self.max_allowed_packet() - PACKET_MARGIN) // width)
+                logging.debug(
+                    'Rows of about %s bytes: batches of %s rows', width, 
+                    batch_size
+                )
+        clmns = ','.join(list(df.columns))
+        update = on_dupl_update(on_dupl_update_clmns)
+        logging.info(
+            'Inserting %s rows into %s (load_data=%s)', 
+            len(df), table_name, load_data
+        )
+        start = time.perf_counter()
+        if load_data:
+            res = self._load_data(df, table_name, clmns, update)
+        else:
+            res = self._insert_values(
+                df, table_name, clmns, update, batch_size)
+        elapsed = time.perf_counter() - start
+        logging.info(
+            '%s rows inserted into %s in %.2fs (%.0f rows/s)',
+            len(df), table_name, elapsed, len(df) / max(elapsed, 1e-9)
+        )
+        return res
+
+
+    def table_schema(self, table_name):
+        """Returns the columns of a table, from `information_schema.COLUMNS`.
+
+        The schema is queried once per table, and then read from the
+        `schemas` cache until its ttl expires. 
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the table, possibly prefixed by the database name.
+
+        Returns
+        -------
+        <pd.DataFrame> indexed by column name, ordered by position, with the
+        columns `data_type`, `column_type`, `nullable`, `max_length`,
+        `precision` and `scale`. Must not be modified.
+
+        """
+        return self.schemas.get(
+            (self._identity(), table_name), 
+            lambda: self._load_schema(table_name)
+        )
+
+
+    def _load_schema(self, table_name):
+        db, _, table = table_name.replace('`', '').rpartition('.')
+        df = self.extract(
+            'SELECT COLUMN_NAME AS name, DATA_TYPE AS data_type, '
+            'COLUMN_TYPE AS column_type, IS_NULLABLE = \'YES\' AS nullable, '
+            'CHARACTER_MAXIMUM_LENGTH AS max_length, '
+            'NUMERIC_PRECISION AS `precision`, NUMERIC_SCALE AS scale '
+            'FROM information_schema.COLUMNS '
+            'WHERE TABLE_SCHEMA = COALESCE(%s, DATABASE()) '
+            'AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION',
+            (db or None, table), ttl=0
+        )
+        if len(df) == 0:
+            raise ValueError(f'Table {table_name} not found.')
+        df['data_type'] = df['data_type'].str.lower()
+        return df.set_index('name')
+
+
+    def _cast_to_schema(self, df, table_name, schema, drop_unknown):
+        """Returns `df` with its columns cast to the table schema.
+
+        """
+        # MySQL column names are case-insensitive
+        names = {name.lower(): name for name in schema.index}
+        unknown = [c for c in df.columns if str(c).lower() not in names]
+        if unknown and not drop_unknown:
+            raise ValueError(
+                f'Columns {unknown} are not in the table {table_name}.')
+        if unknown:
+            logging.info('Dropping unknown columns %s', unknown)
+            df = df.drop(columns=unknown)
+        casted = {}
+        for c in df.columns:
+            clmn = schema.loc[names[str(c).lower()]]
+            try:
+                casted[c] = _cast_column(
+                    df[c], clmn['data_type'], clmn['max_length'])
+            except (ValueError, TypeError) as e:
+                raise ValueError(
+                    f'Column {c} cannot be cast to {clmn["column_type"]}: {e}'
+                ) from e
+        return pd.DataFrame(casted, index=df.index, columns=df.columns)
+
+
+    def max_allowed_packet(self):
+        """Returns the maximum size in bytes of a statement sent to the server.
+
+        This is the minimum of the server `max_allowed_packet` (queried once
+        and cached) and of the client one.
+
+        """
+        if self._max_allowed_packet is None:
+            server = int(
+                self.extract('SELECT @@max_allowed_packet').iloc[0, 0])
+            client = getattr(self._con, 'max_allowed_packet', server)
+            self._max_allowed_packet = min(server, client)
+        return self._max_allowed_packet
+
+
+    def _insert_values(self, df, table_name, clmns, update, batch_size):
+        """Inserts the DataFrame rows with packet-sized multi-row statements.
+
+        """
+        nrows, first_row_id = 0, None
+        batches = insert_statements(
+            df, table_name, clmns, update, self._con.literal, 
+            self._con.encoding, self.max_allowed_packet(), batch_size
+        )
+        # Recorded by the monitor as a single fingerprint, whatever the number
+        # of rows per statement
+        query = f'INSERT INTO {table_name} ({clmns}) VALUES (?+){update}'
+        for statements in batches:
+            logging.debug('Sending %s statements', len(statements))
+            res = self._run_statements(statements, query)
+            nrows += sum(r[0] for r in res)
+            if first_row_id is None:
+                first_row_id = res[0][1]
+        return nrows, first_row_id
+
+
+    def _load_data(self, df, table_name, clmns, update):
+        """Inserts the DataFrame rows with `LOAD DATA LOCAL INFILE`.
+
+        `LOAD DATA` ignores the rows with duplicate keys (with a warning), and
+        does not support `ON DUPLICATE KEY UPDATE`: the rows are loaded into
+        a temporary table without keys, and inserted from it with
+        `INSERT ... SELECT`, which raises on duplicate keys like `INSERT`.
+        The binary columns are written in hexadecimal, and decoded with
+        `UNHEX`, so that the file only holds valid UTF-8.
+
+        """
+        binary = [_is_binary(df[c]) for c in df.columns]
+        formats = [_tsv_hex if b else _tsv_field for b in binary]
+        with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', newline='\n', suffix='.tsv', 
+                delete=False) as file:
+            for rows in iter_prepared(df, 'tuple', True):
+                file.writelines(
+                    '\t'.join([f(v) for f, v in zip(formats, row)]) + '\n'
+                    for row in rows
+                )
+        fields = [
+            f'@_hex{i}' if b else c
+            for i, (c, b) in enumerate(zip(df.columns, binary))
+        ]
+        unhex = ', '.join(
+            f'{c} = UNHEX(@_hex{i})' 
+            for i, (c, b) in enumerate(zip(df.columns, binary)) if b
+        )
+        try:
+            path = self._con.literal(file.name.replace('\\', '/'))
+            # Whatever `table_name` (possibly quoted): a temporary table is
+            # only visible to this connection
+            staging = '`_load_staging`'
+            res = self._run_statements([
+                f'DROP TEMPORARY TABLE IF EXISTS {staging}',
+                # Same column types, without keys
+                f'CREATE TEMPORARY TABLE {staging} '
+                f'SELECT {clmns} FROM {table_name} LIMIT 0',
+                f'LOAD DATA LOCAL INFILE {path} INTO TABLE {staging} '
+                f'CHARACTER SET utf8mb4 ({",".join(fields)})'
+                + (f' SET {unhex}' if unhex else ''),
+                f'INSERT INTO {table_name} ({clmns}) '
+                f'SELECT {clmns} FROM {staging}{update}',
+                f'DROP TEMPORARY TABLE {staging}'
+            ])
+        finally:
+            os.remove(file.name)
+        # Rows and first row id of the statement writing into `table_name`
+        return res[-2]
+
+
+    def _run_statements(self, statements, query=None):
+        """Runs statements (without parameters) in a single transaction.
+
+        In auto-commit mode, the statements are commited together, and 
+        rolled-back and retried together in case of errors. If a `monitor` is
+        set, they are recorded as a single `modify` of `query` (default the
+        statements joined).
+
+        """
+        if self.monitor is None:
+            return self._retried(self._execute_statements, statements)
+        start = time.perf_counter()
+        res = self._retried(self._execute_statements, statements)
+        wall_time = time.perf_counter() - start
+        if query is None:
+            query = ';\n'.join(
+                s.decode(self._con.encoding) if isinstance(s, bytes) else s
+                for s in statements
+            )
+        self._record(
+            'modify', query, None, wall_time, sum(r[0] for r in res),
+            sum(len(s) for s in statements)
+        )
+        return res
+
+
+    def _execute_statements(self, statements):
+        if self._auto_commit:
+            self._ping()
+            cursor = self._con.cursor()
+        else:
+            cursor = self._cursor
+        res = []
+        try:
+            for statement in statements:
+                res.append((cursor.execute(statement), cursor.lastrowid))
+            if self._auto_commit:
+                self._con.commit()
+        except Exception:
+            if self._auto_commit:
+                try:
+                    self._con.rollback()
+                except Exception:
+                    logging.debug('Rollback failed', exc_info=True)
+            raise
+        return res
+
+
+    def explain(self, query, params=None):
+        """Run EXPLAIN on the query, and returns its result as a DataFrame.
+        
+        Parameters
+        ----------
+        query : str
+            The SQL query to explain, without the `EXPLAIN` keyword.
+        params : tuple, list, or dict
+            Parameters used with query.
+        
+        Returns
+        -------
+        <pd.DataFrame>
+
+        """
+        explained_query = 'EXPLAIN ' + query
+        return self.extract(explained_query, params)
+
+
+    @mysql_retry
+    def query(self, query, params=None, to_clipboard=False):
+        """Returns the exact string (with parameters replaced).
+
+        Parameters
+        ----------
+        query : str
+            The parametrized SQL query.
+        params : tuple, list, or dict
+            Parameters used with query.
+        to_clipboard : bool
+            Wether to copy the resulting string to clipboard.
+
+        Returns
+        -------
+        str.
+
+        """
+        self._ping()
+        query = self._mogrify(query, params)
+        if to_clipboard:
+            pyperclip.copy(query)
+        return query
+
+
+    def _mogrify(self, query, params=None):
+        """Replaces the parameters locally, without pinging the server."""
+        return self._con.cursor().mogrify(query, params)
+
+
+    def _identity(self):
+        """Identifies the database the connection is opened to."""
+        return _identity(self._db_params)
+
+
+    def close(self):
+        """Close the connection to the database
+
+        """
+        self._con.close()
+        logging.info('Connection closed successfully.')
+
+
+    @contextlib.contextmanager
+    def named_lock(self, lock_name, timeout):
+        """Get a named lock on MySQL database.
+
+        The lock is exclusive. While held by one session, other sessions cannot 
+        obtain a lock of the same name. Other sessions might still access the 
+        database if they do not try to obtain a lock with the same name. This
+        is usefull to avoid multiple scripts running at the same time.
+
+        Parameters
+        ----------
+        lock_name : str
+            Name of the lock. 
+        timeout : int
+            Timeout in seconds to acquire lock before raising an error. A 
+            negative timeout means infinite timeout.
+        
+        Returns
+        -------
+        None.
+        
+        """
+        # Neither cached nor coalesced: each call must reach the server
+        lock = self._extract_with(
+            'SELECT GET_LOCK(%s, %s)', (lock_name, timeout), 0, None)
+        if lock.iloc[0, 0] == 1:
+            logging.debug('Named lock %s obtained successfully', lock_name)
+            try:
+                yield None
+            finally:
+                logging.debug('Releasing named lock %s', lock_name)
+                self._extract_with(
+                    'SELECT RELEASE_LOCK(%s)', (lock_name, ), 0, None)
+        else:
+            e = f'Could not obtain named lock {lock_name} within {timeout} seconds.'
+            raise RuntimeError(e)
+
+
+class GrabMySQLPool():
+    """Thread-safe pool of `GrabMySQL` connections to the same database.
+
+    Each thread checks out its own `GrabMySQL` object, which is used exactly
+    like a standalone one (`extract`, `modify`, `insert_df`, `with sql:`
+    transactions), and checks it in when done. A pooled connection is only
+    pinged when it has been idle for more than `idle_ping` seconds, and it is
+    closed and replaced once it is older than `max_lifetime` seconds.
+
+    Examples
+    --------
+    >>> pool = GrabMySQL.pool(db_params, min_size=2, max_size=20)
+    >>> with pool.connection() as sql:
+    ...     df = sql.extract("SELECT * FROM disputes LIMIT 10")
+    ...     with sql:
+    ...         sql.modify(query_insert, ((12, 23, 'a'), (12, 2333, 'a')))
+
+    Single statements can be run directly on the pool.
+
+    >>> df = pool.extract("SELECT * FROM disputes LIMIT 10")
+    >>> pool.close()
+
+    """
+    def __init__(self, db_params, min_size=1, max_size=10, idle_ping=30,
+                 max_lifetime=3600, timeout=None, factory=None):
+        """Instantiates a GrabMySQLPool object.
+
+        Parameters
+        ----------
+        db_params : dict
+            Connection parameters, shared by all the pooled connections.
+        min_size : int
+            Number of connections opened upfront and kept open.
+        max_size : int
+            Maximum number of connections opened at the same time.
+        idle_ping : float
+            Idle time in seconds after which a connection is pinged before
+            being used. Default 30.
+        max_lifetime : float
+            Age in seconds after which a connection is closed and replaced.
+            Default 3600.
+        timeout : float, optional
+            Default time in seconds to wait for a connection in `checkout`.
+            None (default) waits forever.
+        factory : callable, optional
+            Class (or callable taking `db_params` and `ping_interval`) used to
+            create the connections. Default `GrabMySQL`.
+
+        The `cache` attribute (a `QueryCache`, default None), the 
+        `single_flight` attribute (a `SingleFlight`, default None), the
+        `schemas` attribute (a `SchemaCache`) and the `conversion` profile
+        (default 'python') are shared by the checked-out connections.
+
+        Returns
+        -------
+        <GrabMySQLPool> object.
+
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(
+                'Must have 0 <= min_size <= max_size and max_size >= 1.')
+        self._db_params = db_params.copy()
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_ping = idle_ping
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self._factory = factory or GrabMySQL
+        self.cache = None
+        self.schemas = dbapi.SchemaCache()
+        self.single_flight = None
+        self.conversion = 'python'
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(min_size):
+            self._idle.append(self._new_connection())
+            self._size += 1
+
+
+    def __repr__(self):
+        return (
+            f"GrabMySQLPool({{'host':{reprlib.repr(self._db_params.get('host'))}"
+            f", ...}}, size={self._size}, idle={len(self._idle)})"
+        )
+
+
+    def _new_connection(self):
+        return self._factory(self._db_params, ping_interval=self.idle_ping)
+
+
+    def _expired(self, sql):
+        return time.monotonic() - sql._created >= self.max_lifetime
+
+
+    def _discard(self, sql):
+        """Closes a connection and frees its slot. Must hold `self._cond`."""
+        self._size -= 1
+        try:
+            sql.close()
+        except Exception:
+            logging.debug('Error while closing pooled connection', exc_info=True)
+        self._cond.notify()
+
+
+    def checkout(self, timeout=None):
+        """Takes a connection from the pool.
+
+        An idle connection is reused when available, otherwise a new one is
+        opened if the pool is not full. If the pool is full, then it waits
+        for a connection to be checked in.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time in seconds to wait for a connection. Default to the pool
+            `timeout`.
+
+        Returns
+        -------
+        <GrabMySQL> object, to be given back with `checkin`.
+
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('The pool is closed.')
+                while self._idle:
+                    sql = self._idle.pop()  # LIFO: keep hot connections hot
+                    if self._expired(sql):
+                        logging.debug('Recycling connection %s', sql)
+                        self._discard(sql)
+                        continue
+                    sql.cache = self.cache
+                    sql.schemas = self.schemas
+                    sql.single_flight = self.single_flight
+                    sql.conversion = self.conversion
+                    return sql
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f'No connection available within {timeout} seconds.')
+                self._cond.wait(remaining)
+        # Connect outside the lock, so other threads are not blocked.
+        try:
+            sql = self._new_connection()
+            sql.cache = self.cache
+            sql.schemas = self.schemas
+            sql.single_flight = self.single_flight
+            sql.conversion = self.conversion
+            return sql
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
 
-        The column names of the DataFrame and table must match. As the SQL
-        query is created from the DataFrame columns and table_name it is not
-        safe from SQL query injection. It is the responsabilty of the user to
-        make sure the query is safe.
+    def checkin(self, sql):
+        """Gives a connection back to the pool.
+
+        Any pending transaction is rolled-back. Expired connections are 
+        closed instead of being kept idle.
 
         Parameters
         ----------
-        df : <pd.DataFrame>
-            The DataFrame to insert.
-        table_name : str
-            The name of the table. The column names must match the DataFrame
-            column names.
-        on_dupl_update_clmns : iterable
-            The list of columns to update in case of duplicated key. If None, 
-            then no columns are updated (and an error is raised in case of 
-            duplicated keys.).
-        
+        sql : <GrabMySQL>
+            A connection obtained with `checkout`.
+
         Returns
         -------
-        A 2-elements tuple as returned by `GrabMySQL.modify`.
+        None.
 
         """
-        if len(df) == 0:
-            logging.info(
-                'Inserting dataframe into %s. Nothing to insert.', table_name
-            )
-            return (0, 0)
+        with self._cond:
+            if not sql._auto_commit:
+                logging.info('Rolling back unfinished transaction on checkin')
+                sql._auto_commit = True
+                try:
+                    sql._con.rollback()
+                except Exception:
+                    self._discard(sql)
+                    return
+            if self._closed or self._expired(sql) or not sql._con.open:
+                self._discard(sql)
+            else:
+                self._idle.append(sql)
+                self._cond.notify()
 
-        query = f"""
-            INSERT INTO 
-                {table_name} ({','.join(list(df.columns))})
-            VALUES
-                ({','.join(['%s'] * df.shape[1])})
-        """
-        if isinstance(on_dupl_update_clmns, str):
-            on_dupl_update_clmns = list(on_dupl_update_clmns)
-        if on_dupl_update_clmns is not None and len(on_dupl_update_clmns) > 0:
-            update = [f'{clmn}=VALUES({clmn})' for clmn in on_dupl_update_clmns]
-            query = query + ' ON DUPLICATE KEY UPDATE ' + ', '.join(update)
-        return self.modify(query, prepare_df(df, 'list', True))
 
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Context manager checking out a connection and checking it in.
 
-    def explain(self, query, params=None):
-        """Run EXPLAIN on the query, and returns its result as a DataFrame.
-        
         Parameters
         ----------
-        query : str
-            The SQL query to explain, without the `EXPLAIN` keyword.
-        params : tuple, list, or dict
-            Parameters used with query.
-        
+        timeout : float, optional
+            Time in seconds to wait for a connection.
+
         Returns
         -------
-        <pd.DataFrame>
+        <GrabMySQL> object.
 
         """
-        explained_query = 'EXPLAIN ' + query
-        return self.extract(explained_query, params)
+        sql = self.checkout(timeout)
+        try:
+            yield sql
+        finally:
+            self.checkin(sql)
 
 
-    @mysql_retry
-    def query(self, query, params=None, to_clipboard=False):
-        """Returns the exact string (with parameters replaced).
+    def extract(self, query, params=None, ttl=None):
+        """Runs `GrabMySQL.extract` on a pooled connection.
+
+        If a `SingleFlight` is set as `single_flight` attribute, then the
+        identical queries are coalesced before a connection is checked out:
+        only the first one takes a connection, the others wait for its 
+        result without holding any.
+
+        """
+        def run(single_flight=None):
+            with self.connection() as sql:
+                return sql._extract_with(query, params, ttl, single_flight)
+
+        single_flight = self.single_flight
+        if single_flight is None:
+            return run()
+        key = _flight_key(self._db_params, query, params)
+        return single_flight.do(key, run)
+
+
+    def modify(self, query, params=None):
+        """Runs `GrabMySQL.modify` on a pooled connection."""
+        with self.connection() as sql:
+            return sql.modify(query, params)
+
+
+    def insert_df(self, df, table_name, on_dupl_update_clmns=None, **kwargs):
+        """Runs `GrabMySQL.insert_df` on a pooled connection."""
+        with self.connection() as sql:
+            return sql.insert_df(
+                df, table_name, on_dupl_update_clmns, **kwargs)
+
+
+    def close(self):
+        """Closes all the idle connections. Checked-out connections are closed
+        when checked in.
+
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+
+class GrabMySQLRouter(GrabMySQL):
+    """GrabMySQL connected to a primary database and its read replicas.
+
+    The `extract` queries (and `extract_iter`, `extract_to_parquet`) run in
+    auto-commit mode are sent to a healthy replica, chosen by round robin or
+    by least latency. Everything else runs on the primary: `modify`,
+    `insert_df`, the transactions of `with` statements, `named_lock`, and the
+    queries run within `with sql.primary():`.
+    The replication lag of each replica (`Seconds_Behind_Master` of `SHOW
+    SLAVE STATUS`, which requires the `REPLICATION CLIENT` privilege) and its
+    latency are checked at most every `check_interval` seconds. Replicas
+    lagging more than `max_lag` seconds, with a stopped replication, or
+    failing a query, are skipped until the next check. If no replica is
+    healthy, the queries are sent to the primary.
+    With `read_your_writes`, the queries are sent to the primary for
+    `read_your_writes` seconds after a write, so that the written rows are
+    read back even if the replicas lag behind.
+
+    Examples
+    --------
+    >>> sql = GrabMySQLRouter(
+    ...     db_params, [replica_params_1, replica_params_2], 
+    ...     strategy='least_latency', max_lag=10, read_your_writes=30)
+    >>> df = sql.extract("SELECT * FROM disputes")  # On a replica
+    >>> sql.modify(query_insert, ((12, 23, 'a'), ))  # On the primary
+    >>> df = sql.extract("SELECT * FROM disputes")  # On the primary for 30s
+    >>> sql.replica_status()  # Lag and latency of each replica
+
+    """
+    STRATEGIES = ('round_robin', 'least_latency')
+
+    def __init__(self, db_params, replicas, strategy='round_robin', 
+                 max_lag=30, check_interval=10, read_your_writes=None,
+                 ping_interval=0):
+        """Instantiate a GrabMySQLRouter object
 
         Parameters
         ----------
-        query : str
-            The parametrized SQL query.
-        params : tuple, list, or dict
-            Parameters used with query.
-        to_clipboard : bool
-            Wether to copy the resulting string to clipboard.
+        db_params : dict
+            Connection parameters of the primary.
+        replicas : list of dict
+            Connection parameters of each replica.
+        strategy : str
+            How the replica is chosen: 'round_robin' (default) or 
+            'least_latency'.
+        max_lag : float
+            Maximum replication lag in seconds of a healthy replica. 
+            Default 30.
+        check_interval : float
+            Time in seconds between two checks of a replica. Default 10.
+        read_your_writes : float, optional
+            Time in seconds after a write during which the queries are sent
+            to the primary. None (default) never does.
+        ping_interval : float, optional
+            Same as `GrabMySQL`, for all the connections.
 
         Returns
         -------
-        str.
+        <GrabMySQLRouter> object.
 
         """
-        self._con.ping()
-        cursor = self._con.cursor()
-        query = cursor.mogrify(query, params)
-        if to_clipboard:
-            pyperclip.copy(query)
-        return query
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'`strategy` must be one of {self.STRATEGIES}.')
+        super().__init__(db_params, ping_interval)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.read_your_writes = read_your_writes
+        self.replicas = [GrabMySQL(p, ping_interval) for p in replicas]
+        self._states = [
+            {'healthy': False, 'lag': None, 'latency': None, 'checked': None}
+            for _ in self.replicas
+        ]
+        self._next = 0
+        self._pinned = 0
+        self._last_write = None
 
 
-    def close(self):
-        """Close the connection to the database
+    def __repr__(self):
+        host = self._db_params.get('host')
+        return (
+            f"GrabMySQLRouter({{'host':{host!r}, ...}}, "
+            f"replicas={len(self.replicas)})"
+        )
+
+
+    @classmethod
+    def pool(cls, db_params, replicas, min_size=1, max_size=10,
+             router_kwargs=None, **kwargs):
+        """Creates a thread-safe pool of routers to the same primary and
+        replicas.
+
+        Parameters
+        ----------
+        db_params : dict
+            Connection parameters of the primary.
+        replicas : list of dict
+            Connection parameters of each replica.
+        min_size : int
+            Number of routers opened upfront and kept open.
+        max_size : int
+            Maximum number of routers opened at the same time.
+        router_kwargs : dict, optional
+            Additional keyword parameters passed to `GrabMySQLRouter` (e.g.
+            `strategy`, `max_lag`).
+        **kwargs :
+            Additional keyword parameters passed to `GrabMySQLPool`.
+
+        Returns
+        -------
+        <GrabMySQLPool> object.
 
         """
-        self._con.close()
-        logging.info('Connection closed successfully.')
+        factory = functools.partial(
+            cls, replicas=replicas, **(router_kwargs or {}))
+        return GrabMySQLPool(
+            db_params, min_size=min_size, max_size=max_size, factory=factory,
+            **kwargs
+        )
 
 
     @contextlib.contextmanager
-    def named_lock(self, lock_name, timeout):
-        """Get a named lock on MySQL database.
+    def primary(self):
+        """Context manager sending all the queries to the primary."""
+        self._pinned += 1
+        try:
+            yield self
+        finally:
+            self._pinned -= 1
 
-        The lock is exclusive. While held by one session, other sessions cannot 
-        obtain a lock of the same name. Other sessions might still access the 
-        database if they do not try to obtain a lock with the same name. This
-        is usefull to avoid multiple scripts running at the same time.
 
-        Parameters
-        ----------
-        lock_name : str
-            Name of the lock. 
-        timeout : int
-            Timeout in seconds to acquire lock before raising an error. A 
-            negative timeout means infinite timeout.
-        
+    def replica_status(self):
+        """Returns the last known state of each replica.
+
         Returns
         -------
-        None.
-        
+        <pd.DataFrame> with the host, health, lag and latency (in seconds) of
+        each replica.
+
         """
-        lock = self.extract("SELECT GET_LOCK(%s, %s)", (lock_name, timeout))
-        if lock.iloc[0, 0] == 1:
-            logging.debug('Named lock %s obtained successfully', lock_name)
-            try:
-                yield None
-            finally:
-                logging.debug('Releasing named lock %s', lock_name)
-                self.extract('SELECT RELEASE_LOCK(%s)', (lock_name))
+        return pd.DataFrame([
+            {'host': r._db_params.get('host'), **{
+                k: state[k] for k in ('healthy', 'lag', 'latency')}}
+            for r, state in zip(self.replicas, self._states)
+        ])
+
+
+    def _check(self, i):
+        """Updates the lag and latency of the replica `i`."""
+        replica, state = self.replicas[i], self._states[i]
+        state['checked'] = time.monotonic()
+        try:
+            start = time.perf_counter()
+            lag = replica.replication_lag()
+            latency = time.perf_counter() - start
+        except Exception:
+            logging.warning(
+                'Replica %s is unreachable', replica._db_params.get('host'),
+                exc_info=True
+            )
+            state['healthy'] = False
+            return
+        state['lag'] = lag
+        if state['latency'] is None:
+            state['latency'] = latency
         else:
-            e = f'Could not obtain named lock {lock_name} within {timeout} seconds.'
-            raise RuntimeError(e)
+            state['latency'] = 0.7 * state['latency'] + 0.3 * latency
+        state['healthy'] = lag is not None and lag <= self.max_lag
+        if not state['healthy']:
+            logging.info(
+                'Replica %s skipped: lag of %s seconds', 
+                replica._db_params.get('host'), lag
+            )
+
+
+    def _replica(self):
+        """Returns the replica to send a read to, or None for the primary.
+
+        """
+        if self._pinned or not self._auto_commit or not self.replicas:
+            return None
+        if (self.read_your_writes is not None 
+                and self._last_write is not None
+                and time.monotonic() - self._last_write 
+                < self.read_your_writes):
+            return None
+        now = time.monotonic()
+        for i, state in enumerate(self._states):
+            if (state['checked'] is None 
+                    or now - state['checked'] >= self.check_interval):
+                self._check(i)
+        healthy = [i for i, s in enumerate(self._states) if s['healthy']]
+        if not healthy:
+            logging.info('No healthy replica. Reading from the primary.')
+            return None
+        if self.strategy == 'least_latency':
+            i = min(healthy, key=lambda i: self._states[i]['latency'])
+        else:
+            i = healthy[self._next % len(healthy)]
+            self._next += 1
+        return i
+
+
+    def _read_params(self):
+        """Returns the connection parameters of a healthy replica, or of the
+        primary if the reads are sent to the primary.
+
+        """
+        i = self._replica()
+        if i is None:
+            return self._db_params
+        return self.replicas[i]._db_params
+
+
+    def _on_replica(self, fn_name, query, params):
+        """Runs a read method on a replica, or on the primary if none is
+        available. A replica failing is skipped until its next check.
+
+        """
+        i = self._replica()
+        if i is None:
+            return getattr(super(), fn_name)(query, params)
+        replica = self.replicas[i]
+        replica.categorical_ratio = self.categorical_ratio
+        replica.trace = self.trace
+        if replica.conversion != self.conversion:
+            replica.conversion = self.conversion
+        self._ran_on = replica
+        try:
+            return getattr(replica, fn_name)(query, params)
+        except MYSQL_ERRORS:
+            self._states[i]['healthy'] = False
+            raise
+
+
+    def _extract(self, query, params=None):
+        return self._on_replica('_extract', query, params)
+
+
+    def _execute_unbuffered(self, query, params=None):
+        return self._on_replica('_execute_unbuffered', query, params)
+
+
+    def _modify(self, query, params=None):
+        try:
+            return super()._modify(query, params)
+        finally:
+            self._last_write = time.monotonic()
+
+
+    def _run_statements(self, statements, query=None):
+        try:
+            return super()._run_statements(statements, query)
+        finally:
+            self._last_write = time.monotonic()
+
+
+    def __enter__(self):
+        super().__enter__()
+        self._pinned += 1
+        return self
+
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self._pinned -= 1
+        self._last_write = time.monotonic()
+        return super().__exit__(exception_type, exception_value, traceback)
+
+
+    @contextlib.contextmanager
+    def named_lock(self, lock_name, timeout):
+        """Same as `GrabMySQL.named_lock`, on the primary. The queries run
+        while the lock is held are also sent to the primary.
+
+        """
+        with self.primary(), super().named_lock(lock_name, timeout):
+            yield None
+
+
+    def close(self):
+        """Close the connections to the primary and to the replicas
+
+        """
+        for replica in self.replicas:
+            replica.close()
+        super().close()
 
 
 def jsonify_sql(path_sql, path_json=None):
@@ -525,11 +2844,9 @@ def jsonify_sql(path_sql, path_json=None):
         folder, sql_name = os.path.split(path_sql) 
         json_name = sql_name + '.json'
         path_json = os.path.join(Path(folder).parent, json_name)
-    with open(path_sql, encoding='utf-8') as file:
-        sql = file.read()
-
-    params = get_params(sql)
-    sql_json = {'sql': sql}
+    template = SqlTemplate.from_file(path_sql)
+    params = template.params
+    sql_json = {'sql': template.sql}
     if params:
         sql_json['params'] = params
 
@@ -538,6 +2855,176 @@ def jsonify_sql(path_sql, path_json=None):
     return None
 
 
+def _file_digest(path):
+    """Returns the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+"""Types of the parameters of BatMan-style queries"""
+PARAM_TYPES = ('number', 'date', 'string')
+
+
+def _jsonify_checked(path_sql, path_json):
+    """Same as `jsonify_sql`, also raising a `ValueError` if a parameter type
+    is not in `PARAM_TYPES`.
+
+    """
+    invalid = [
+        param['replace'] for param in SqlTemplate.from_file(path_sql).params
+        if param['type'] not in PARAM_TYPES
+    ]
+    if invalid:
+        raise ValueError(f'Invalid parameter types in {", ".join(invalid)}')
+    return jsonify_sql(path_sql, path_json)
+
+
+def jsonify_sql_dir(folder, json_folder=None, pattern='*.sql', n_workers=None,
+                    manifest=None, force=False):
+    """Transforms all the SQL queries of a folder into json files.
+
+    Each `.sql` file is converted with `jsonify_sql`. The SHA-256 of each
+    converted file is saved in a manifest, and the files whose hash and json
+    file are unchanged since the last build are skipped. The other files are
+    converted in a pool of processes. The parameters format errors of all the
+    files (including types not in `PARAM_TYPES`), and the files which are not
+    valid UTF-8, are reported at once, after the valid files are converted.
+
+    Parameters
+    ----------
+    folder : str
+        Folder of the `.sql` files.
+    json_folder : str, optional
+        Folder of the output json files, where the sub-folders of `folder`
+        are mirrored. If None (default), each json file is saved where
+        `jsonify_sql` saves it by default: in the parent directory of its
+        `.sql` file.
+    pattern : str
+        Glob pattern of the `.sql` files, relative to `folder`. Use
+        `'**/*.sql'` to include the sub-folders. Default `'*.sql'`.
+    n_workers : int, optional
+        Number of processes. None (default) uses the number of CPUs.
+    manifest : str, optional
+        Path to the manifest. Default `.jsonify_manifest.json` in `folder`.
+    force : bool
+        If True, all the files are converted. Default False.
+
+    Returns
+    -------
+    list of str
+        Paths to the converted `.sql` files.
+
+    Raises
+    ------
+    ValueError
+        If some files have parameters not following the expected format, or
+        cannot be decoded. The message lists all the invalid files. Also
+        raised before converting anything if several `.sql` files would be
+        converted into the same json file.
+
+    """
+    folder = Path(folder)
+    if manifest is None:
+        manifest = folder / '.jsonify_manifest.json'
+    try:
+        with open(manifest, encoding='utf-8') as file:
+            built = json.load(file)
+    except FileNotFoundError:
+        built = {}
+
+    paths = {}
+    for path_sql in sorted(folder.glob(pattern)):
+        if json_folder is None:
+            path_json = path_sql.parent.parent / (path_sql.name + '.json')
+        else:
+            relative = path_sql.relative_to(folder).parent
+            path_json = Path(json_folder, relative, path_sql.name + '.json')
+        paths[path_sql] = path_json
+    sources = {}
+    for path_sql, path_json in paths.items():
+        sources.setdefault(path_json, []).append(str(path_sql))
+    collisions = {k: v for k, v in sources.items() if len(v) > 1}
+    if collisions:
+        err_mess = '\n'.join(
+            f'{path_json}: {", ".join(v)}' 
+            for path_json, v in collisions.items()
+        )
+        raise ValueError(
+            f'.sql files converted into the same json file:\n{err_mess}')
+    # Forget the files which no longer exist
+    keys = {path_sql.relative_to(folder).as_posix() for path_sql in paths}
+    built = {key: entry for key, entry in built.items() if key in keys}
+
+    todo = {}
+    for path_sql, path_json in paths.items():
+        key = path_sql.relative_to(folder).as_posix()
+        entry = {'sha256': _file_digest(path_sql), 'json': str(path_json)}
+        if not force and built.get(key) == entry and path_json.is_file():
+            continue
+        path_json.parent.mkdir(parents=True, exist_ok=True)
+        todo[key] = (str(path_sql), str(path_json), entry)
+    logging.info(
+        'Converting %s .sql files of %s (%s up to date)', len(todo), folder,
+        len(paths) - len(todo)
+    )
+
+    if len(todo) <= 1 or n_workers == 1:
+        results = {}
+        for key, (path_sql, path_json, _) in todo.items():
+            try:
+                results[key] = _jsonify_checked(path_sql, path_json)
+            except Exception as e:
+                results[key] = e
+    else:
+        with ProcessPoolExecutor(n_workers) as executor:
+            futures = {
+                key: executor.submit(_jsonify_checked, path_sql, path_json)
+                for key, (path_sql, path_json, _) in todo.items()
+            }
+            results = {key: f.exception() for key, f in futures.items()}
+
+    # Unexpected errors are raised once the manifest is saved, so that the
+    # files converted meanwhile are not converted again
+    converted, errors, undecodable, unexpected = [], {}, {}, None
+    for key, error in results.items():
+        if error is None:
+            built[key] = todo[key][2]
+            converted.append(todo[key][0])
+        elif isinstance(error, UnicodeDecodeError):
+            built.pop(key, None)
+            undecodable[key] = error
+        elif isinstance(error, ValueError):
+            built.pop(key, None)
+            errors[key] = error
+        else:
+            built.pop(key, None)
+            unexpected = unexpected or error
+    tmp_path = str(manifest) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(built, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest)
+    logging.info('%s .sql files converted', len(converted))
+    if unexpected is not None:
+        raise unexpected
+    messages = []
+    if errors:
+        err_mess = '\n'.join(f'{key}: {e}' for key, e in errors.items())
+        messages.append(
+            f'{len(errors)} .sql files with invalid parameters:\n{err_mess}')
+    if undecodable:
+        err_mess = '\n'.join(f'{key}: {e}' for key, e in undecodable.items())
+        messages.append(
+            f'{len(undecodable)} .sql files which are not valid UTF-8:\n'
+            f'{err_mess}'
+        )
+    if messages:
+        raise ValueError('\n'.join(messages))
+    return converted
+
+
 def get_params(sql):
     """Extracts parameters from a SQL query.
 
@@ -552,12 +3039,7 @@ def get_params(sql):
     List of dict
     """
     # TODO: exclude parameters in comments
-    param_pattern = '({{.+?>.+?}})'
-    params = set(re.findall(param_pattern, sql))
-
-    params = [param_parser(p) for p in params]
-
-    return params
+    return SqlTemplate(sql).params
 
 
 def replace(sql, params_dict):
@@ -578,29 +3060,8 @@ def replace(sql, params_dict):
         by the corresponding value from `params_dict`
     """
     if sql.endswith('.sql'):
-        with open(sql, encoding='utf-8') as file:
-            sql = file.read()
-
-    params = get_params(sql)
-    for param in params:
-        name = param['name']
-        rep = param['replace']
-        param_type = param['type']
-        param_default = param.get('default', None)
-        value = param_default or params_dict.get(name, None)
-        if value is None:
-            raise ValueError(
-                f'Parameter {name} must be included in params_dict')
-        if param_type == 'number':
-            value = str(value)
-        elif param_type == 'date':
-            value = f"date('{value}')"
-        elif param_type == 'string':
-            value = "'" + value + "'"
-        else:
-            raise ValueError("Invalid type " + param_type)
-        sql = re.sub(rep, value, sql)
-    return sql
+        return SqlTemplate.from_file(sql).render(params_dict)
+    return _compile(sql).render(params_dict)
 
 
 def param_parser(param):
@@ -638,3 +3099,173 @@ def param_parser(param):
         param_dict['default'] = param_default
 
     return param_dict
+
+
+def _render_param(param, value):
+    """Formats the value of a parameter parsed by `param_parser`"""
+    param_type = param['type']
+    if param_type == 'number':
+        return str(value)
+    elif param_type == 'date':
+        return f"date('{value}')"
+    elif param_type == 'string':
+        return "'" + value + "'"
+    raise ValueError("Invalid type " + param_type)
+
+
+class SqlTemplate():
+    """Parametrized SQL query compiled for fast rendering.
+
+    The query is parsed once: the parameters enclosed in double curly brackets
+    (see `param_parser`) are turned into the slots of a format string, so
+    that rendering is a single pass over the query. The output is the same as
+    `replace`: a parameter with a default value always renders its default,
+    others take their value from the parameters dict.
+    The templates read with `from_file` are cached, and re-parsed only when
+    the file is modified.
+
+    Examples
+    --------
+    >>> template = SqlTemplate.from_file('queries/disputes.sql')
+    >>> template.params
+    [{'name': 'country', 'type': 'number', 'replace': '{{country>number}}'}]
+    >>> template.render({'country': 2})
+    'SELECT * FROM disputes WHERE country_id = 2'
+    >>> queries = template.render_many({'country': c} for c in range(1, 9))
+
+    """
+    PARAM_PATTERN = re.compile('{{.+?>.+?}}')
+
+    _files = {}
+    _files_lock = threading.Lock()
+
+    def __init__(self, sql):
+        """Parses a parametrized SQL query.
+
+        Parameters
+        ----------
+        sql : str
+            SQL query with parameters enclosed in double curly brackets.
+
+        Returns
+        -------
+        <SqlTemplate> object.
+
+        """
+        self.sql = sql
+        self._params = []
+        slots = {}
+        parts = []
+        end = 0
+        for match in self.PARAM_PATTERN.finditer(sql):
+            param = match.group()
+            if param not in slots:
+                slots[param] = len(self._params)
+                self._params.append(param_parser(param))
+            literal = sql[end:match.start()]
+            parts.append(literal.replace('{', '{{').replace('}', '}}'))
+            parts.append('{%d}' % slots[param])
+            end = match.end()
+        literal = sql[end:]
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        self._format = ''.join(parts).format
+        # Parameters with a default value render the same in every query:
+        # rendered at the first `render`, which validates their type
+        self._constants = {}
+
+
+    @classmethod
+    def from_file(cls, path):
+        """Returns the template of a `.sql` file, from cache if the file was
+        not modified since it was parsed.
+
+        Parameters
+        ----------
+        path : str
+            Path to the `.sql` file.
+
+        Returns
+        -------
+        <SqlTemplate> object.
+
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with cls._files_lock:
+            cached = cls._files.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(path, encoding='utf-8') as file:
+            template = cls(file.read())
+        with cls._files_lock:
+            cls._files[path] = (version, template)
+        return template
+
+
+    def __repr__(self):
+        return f'SqlTemplate({query_repr(self.sql)})'
+
+
+    @property
+    def params(self):
+        """The parameters of the query, as returned by `param_parser`, in
+        order of first appearance.
+
+        """
+        return [param.copy() for param in self._params]
+
+
+    def render(self, params_dict=None):
+        """Replaces the parameters with values from `params_dict`.
+
+        Parameters
+        ----------
+        params_dict : dict, optional
+            Dictionay of param_name:value.
+
+        Returns
+        -------
+        str
+
+        """
+        params_dict = params_dict or {}
+        constants = self._constants
+        values = []
+        for i, param in enumerate(self._params):
+            if i in constants:
+                values.append(constants[i])
+                continue
+            if param.get('default', None):
+                constants[i] = _render_param(param, param['default'])
+                values.append(constants[i])
+                continue
+            value = params_dict.get(param['name'], None)
+            if value is None:
+                raise ValueError(
+                    f'Parameter {param["name"]} must be included in '
+                    'params_dict')
+            values.append(_render_param(param, value))
+        return self._format(*values)
+
+
+    def render_many(self, params_dicts):
+        """Renders the query for each dict of `params_dicts`.
+
+        Parameters
+        ----------
+        params_dicts : iterable of dict
+            Dictionaries of param_name:value.
+
+        Returns
+        -------
+        list of str
+
+        """
+        return [self.render(params_dict) for params_dict in params_dicts]
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(sql):
+    """Returns the `SqlTemplate` of a query string, cached"""
+    return SqlTemplate(sql)
@@ -0,0 +1,244 @@
+"""Module to compare the copies of a table on two MySQL databases
+
+Functions
+---------
+    table_diff :
+        Returns the keys of the rows which differ between two copies of a
+        table, comparing checksums of key ranges computed by the servers.
+
+"""
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .sql import _as_python
+
+
+def _quote(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _row_expression(columns):
+    """Returns the SQL expression serializing a row, distinguishing NULL
+    values from empty strings.
+
+    """
+    clmns = [_quote(c) for c in columns]
+    nulls = ', '.join(f'ISNULL({c})' for c in clmns)
+    return f"CONCAT_WS('#', {', '.join(clmns)}, CONCAT({nulls}))"
+
+
+def _range_condition(key, lo, hi):
+    """Returns the condition and parameters of the key range [lo, hi), where
+    None is unbounded.
+
+    """
+    conditions, params = [], []
+    if lo is not None:
+        conditions.append(f'{key} >= %s')
+        params.append(lo)
+    if hi is not None:
+        conditions.append(f'{key} < %s')
+        params.append(hi)
+    return ' AND '.join(conditions) or 'TRUE', params
+
+
+def _checksums(sql, table, key, row, ranges, ranges_per_query):
+    """Returns the (count, CRC32 sum, MD5 xor) of each key range.
+
+    The ranges are checksummed by batches of `ranges_per_query`, each range
+    being a `UNION ALL` branch scanning its part of the key index.
+
+    """
+    sums = []
+    for i in range(0, len(ranges), ranges_per_query):
+        branches, params = [], []
+        for lo, hi in ranges[i:i + ranges_per_query]:
+            condition, range_params = _range_condition(key, lo, hi)
+            branches.append(
+                f'SELECT COUNT(*), '
+                f'CAST(COALESCE(SUM(CRC32({row})), 0) AS CHAR), '
+                f'CAST(BIT_XOR(CAST(CONV(LEFT(MD5({row}), 16), 16, 10) '
+                f'AS UNSIGNED)) AS CHAR) FROM {table} WHERE {condition}'
+            )
+            params += range_params
+        df = sql.extract(' UNION ALL '.join(branches), params or None, ttl=0)
+        # The sums are sent as text: a DECIMAL (or an unsigned BIGINT above
+        # 2**63) may be converted to float by the `conversion` profile
+        sums += [
+            tuple(int(v) for v in values)
+            for values in df.itertuples(index=False)
+        ]
+    return sums
+
+
+def _bounds(sql, table, key, lo, hi, step):
+    """Returns every `step`-th key of the range [lo, hi), starting with its
+    first key.
+
+    """
+    condition, params = _range_condition(key, lo, hi)
+    df = sql.extract(
+        f'SELECT k FROM (SELECT {key} AS k, ROW_NUMBER() OVER '
+        f'(ORDER BY {key}) AS rn FROM {table} WHERE {condition}) AS _keys '
+        f'WHERE MOD(rn - 1, {int(step)}) = 0 ORDER BY k', params or None,
+        ttl=0
+    )
+    return [_as_python(v) for v in df['k']]
+
+
+def _row_hashes(sql, table, key, row, ranges):
+    """Returns the MD5 of the rows of the key ranges, indexed by key."""
+    conditions, params = [], []
+    for lo, hi in ranges:
+        condition, range_params = _range_condition(key, lo, hi)
+        conditions.append(f'({condition})')
+        params += range_params
+    df = sql.extract(
+        f'SELECT {key} AS k, MD5({row}) AS h FROM {table} '
+        f'WHERE {" OR ".join(conditions)}', params or None, ttl=0
+    )
+    return df.set_index('k')['h']
+
+
+def table_diff(src, dst, table, key, chunk_size=10000, columns=None,
+               leaf_size=100, fanout=10, ranges_per_query=50):
+    """Returns the keys of the rows which differ between two copies of a
+    table, without transferring the tables.
+
+    The table is split into ranges of `chunk_size` rows of `key`, and the
+    servers compute the checksum of each range (number of rows, sum of the
+    CRC32 and xor of the MD5 of the rows), on both databases concurrently.
+    Only the ranges whose checksums differ are split again into `fanout`
+    sub-ranges and checksummed, until they hold at most `leaf_size` rows:
+    then the MD5 of their rows are compared key by key. The data transferred
+    is thus proportional to the number of differences, not to the table
+    size.
+    `key` must be a unique, indexed, single column (typically the primary
+    key), and both servers must run MySQL 8.0+ (`ROW_NUMBER`). The rows are
+    compared through their text representation, so that columns with
+    different types or collations on both sides are reported as changed.
+    As the tables are read in several statements, rows modified during the
+    comparison may be reported too.
+
+    Parameters
+    ----------
+    src : <GrabMySQL>
+        Connection to the reference copy of the table.
+    dst : <GrabMySQL>
+        Connection to the compared copy of the table.
+    table : str
+        Name of the table, possibly prefixed by the database name.
+    key : str
+        Unique column splitting the table into ranges.
+    chunk_size : int
+        Number of rows of the initial ranges. Default 10000.
+    columns : list of str, optional
+        Columns compared. Default to the columns common to both tables (the
+        others are logged in a warning).
+    leaf_size : int
+        Number of rows from which the rows of a range are compared
+        one by one. Default 100.
+    fanout : int
+        Number of sub-ranges a differing range is split into. Default 10.
+    ranges_per_query : int
+        Number of ranges checksummed per query. Default 50.
+
+    Returns
+    -------
+    <pd.DataFrame> with the `key` values of the differing rows, sorted, and
+    the `diff` column: 'missing' (only in `src`), 'extra' (only in `dst`) or
+    'changed'.
+
+    Examples
+    --------
+    >>> table_diff(sql, sql_stg, 'disputes', 'id')
+            id     diff
+    0     1201  changed
+    1    88410  missing
+
+    """
+    start = time.monotonic()
+    if columns is None:
+        src_clmns = list(src.table_schema(table).index)
+        dst_clmns = set(dst.table_schema(table).index)
+        columns = [c for c in src_clmns if c in dst_clmns]
+        others = set(src_clmns).symmetric_difference(dst_clmns)
+        if others:
+            logging.warning(
+                'Columns not in both tables, not compared: %s', sorted(others))
+    row = _row_expression(columns)
+    key_sql = _quote(key)
+    logging.info('Compare %s by %s between %r and %r', table, key, src, dst)
+    executor = ThreadPoolExecutor(2, thread_name_prefix='table_diff')
+
+    def both(fn, *args):
+        """Runs `fn` on the source and the destination concurrently."""
+        futures = [executor.submit(fn, sql, *args) for sql in (src, dst)]
+        return [future.result() for future in futures]
+
+    cuts = _bounds(src, table, key_sql, None, None, chunk_size)[1:]
+    ranges = list(zip([None] + cuts, cuts + [None]))
+    diffs, level, n_checked = [], 0, 0
+    try:
+        while ranges:
+            src_sums, dst_sums = both(
+                _checksums, table, key_sql, row, ranges, ranges_per_query)
+            n_checked += len(ranges)
+            differing = [
+                (r, s, d) for r, s, d in zip(ranges, src_sums, dst_sums)
+                if s != d
+            ]
+            logging.info(
+                'Level %s: %s of %s ranges differ', level, len(differing),
+                len(ranges)
+            )
+            leaves, ranges = [], []
+            for (lo, hi), s, d in differing:
+                n = max(s[0], d[0])
+                sub_ranges = []
+                if n > leaf_size:
+                    # Split along the keys of the side with the most rows
+                    sql = src if s[0] >= d[0] else dst
+                    step = math.ceil(n / fanout)
+                    cuts = _bounds(sql, table, key_sql, lo, hi, step)[1:]
+                    sub_ranges = list(zip([lo] + cuts, cuts + [hi]))
+                if len(sub_ranges) > 1:
+                    ranges += sub_ranges
+                else:
+                    leaves.append((lo, hi))
+            for i in range(0, len(leaves), ranges_per_query):
+                batch = leaves[i:i + ranges_per_query]
+                src_rows, dst_rows = both(
+                    _row_hashes, table, key_sql, row, batch)
+                diffs.append(_compare(src_rows, dst_rows))
+            level += 1
+    finally:
+        executor.shutdown()
+    if diffs:
+        df = pd.concat(diffs).sort_index()
+    else:
+        df = pd.Series([], dtype=object)
+    df = df.rename_axis(key).rename('diff').reset_index()
+    logging.info(
+        '%s differing rows found in %.1fs (%s ranges checksummed)', len(df),
+        time.monotonic() - start, n_checked
+    )
+    return df
+
+
+def _compare(src_rows, dst_rows):
+    """Returns the kind of difference of each differing key."""
+    missing = src_rows.index.difference(dst_rows.index)
+    extra = dst_rows.index.difference(src_rows.index)
+    common = src_rows.index.intersection(dst_rows.index)
+    changed = common[
+        src_rows.loc[common].to_numpy() != dst_rows.loc[common].to_numpy()]
+    return pd.concat([
+        pd.Series('missing', index=missing, dtype=object),
+        pd.Series('extra', index=extra, dtype=object),
+        pd.Series('changed', index=changed, dtype=object),
+    ])
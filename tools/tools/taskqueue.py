@@ -0,0 +1,462 @@
+"""Module to distribute tasks to several workers through a MySQL table
+
+Classes
+-------
+    MySQLTaskQueue :
+        Stores tasks in a MySQL table, from which concurrent workers claim
+        batches with `SELECT ... FOR UPDATE SKIP LOCKED`, with visibility
+        timeouts, heartbeats and ack/nack.
+
+"""
+import contextlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import namedtuple
+
+import pandas as pd
+
+
+"""Task claimed by a worker: its `id`, deserialized `payload`, number of
+`attempts` (including the current one), and `lease` proving the claim"""
+Task = namedtuple('Task', ['id', 'payload', 'attempts', 'lease'])
+
+
+class MySQLTaskQueue:
+    """Work queue stored in a MySQL table, shared by concurrent workers.
+
+    Unlike `GrabMySQL.named_lock`, which lets a single worker run at a time,
+    workers claim distinct batches of tasks: the claim selects the available
+    tasks with `FOR UPDATE SKIP LOCKED` (MySQL 8.0+), so that concurrent
+    claims skip each other's rows instead of waiting for them, and leases
+    them for `visibility_timeout` seconds in the same short transaction.
+    A task is acknowledged (`ack`) once processed, or released (`nack`) to be
+    retried later. A task whose lease expires, because its worker crashed or
+    stopped sending `heartbeat`, becomes available again. Its first worker can
+    then no longer ack or extend it: each claim has its own lease token, so
+    that a task is never completed twice. After `max_attempts` claims, a
+    task is moved to the `dead` status instead of being retried.
+    All times are taken from the database server clock. Several queues can
+    share the same table.
+
+    Examples
+    --------
+    >>> queue = MySQLTaskQueue(sql, 'task_queue', 'refunds')
+    >>> queue.create_table()
+    >>> queue.put([{'dispute_id': 12}, {'dispute_id': 13}])
+    2
+
+    On each worker (process, or thread with its own connection):
+
+    >>> queue = MySQLTaskQueue(pool, 'task_queue', 'refunds')
+    >>> queue.process(lambda payload: refund(payload['dispute_id']))
+    2
+
+    Or claim and acknowledge the tasks explicitly:
+
+    >>> for task in queue.claim(10):
+    ...     try:
+    ...         refund(task.payload['dispute_id'])
+    ...     except RefundError as e:
+    ...         queue.nack([task], delay=60, error=e)
+    ...     else:
+    ...         queue.ack([task])
+
+    """
+    def __init__(self, sql, table='task_queue', queue='default',
+                 visibility_timeout=300, max_attempts=5, worker_id=None):
+        """Instantiates a MySQLTaskQueue object.
+
+        Parameters
+        ----------
+        sql : <GrabMySQL> or <GrabMySQLPool>
+            Connection to the database holding the table. A `GrabMySQL` must
+            not be shared with other threads.
+        table : str
+            Name of the table storing the tasks. Default 'task_queue'.
+        queue : str
+            Name of the queue in the table. Default 'default'.
+        visibility_timeout : float
+            Time in seconds a claimed task is leased to its worker before it
+            becomes available again. Default 300.
+        max_attempts : int
+            Number of claims after which a task is dead. Default 5.
+        worker_id : str, optional
+            Identifies the worker in the table. Default to host:pid.
+
+        Returns
+        -------
+        <MySQLTaskQueue> object.
+
+        """
+        self.sql = sql
+        self.table = table
+        self.queue = queue
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        if worker_id is None:
+            worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.worker_id = worker_id
+
+
+    def __repr__(self):
+        return f'MySQLTaskQueue({self.table!r}, {self.queue!r})'
+
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Yields a `GrabMySQL`, checked out of the pool if needed."""
+        if hasattr(self.sql, 'connection'):
+            with self.sql.connection() as sql:
+                yield sql
+        else:
+            yield self.sql
+
+
+    def create_table(self):
+        """Creates the table of the tasks if it does not exist."""
+        with self._connection() as sql:
+            sql._run_statements([
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY, '
+                'queue VARCHAR(64) NOT NULL, '
+                'payload LONGTEXT NOT NULL, '
+                "status ENUM('queued', 'running', 'done', 'dead') "
+                "NOT NULL DEFAULT 'queued', "
+                'priority INT NOT NULL DEFAULT 0, '
+                'attempts INT UNSIGNED NOT NULL DEFAULT 0, '
+                'available_at DATETIME(6) NOT NULL, '
+                'lease CHAR(32) NULL, '
+                'worker VARCHAR(255) NULL, '
+                'last_error TEXT NULL, '
+                'created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6), '
+                'updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) '
+                'ON UPDATE CURRENT_TIMESTAMP(6), '
+                # Matches the ORDER BY of `claim`, so that it scans (and
+                # locks) only the rows it returns
+                'KEY ix_claim (queue, status, priority DESC, id)'
+                ') ENGINE=InnoDB DEFAULT CHARSET=utf8mb4'
+            ])
+
+
+    def put(self, payloads, priority=0, delay=0):
+        """Adds tasks to the queue.
+
+        Parameters
+        ----------
+        payloads : list
+            Payloads of the tasks, serializable in json.
+        priority : int
+            Tasks with a higher priority are claimed first. Default 0.
+        delay : float
+            Time in seconds before the tasks become available. Default 0.
+
+        Returns
+        -------
+        int : Number of tasks added.
+
+        """
+        if not payloads:
+            return 0
+        rows = [
+            (self.queue, json.dumps(payload, default=str), priority, delay)
+            for payload in payloads
+        ]
+        nrows, _ = self.sql.modify(
+            f'INSERT INTO {self.table} '
+            '(queue, payload, priority, available_at) VALUES '
+            '(%s, %s, %s, NOW(6) + INTERVAL %s SECOND)', rows
+        )
+        logging.info('%s tasks added to queue %s', nrows, self.queue)
+        return nrows
+
+
+    def claim(self, n=1, visibility_timeout=None):
+        """Claims up to `n` available tasks, leased for `visibility_timeout`
+        seconds.
+
+        The running tasks whose lease expired are claimed first, then the
+        queued tasks, each by decreasing priority: each status is selected
+        separately, in the order of the `ix_claim` index, so that the server
+        neither sorts nor locks the rows it skips. The tasks which already
+        reached `max_attempts` are moved to the `dead` status instead of being
+        claimed.
+
+        Parameters
+        ----------
+        n : int
+            Maximum number of tasks to claim. Default 1.
+        visibility_timeout : float, optional
+            Default to the `visibility_timeout` attribute.
+
+        Returns
+        -------
+        list of <Task> (empty if no task is available).
+
+        """
+        if visibility_timeout is None:
+            visibility_timeout = self.visibility_timeout
+        lease = uuid.uuid4().hex
+        with self._connection() as sql, sql:
+            dfs = []
+            for status in ('running', 'queued'):
+                df = sql.extract(
+                    f'SELECT id, payload, attempts FROM {self.table} '
+                    'WHERE queue = %s AND status = %s '
+                    'AND available_at <= NOW(6) '
+                    f'ORDER BY priority DESC, id LIMIT {int(n)} '
+                    'FOR UPDATE SKIP LOCKED', (self.queue, status), ttl=0
+                )
+                dfs.append(df)
+                n -= len(df)
+                if n <= 0:
+                    break
+            df = pd.concat(dfs, ignore_index=True)
+            if len(df) == 0:
+                return []
+            dead = df[df['attempts'] >= self.max_attempts]
+            df = df[df['attempts'] < self.max_attempts]
+            if len(dead):
+                sql.modify(
+                    f"UPDATE {self.table} SET status = 'dead', lease = NULL "
+                    'WHERE id IN %(ids)s', {'ids': _ids(dead['id'])}
+                )
+                logging.warning(
+                    '%s tasks of queue %s are dead after %s attempts',
+                    len(dead), self.queue, self.max_attempts
+                )
+            if len(df):
+                sql.modify(
+                    f"UPDATE {self.table} SET status = 'running', "
+                    'attempts = attempts + 1, lease = %(lease)s, '
+                    'worker = %(worker)s, '
+                    'available_at = NOW(6) + INTERVAL %(timeout)s SECOND '
+                    'WHERE id IN %(ids)s', {
+                        'lease': lease, 'worker': self.worker_id,
+                        'timeout': visibility_timeout, 'ids': _ids(df['id'])
+                    }
+                )
+        tasks = [
+            Task(int(id_), json.loads(payload), int(attempts) + 1, lease)
+            for id_, payload, attempts in df.itertuples(index=False)
+        ]
+        logging.info('%s tasks claimed from queue %s', len(tasks), self.queue)
+        return tasks
+
+
+    def _update(self, tasks, assignments, params=None):
+        """Updates the tasks whose lease is still held, and returns their
+        number.
+
+        """
+        if not tasks:
+            return 0
+        held = 0
+        for lease, ids in _by_lease(tasks).items():
+            nrows, _ = self.sql.modify(
+                f'UPDATE {self.table} SET {assignments} '
+                "WHERE id IN %(ids)s AND lease = %(lease)s "
+                "AND status = 'running'",
+                {**(params or {}), 'ids': ids, 'lease': lease}
+            )
+            held += nrows
+        if held < len(tasks):
+            logging.warning(
+                '%s tasks of queue %s were not updated: lease expired',
+                len(tasks) - held, self.queue
+            )
+        return held
+
+
+    def heartbeat(self, tasks, visibility_timeout=None):
+        """Extends the lease of claimed tasks by `visibility_timeout`
+        seconds from now.
+
+        Parameters
+        ----------
+        tasks : list of <Task>
+            Tasks being processed.
+        visibility_timeout : float, optional
+            Default to the `visibility_timeout` attribute.
+
+        Returns
+        -------
+        int : Number of tasks whose lease is still held, and was extended.
+
+        """
+        if visibility_timeout is None:
+            visibility_timeout = self.visibility_timeout
+        return self._update(
+            tasks, 'available_at = NOW(6) + INTERVAL %(timeout)s SECOND',
+            {'timeout': visibility_timeout}
+        )
+
+
+    def ack(self, tasks):
+        """Marks claimed tasks as done.
+
+        Returns
+        -------
+        int : Number of tasks acknowledged. Tasks whose lease expired are
+        not acknowledged, as they may have been claimed by another worker.
+
+        """
+        return self._update(tasks, "status = 'done', lease = NULL")
+
+
+    def nack(self, tasks, delay=0, error=None):
+        """Releases claimed tasks to be retried after `delay` seconds, or
+        moves them to the `dead` status after `max_attempts` attempts.
+
+        Parameters
+        ----------
+        tasks : list of <Task>
+            Tasks which could not be processed.
+        delay : float
+            Time in seconds before the tasks become available. Default 0.
+        error : Exception or str, optional
+            Error stored in the `last_error` column.
+
+        Returns
+        -------
+        int : Number of tasks released.
+
+        """
+        if isinstance(error, BaseException):
+            error = repr(error)
+        return self._update(
+            tasks,
+            "status = IF(attempts >= %(max)s, 'dead', 'queued'), "
+            'lease = NULL, last_error = %(error)s, '
+            'available_at = NOW(6) + INTERVAL %(delay)s SECOND',
+            {'max': self.max_attempts, 'error': error, 'delay': delay}
+        )
+
+
+    def process(self, fn, batch_size=10, heartbeat_interval=None,
+                poll_interval=1, stop_when_empty=True):
+        """Claims and processes tasks until the queue is empty.
+
+        Each payload is passed to `fn`: the task is acknowledged if `fn`
+        returns, released with the error otherwise. The leases of the batch
+        are extended between two tasks once `heartbeat_interval` seconds have
+        elapsed since the last extension: a single task must thus take less
+        than the visibility timeout, or call `heartbeat` itself.
+
+        Parameters
+        ----------
+        fn : callable
+            Function called with each payload.
+        batch_size : int
+            Number of tasks claimed at once. Default 10.
+        heartbeat_interval : float, optional
+            Default to a third of the visibility timeout.
+        poll_interval : float
+            Time in seconds to wait when no task is available, if
+            `stop_when_empty` is False. Default 1.
+        stop_when_empty : bool
+            Whether to return when no task is available (claimed or not), or
+            to wait for new tasks forever. Default True.
+
+        Returns
+        -------
+        int : Number of tasks processed successfully.
+
+        """
+        if heartbeat_interval is None:
+            heartbeat_interval = self.visibility_timeout / 3
+        done = 0
+        while True:
+            tasks = self.claim(batch_size)
+            if not tasks:
+                if not stop_when_empty:
+                    time.sleep(poll_interval)
+                # The claim skips the tasks locked by other claims: the queue
+                # is empty only if a non-locking read finds no available task
+                elif not self._available():
+                    return done
+                continue
+            last_beat = time.monotonic()
+            for i, task in enumerate(tasks):
+                if time.monotonic() - last_beat > heartbeat_interval:
+                    self.heartbeat(tasks[i:])
+                    last_beat = time.monotonic()
+                try:
+                    fn(task.payload)
+                except Exception as e:
+                    logging.exception('Task %s failed', task.id)
+                    self.nack([task], error=e)
+                else:
+                    done += self.ack([task])
+
+
+    def _available(self):
+        """Returns whether the queue has available tasks, without locking
+        them.
+
+        """
+        df = self.sql.extract(
+            f'SELECT EXISTS(SELECT 1 FROM {self.table} '
+            "WHERE queue = %s AND status IN ('queued', 'running') "
+            'AND available_at <= NOW(6)) AS available', (self.queue, ), ttl=0
+        )
+        return bool(int(df.iloc[0, 0]))
+
+
+    def stats(self):
+        """Returns the number of tasks of the queue per status.
+
+        Returns
+        -------
+        dict : {status: number of tasks}, and the number of `available`
+        tasks (queued, or running with an expired lease).
+
+        """
+        df = self.sql.extract(
+            'SELECT status, COUNT(*) AS n, '
+            'SUM(available_at <= NOW(6)) AS available '
+            f'FROM {self.table} WHERE queue = %s GROUP BY status',
+            (self.queue, ), ttl=0
+        )
+        stats = dict.fromkeys(('queued', 'running', 'done', 'dead'), 0)
+        stats.update(zip(df['status'], df['n'].astype(int)))
+        pending = df['status'].isin(('queued', 'running'))
+        stats['available'] = int(df.loc[pending, 'available'].sum())
+        return stats
+
+
+    def purge(self, older_than=7 * 86400, statuses=('done', )):
+        """Deletes the tasks of the queue in `statuses`, last updated more
+        than `older_than` seconds ago.
+
+        Returns
+        -------
+        int : Number of tasks deleted.
+
+        """
+        nrows, _ = self.sql.modify(
+            f'DELETE FROM {self.table} WHERE queue = %(queue)s '
+            'AND status IN %(statuses)s '
+            'AND updated_at < NOW(6) - INTERVAL %(age)s SECOND', {
+                'queue': self.queue, 'statuses': tuple(statuses),
+                'age': older_than
+            }
+        )
+        logging.info('%s tasks purged from queue %s', nrows, self.queue)
+        return nrows
+
+
+def _ids(values):
+    """Returns the ids as a tuple of int, for `IN %s`"""
+    return tuple(int(v) for v in values)
+
+
+def _by_lease(tasks):
+    """Groups the ids of the tasks by lease"""
+    leases = {}
+    for task in tasks:
+        leases.setdefault(task.lease, []).append(task.id)
+    return {lease: tuple(ids) for lease, ids in leases.items()}